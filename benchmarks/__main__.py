@@ -0,0 +1,88 @@
+"""
+Run the benchmarks and optionally save the results as JSON:
+
+    python -m benchmarks [-k PATTERN] [--samples N] [--output results.json]
+
+The saved results can be compared between commits.
+"""
+import argparse
+import datetime
+import fnmatch
+import json
+import platform
+import statistics
+import subprocess
+import sys
+
+from benchmarks.suite import collect, run_benchmark
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(samples):
+    return {
+        'samples': samples,
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.mean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def format_ns(value):
+    for unit, scale in (('s', 1e9), ('ms', 1e6), ('us', 1e3)):
+        if value >= scale:
+            return '%.2f%s' % (value / scale, unit)
+    return '%.0fns' % value
+
+
+def write_results(fpath, results):
+    from blazeform.version import VERSION
+
+    data = {
+        'meta': {
+            'revision': git_revision(),
+            'blazeform': VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': datetime.datetime.utcnow().isoformat(),
+        },
+        'results': results,
+    }
+    with open(fpath, 'w') as fo:
+        json.dump(data, fo, indent=2, sort_keys=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('-k', dest='pattern', default='*',
+                        help='only run benchmarks matching this glob pattern')
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--number', type=int, default=None,
+                        help='calls per sample, calibrated if not given')
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, (setup, func) in sorted(collect().items()):
+        if not fnmatch.fnmatch(name, args.pattern):
+            continue
+        results[name] = summarize(run_benchmark(setup, func, args.samples, args.number))
+        print('%-30s median %10s  stdev %10s' % (
+            name, format_ns(results[name]['median']), format_ns(results[name]['stdev'])
+        ))
+
+    if args.output:
+        write_results(args.output, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
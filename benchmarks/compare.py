@@ -0,0 +1,175 @@
+"""
+Compare benchmarks between two git revisions and fail on regressions:
+
+    python -m benchmarks.compare BASE [TARGET] [--threshold 0.10] [--gate 'hotpath.*']
+
+TARGET defaults to the working tree.  Each revision is exported to a temporary
+directory and benchmarked by its own virtualenv, always using the benchmark
+definitions from the working tree so both sides run the same code.  Runs of the
+two revisions are interleaved (see --rounds) to spread out machine noise.
+
+The virtualenvs use the system site packages for dependencies and put the
+exported revision first on the path, so no network access is needed.  Use
+--install to pip install each revision (and its dependencies) instead.
+
+Benchmarks matching --gate fail the command (exit code 1) when they are slower
+by more than --threshold and a Mann-Whitney U test says the difference is
+significant at --alpha.  Saved results can be compared with:
+
+    python -m benchmarks.compare --results base.json target.json
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import venv
+from fnmatch import fnmatch
+from os import path
+
+from benchmarks.stats import mann_whitney_u
+
+WORKTREE = 'WORKTREE'
+bench_dir = path.dirname(path.abspath(__file__))
+repo_dir = path.dirname(bench_dir)
+
+
+def export_revision(rev, dest):
+    """ write the files of `rev` to dest and return the source directory """
+    if rev == WORKTREE:
+        return repo_dir
+    archive = subprocess.check_output(['git', 'archive', '--format=tar', rev], cwd=repo_dir)
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tf:
+        tf.extractall(dest)
+    return dest
+
+
+def venv_python(venv_dir):
+    if sys.platform == 'win32':
+        return path.join(venv_dir, 'Scripts', 'python.exe')
+    return path.join(venv_dir, 'bin', 'python')
+
+
+class Revision(object):
+
+    def __init__(self, rev, workdir, install=False):
+        self.rev = rev
+        self.workdir = workdir
+        self.samples = {}
+
+        os.makedirs(workdir)
+        self.src = export_revision(rev, path.join(workdir, 'src'))
+        venv_dir = path.join(workdir, 'venv')
+        venv.create(venv_dir, system_site_packages=not install, with_pip=install)
+        self.python = venv_python(venv_dir)
+        self.env = dict(os.environ)
+        if install:
+            subprocess.check_call([self.python, '-m', 'pip', 'install', '-q', self.src])
+        else:
+            self.env['PYTHONPATH'] = self.src
+
+    def run(self, runner_dir, args):
+        output = path.join(self.workdir, 'results.json')
+        subprocess.check_call(
+            [self.python, '-m', 'benchmarks', '--output', output] + args,
+            cwd=runner_dir, env=self.env
+        )
+        with open(output) as fo:
+            results = json.load(fo)['results']
+        for name, result in results.items():
+            self.samples.setdefault(name, []).extend(result['samples'])
+
+
+def compare(base, target, threshold, alpha, gate):
+    """
+        base and target are dicts of benchmark name -> samples.  Prints a
+        report and returns the names of the gated benchmarks that regressed.
+    """
+    regressions = []
+    print('%-30s %12s %12s %8s %8s  %s' % ('benchmark', 'base', 'target', 'ratio', 'p', ''))
+    for name in sorted(set(base) & set(target)):
+        base_median = statistics.median(base[name])
+        target_median = statistics.median(target[name])
+        ratio = target_median / base_median if base_median else float('inf')
+        _, pvalue = mann_whitney_u(base[name], target[name])
+        status = ''
+        if pvalue < alpha and ratio > 1 + threshold:
+            status = 'SLOWER'
+            if fnmatch(name, gate):
+                status = 'REGRESSION'
+                regressions.append(name)
+        elif pvalue < alpha and ratio < 1 - threshold:
+            status = 'faster'
+        print('%-30s %10.0fns %10.0fns %8.3f %8.4f  %s' % (
+            name, base_median, target_median, ratio, pvalue, status
+        ))
+    return regressions
+
+
+def load_samples(fpath):
+    with open(fpath) as fo:
+        results = json.load(fo)['results']
+    return {name: result['samples'] for name, result in results.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.compare')
+    parser.add_argument('base', help='git revision (or results file with --results)')
+    parser.add_argument('target', nargs='?', default=WORKTREE,
+                        help='git revision, defaults to the working tree')
+    parser.add_argument('--results', action='store_true',
+                        help='base and target are JSON result files')
+    parser.add_argument('-k', dest='pattern', default='*',
+                        help='only run benchmarks matching this glob pattern')
+    parser.add_argument('--gate', default='hotpath.*',
+                        help='glob pattern of the benchmarks that fail the comparison')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='allowed slowdown as a fraction of the base median')
+    parser.add_argument('--alpha', type=float, default=0.05,
+                        help='significance level for the Mann-Whitney U test')
+    parser.add_argument('--samples', type=int, default=10, help='samples per round')
+    parser.add_argument('--rounds', type=int, default=2,
+                        help='number of interleaved runs of each revision')
+    parser.add_argument('--install', action='store_true',
+                        help='pip install each revision into its virtualenv')
+    parser.add_argument('--keep', action='store_true', help="don't delete the work directory")
+    args = parser.parse_args(argv)
+
+    if args.results:
+        base, target = load_samples(args.base), load_samples(args.target)
+    else:
+        workdir = tempfile.mkdtemp(prefix='blazeform-bench-')
+        try:
+            runner_dir = path.join(workdir, 'runner')
+            shutil.copytree(bench_dir, path.join(runner_dir, 'benchmarks'),
+                            ignore=shutil.ignore_patterns('__pycache__'))
+            revisions = [
+                Revision(rev, path.join(workdir, label), args.install)
+                for label, rev in (('base', args.base), ('target', args.target))
+            ]
+            run_args = ['-k', args.pattern, '--samples', str(args.samples)]
+            for round in range(args.rounds):
+                for revision in revisions:
+                    print('--- round %d: %s' % (round + 1, revision.rev))
+                    revision.run(runner_dir, run_args)
+            base, target = revisions[0].samples, revisions[1].samples
+        finally:
+            if args.keep:
+                print('work directory: %s' % workdir)
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    regressions = compare(base, target, args.threshold, args.alpha, args.gate)
+    if regressions:
+        print('\nregressions: %s' % ', '.join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Form definitions and submitted values used by the benchmarks.
+
+Each case is a (form factory, submitted values) pair.  Factories take a
+`static` keyword so the same definition can be used for static rendering.
+"""
+from blazeform.form import Form
+from blazeform.tests.renderers.all_els import TestForm as AllElsForm
+
+
+def kitchen_sink(static=False):
+    return AllElsForm(static=static)
+
+
+kitchen_sink_values = {
+    'testform-submit-flag': 'submitted',
+    'checkbox': 'on',
+    'hidden': 'my hidden val',
+    'text': 'some text',
+    'password': 'secret',
+    'confirm': 'secret',
+    'date': '12/03/2009',
+    'email': 'foo@example.com',
+    'time': '10:30',
+    'url': 'http://example.com/',
+    'select': '1',
+    'mselect': ['1', '2'],
+    'textarea': 'a longer\nbit of text',
+    'ingroup1': 'grouped 1',
+    'ingroup2': 'grouped 2',
+    'mcbgroup': ['red', 'green'],
+    'rgroup': 'car',
+    'animalgroup': 'dog',
+}
+
+
+def flat_form(static=False):
+    form = Form('flat', static=static)
+    for num in range(200):
+        eid = 'field%d' % num
+        if num % 4 == 0:
+            form.add_text(eid, 'Field %d' % num, vtype='int', required=True)
+        elif num % 4 == 1:
+            form.add_text(eid, 'Field %d' % num, maxlength=50)
+        elif num % 4 == 2:
+            form.add_textarea(eid, 'Field %d' % num, defaultval='default %d' % num)
+        else:
+            form.add_text(eid, 'Field %d' % num, if_empty='empty')
+    form.add_submit('submit')
+    return form
+
+
+flat_form_values = dict(
+    [('field%d' % num, str(num) if num % 4 == 0 else ' value %d ' % num) for num in range(200)],
+    **{'flat-submit-flag': 'submitted', 'submit': 'Submit'}
+)
+
+
+big_select_options = [(num, 'option %d' % num) for num in range(20000)]
+
+
+def big_select(static=False):
+    form = Form('bigselect', static=static)
+    form.add_select('select', big_select_options, 'Select', required=True, defaultval=10)
+    form.add_submit('submit')
+    return form
+
+
+big_select_values = {
+    'bigselect-submit-flag': 'submitted',
+    'select': '19999',
+    'submit': 'Submit',
+}
+
+
+def checkbox_group(static=False):
+    form = Form('cbgroup', static=static)
+    for num in range(50):
+        form.add_mcheckbox('cb%d' % num, 'Checkbox %d' % num, 'value%d' % num, 'group',
+                           checked=num % 3 == 0)
+    form.add_submit('submit')
+    return form
+
+
+checkbox_group_values = {
+    'cbgroup-submit-flag': 'submitted',
+    'group': ['value%d' % num for num in range(0, 50, 2)],
+    'submit': 'Submit',
+}
+
+
+cases = {
+    'all_els': (kitchen_sink, kitchen_sink_values),
+    'flat200': (flat_form, flat_form_values),
+    'select20k': (big_select, big_select_values),
+    'checkbox50': (checkbox_group, checkbox_group_values),
+}
@@ -0,0 +1,103 @@
+"""
+Measure how long importing blazeform takes, using `python -X importtime`:
+
+    python -m benchmarks.importtime [--module blazeform.form] [--runs 10] [--output results.json]
+
+Each run is a fresh interpreter.  Reports the median time to import the
+module, the imports contributing the most to it and whether the rendering
+dependencies were imported.  The saved results have the same format as
+`python -m benchmarks` so they can be compared with
+`python -m benchmarks.compare --results`.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+from benchmarks.__main__ import format_ns, summarize, write_results
+
+MARKER = '--- blazeform importtime start'
+#: modules that should only be imported when rendering
+RENDER_MODULES = ('webhelpers2', 'blazeform.render')
+
+SCRIPT = '''
+import sys, time
+sys.stderr.write(%(marker)r + '\\n')
+sys.stderr.flush()
+start = time.perf_counter_ns()
+import %(module)s
+elapsed = time.perf_counter_ns() - start
+print(elapsed)
+print(' '.join(name for name in %(render_modules)r if name in sys.modules))
+'''
+
+
+def parse_importtime(stderr):
+    """
+        Returns a list of (name, self us, cumulative us, depth) for the
+        imports after the marker, in the order Python reported them.
+    """
+    lines = stderr.splitlines()
+    if MARKER in lines:
+        lines = lines[lines.index(MARKER) + 1:]
+    retval = []
+    for line in lines:
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        retval.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return retval
+
+
+def measure(module, python=sys.executable):
+    """ run one interpreter, returns (elapsed ns, imports, render modules imported) """
+    code = SCRIPT % {'marker': MARKER, 'module': module, 'render_modules': RENDER_MODULES}
+    proc = subprocess.run(
+        [python, '-X', 'importtime', '-c', code],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True
+    )
+    stdout = proc.stdout.splitlines()
+    render_imported = stdout[1].split() if len(stdout) > 1 else []
+    return int(stdout[0]), parse_importtime(proc.stderr), render_imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.importtime')
+    parser.add_argument('--module', default='blazeform.form', help='the module to import')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15,
+                        help='number of the most expensive imports to list')
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    samples = []
+    cumulative = {}
+    render_imported = set()
+    for _ in range(args.runs):
+        elapsed, imports, rendered = measure(args.module)
+        samples.append(elapsed)
+        render_imported.update(rendered)
+        for name, self_us, cumulative_us, depth in imports:
+            cumulative.setdefault(name, []).append(cumulative_us)
+
+    result = summarize(samples)
+    print('import %s: median %s  stdev %s' % (
+        args.module, format_ns(result['median']), format_ns(result['stdev'])
+    ))
+    print('\n%-45s %12s' % ('slowest imports', 'median'))
+    medians = sorted(
+        ((statistics.median(times), name) for name, times in cumulative.items()),
+        reverse=True,
+    )
+    for median_us, name in medians[:args.top]:
+        print('%-45s %12s' % (name, format_ns(median_us * 1000)))
+    print('\nrendering modules imported: %s' % (', '.join(sorted(render_imported)) or 'none'))
+
+    if args.output:
+        write_results(args.output, {'importtime.%s' % args.module: result})
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
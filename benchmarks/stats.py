@@ -0,0 +1,42 @@
+import math
+
+
+def rank(values):
+    """ 1-based ranks of values, ties get the average of their ranks """
+    order = sorted(range(len(values)), key=lambda index: values[index])
+    ranks = [0.0] * len(values)
+    start = 0
+    while start < len(order):
+        end = start
+        while end + 1 < len(order) and values[order[end + 1]] == values[order[start]]:
+            end += 1
+        average = (start + end) / 2.0 + 1
+        for index in order[start:end + 1]:
+            ranks[index] = average
+        start = end + 1
+    return ranks
+
+
+def mann_whitney_u(first, second):
+    """
+        Two sided Mann-Whitney U test using the normal approximation with tie
+        and continuity corrections.  Returns (U for `first`, p-value).
+    """
+    n1, n2 = len(first), len(second)
+    if not n1 or not n2:
+        raise ValueError('both samples need at least one value')
+    combined = list(first) + list(second)
+    ranks = rank(combined)
+    u1 = sum(ranks[:n1]) - n1 * (n1 + 1) / 2.0
+
+    n = n1 + n2
+    counts = {}
+    for value in combined:
+        counts[value] = counts.get(value, 0) + 1
+    ties = sum(t ** 3 - t for t in counts.values())
+    variance = n1 * n2 / 12.0 * ((n + 1) - ties / float(n * (n - 1))) if n > 1 else 0
+    if variance <= 0:
+        return u1, 1.0
+    mean = n1 * n2 / 2.0
+    z = (abs(u1 - mean) - 0.5) / math.sqrt(variance)
+    return u1, min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
@@ -0,0 +1,121 @@
+"""
+The benchmarks.  Each one is a (setup, func) pair: `setup` builds the state
+a single call needs and is not timed, `func` is called with that state and is
+timed.  Every call gets a fresh state since forms cache their processing.
+"""
+import time
+
+
+def _submitted(factory, values):
+    form = factory()
+    form.set_submitted(values)
+    return form
+
+
+def _validated(factory, values):
+    form = _submitted(factory, values)
+    form.is_valid()
+    return form
+
+
+def case_benchmarks(factory, values):
+    return {
+        'construct': (
+            lambda: None,
+            lambda state: factory(),
+        ),
+        'set_submitted': (
+            lambda: factory(),
+            lambda form: form.set_submitted(values),
+        ),
+        'is_valid': (
+            lambda: _submitted(factory, values),
+            lambda form: form.is_valid(),
+        ),
+        'get_values': (
+            lambda: _validated(factory, values),
+            lambda form: form.get_values(),
+        ),
+        'render': (
+            lambda: _validated(factory, values),
+            lambda form: form.render(),
+        ),
+        'render_static': (
+            lambda: factory(static=True),
+            lambda form: form.render(),
+        ),
+    }
+
+
+def _process_elements(form):
+    for el in form.submittable_els:
+        el._valid = None
+        el._to_python_processing()
+
+
+def hotpath_benchmarks():
+    """
+        Narrower benchmarks of the code paths that dominate the cases above.
+        They only use APIs that have been stable for a long time so they can
+        be run against older revisions.
+    """
+    from blazeform.processors import Select
+    from blazeform.render import FormRenderer
+    from benchmarks.forms import big_select_options, flat_form, flat_form_values
+
+    select = Select(big_select_options, [-1, -2])
+    return {
+        'to_python_processing': (
+            lambda: _submitted(flat_form, flat_form_values),
+            _process_elements,
+        ),
+        'form_renderer_render': (
+            lambda: _validated(flat_form, flat_form_values),
+            lambda form: FormRenderer(form).render(),
+        ),
+        'select_validate_other': (
+            lambda: None,
+            lambda state: select.validate_other(['19999'], None),
+        ),
+    }
+
+
+def collect():
+    """ return a dict of benchmark name -> (setup, func) """
+    from benchmarks.forms import cases
+
+    retval = {}
+    for case_name, (factory, values) in sorted(cases.items()):
+        for bench_name, bench in case_benchmarks(factory, values).items():
+            retval['%s.%s' % (case_name, bench_name)] = bench
+    for bench_name, bench in hotpath_benchmarks().items():
+        retval['hotpath.%s' % bench_name] = bench
+    return retval
+
+
+def run_benchmark(setup, func, samples=10, number=None, min_time=0.05, max_setup_time=1.0):
+    """
+        Returns a list of `samples` timings in nanoseconds per call.  If
+        `number` (calls per sample) is not given, it is calibrated so that a
+        sample takes at least `min_time` seconds, unless building the states
+        for a sample would take longer than `max_setup_time` seconds.
+    """
+    clock = time.perf_counter_ns
+
+    def sample(number):
+        setup_start = clock()
+        states = [setup() for _ in range(number)]
+        start = clock()
+        for state in states:
+            func(state)
+        end = clock()
+        return (end - start) / number, start - setup_start
+
+    if number is None:
+        number = 1
+        while number < 10000:
+            per_call, setup_time = sample(number)
+            if per_call * number >= min_time * 1e9 or setup_time * 10 >= max_setup_time * 1e9:
+                break
+            number *= 10
+    return [sample(number)[0] for _ in range(samples)]
@@ -0,0 +1,347 @@
+"""
+Validate many rows of values with one form definition:
+
+    from blazeform.batch import validate_batch
+
+    store = validate_batch(ContactForm(), rows)
+    for index in store.invalid_rows():
+        log.warning('row %d: %s', index, store.errors(index))
+    contacts = [store.row(index) for index in store.valid_rows()]
+
+`rows` is an iterable of dicts keyed by field name (like submitted values)
+and is consumed as it is validated, so it can be a generator reading a file.
+Each row is loaded into the form's elements, validated (including the form
+validators) and the results are stored by column.  The ColumnStore keeps a
+list of processed values and a bytearray of validity flags per field and
+only the errors that occurred, so its memory is proportional to the data
+instead of one set of element objects per row.  FormSetElement uses the same
+store for its rows.
+
+When NumPy is installed (pip install BlazeForm[batch]), the "int" and "number"
+vtype conversions of fields without processors are vectorized: rows are read
+in chunks and the plain decimal strings of such a column are converted with
+one NumPy call.  Any other value (empty, with spaces, "1e3", not a
+string, invalid, ...) is processed by the element as usual, so values, errors
+and their row positions are the same as without NumPy.  The "decimal" and
+"bool" conversions are not vectorized, NumPy has no decimal type and the bool
+conversion is cheap.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+import formencode
+
+from blazeform.element import CheckboxElement, FormFieldElementBase, LogicalGroupElement, \
+    MultiSelectElement, SelectElement
+from blazeform.exceptions import ElementInvalid
+from blazeform.instrumentation import hooks
+from blazeform.util import NotGiven, is_empty
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_int_vtypes = ('integer', 'int')
+_number_vtypes = ('number', 'num', 'float')
+# longer strings are converted by the element, int64 can't overflow and no
+# float is rounded to infinity
+_max_int_digits = 18
+_max_number_length = 32
+
+
+class ColumnStore(object):
+    """
+        The state of rows of the same fields, a column per field.  Rows are
+        appended in order.
+    """
+
+    def __init__(self, keys, returning=None, keep_raw=False):
+        #: the fields' names, in column order
+        self.keys = list(keys)
+        self.columns = dict((key, index) for index, key in enumerate(self.keys))
+        #: the names included in row(), all by default
+        self.returning = self.keys if returning is None else list(returning)
+        #: the submitted values by column, if kept
+        self.raw = [[] for key in self.keys] if keep_raw else None
+        #: the processed values by column, NotGiven when invalid
+        self.values = [[] for key in self.keys]
+        #: 1 for a valid value, 0 for an invalid one, by column
+        self.valid = [bytearray() for key in self.keys]
+        #: 1 for rows that were not validated (e.g. empty)
+        self.skipped = bytearray()
+        # the errors in row order: row, column (len(keys) for the form's
+        # errors) and message
+        self.error_rows = array('L')
+        self.error_columns = array('H')
+        self.error_messages = []
+        self._row_count = 0
+
+    def __len__(self):
+        return self._row_count
+
+    def _append(self, raw, values, valid, skipped=False):
+        if self.raw is not None:
+            for column, value in zip(self.raw, raw):
+                column.append(value)
+        for column, value in zip(self.values, values):
+            column.append(value)
+        for column, flag in zip(self.valid, valid):
+            column.append(flag)
+        self.skipped.append(skipped)
+        self._row_count += 1
+        return self._row_count - 1
+
+    def _add_error(self, row, column, message):
+        self.error_rows.append(row)
+        self.error_columns.append(column)
+        self.error_messages.append(message)
+
+    def column(self, key):
+        """ the processed values of a field """
+        return self.values[self.columns[key]]
+
+    def row(self, index, keys=None):
+        """ a dict of the processed values of a row, for `keys` or returning """
+        return dict((key, self.values[self.columns[key]][index])
+                    for key in (self.returning if keys is None else keys))
+
+    def is_valid(self, index=None):
+        """ is the row, or every row if `index` is None, valid? """
+        if index is None:
+            return not self.error_rows and not any(0 in column for column in self.valid)
+        start = bisect_left(self.error_rows, index)
+        if start < len(self.error_rows) and self.error_rows[start] == index:
+            return False
+        return all(column[index] for column in self.valid)
+
+    def errors(self, index):
+        """ a dict of field name (None for the form) -> errors of the row """
+        retval = {}
+        start = bisect_left(self.error_rows, index)
+        end = bisect_right(self.error_rows, index, start)
+        for position in range(start, end):
+            column = self.error_columns[position]
+            key = self.keys[column] if column < len(self.keys) else None
+            retval.setdefault(key, []).append(self.error_messages[position])
+        return retval
+
+    def invalid_rows(self):
+        """ the indexes of the invalid rows """
+        for index in range(self._row_count):
+            if not self.is_valid(index):
+                yield index
+
+    def valid_rows(self):
+        """ the indexes of the valid rows that were not skipped """
+        for index in range(self._row_count):
+            if not self.skipped[index] and self.is_valid(index):
+                yield index
+
+
+# SelectElement only changes the processing of multiple selects
+_standard_processings = (FormFieldElementBase._to_python_processing,
+                         SelectElement._to_python_processing)
+
+
+def _standard_processing(el):
+    """ does the element process its values like FormFieldElementBase? """
+    cls = type(el)
+    return (
+        not getattr(el, 'multiple', False)
+        and cls.submittedval is FormFieldElementBase.submittedval
+        and cls.is_valid is FormFieldElementBase.is_valid
+        and cls._to_python_processing in _standard_processings
+    )
+
+
+def _vectorizable(el):
+    """ can the element's vtype conversion be done by _convert_column()? """
+    return (
+        (el.vtype in _int_vtypes or el.vtype in _number_vtypes)
+        and not el.processors
+        and _standard_processing(el)
+    )
+
+
+def _batchable(el):
+    """ can the element process a column with _to_python_processing_many()? """
+    return (
+        el.processors
+        and all(getattr(processor, 'batchable', False) for processor, msg in el.processors)
+        and _standard_processing(el)
+    )
+
+
+def _process_column(el, values, fail_fast):
+    """
+        a (valid, value, errors) tuple for each value, None for the values
+        that are too large (they are rejected by _validate_row())
+    """
+    retval = [None] * len(values)
+    fitting = [index for index, value in enumerate(values) if not el._size_error(value)]
+    results = el._to_python_processing_many([values[index] for index in fitting], fail_fast)
+    for index, result in zip(fitting, results):
+        retval[index] = result
+    return retval
+
+
+def _convert_column(values, vtype):
+    """
+        Convert the plain decimal strings ("12", "-3", "+1.5", ".5") in
+        `values` like FormEncode's Int or Number would.  Returns a list with
+        the converted value, or NotGiven when the value is left to the
+        element, for each value.
+    """
+    retval = [NotGiven] * len(values)
+    if not values:
+        return retval
+    # longer values are left to the element, one long value would widen the
+    # whole array to its length
+    max_length = _max_int_digits + 1 if vtype in _int_vtypes else _max_number_length
+    strings = numpy.array([value if type(value) is str and len(value) <= max_length else ''
+                           for value in values])
+    length = numpy.char.str_len(strings)
+    # the code points, padded with zeros to the longest string
+    codes = strings.view(numpy.uint32).reshape(len(values), -1)
+    digits = ((codes >= 48) & (codes <= 57)).sum(axis=1)
+    signed = (codes[:, 0] == 43) | (codes[:, 0] == 45)
+    if vtype in _int_vtypes:
+        plain = (digits > 0) & (digits <= _max_int_digits) & (digits + signed == length)
+        converted = strings[plain].astype(numpy.int64).tolist()
+    else:
+        points = (codes == 46).sum(axis=1)
+        plain = (digits > 0) & (points <= 1) & (digits + points + signed == length)
+        # Number returns an int for integral values
+        converted = [int(value) if value.is_integer() else value
+                     for value in strings[plain].astype(numpy.float64).tolist()]
+    for index, value in zip(numpy.flatnonzero(plain).tolist(), converted):
+        retval[index] = value
+    return retval
+
+
+def _chunks(rows, keys, missing, size):
+    """ lists of up to `size` rows as lists of values in column order """
+    rows = iter(rows)
+    while True:
+        chunk = [[row.get(key, default) for key, default in zip(keys, missing)]
+                 for row in islice(rows, size)]
+        if not chunk:
+            return
+        yield chunk
+
+
+def validate_rows(fields, rows, form=None, fail_fast=False, skip_empty=False, keep_raw=False,
+                  vectorize=True, chunk_size=1024):
+    """
+        Validate `rows` (dicts keyed by field name) with the elements in
+        `fields` and return a ColumnStore.  If `form` is given, its validators
+        are run for each row too.  The elements' state is cleared afterwards.
+
+        Rows are read `chunk_size` at a time if some fields are processed by
+        column: batchable fields, and numeric vtype conversions when
+        `vectorize` is True and NumPy is installed, see the module's docs.
+    """
+    fields = [el for el in fields if el.is_submittable]
+    keys = [el.nameattr or el.id for el in fields]
+    # like FormBase._set_submitted_values()
+    missing = [None if isinstance(el, (CheckboxElement, MultiSelectElement, LogicalGroupElement))
+               else NotGiven for el in fields]
+    returning = [key for el, key in zip(fields, keys) if el.is_returning]
+    store = ColumnStore(keys, returning, keep_raw)
+    # the processor hooks need every value to be processed by the elements
+    vectorized = []
+    batched = []
+    if not hooks.active:
+        if vectorize and numpy is not None:
+            vectorized = [column for column, el in enumerate(fields) if _vectorizable(el)]
+        batched = [column for column, el in enumerate(fields) if _batchable(el)]
+    try:
+        for chunk in _chunks(rows, keys, missing,
+                             chunk_size if vectorized or batched else 1):
+            # (valid, value, errors) by column and row, None if not processed
+            # (skipped empty rows are processed too but it's cheap, empty
+            # values aren't given to the processors)
+            processed = [None] * len(fields)
+            for column in vectorized:
+                processed[column] = [
+                    None if value is NotGiven else (True, value, [])
+                    for value in _convert_column([raw[column] for raw in chunk],
+                                                 fields[column].vtype)
+                ]
+            for column in batched:
+                processed[column] = _process_column(
+                    fields[column], [raw[column] for raw in chunk], fail_fast)
+            for offset, raw in enumerate(chunk):
+                row_processed = [None if results is None else results[offset]
+                                 for results in processed]
+                if not _validate_row(store, fields, raw, row_processed, form, fail_fast,
+                                     skip_empty) and fail_fast:
+                    return store
+    finally:
+        for el in fields:
+            el._clear_state()
+    return store
+
+
+def _validate_row(store, fields, raw, processed, form, fail_fast, skip_empty):
+    """
+        validate and append a row, `processed` has the (valid, value, errors)
+        of the values processed by column (None if not), returns the row's
+        validity
+    """
+    index = len(store)
+    if skip_empty and all(is_empty(value) for value in raw):
+        store._append(raw, [NotGiven] * len(fields), [1] * len(fields), True)
+        return True
+
+    for el, value, results in zip(fields, raw, processed):
+        el._clear_state()
+        error = el._size_error(value)
+        if error:
+            el._reject_submitted(error)
+        else:
+            el._submittedval = value
+            if results is not None:
+                el._valid, el._safeval, el.errors = results
+    row_valid = True
+    values = []
+    valid = []
+    for column, el in enumerate(fields):
+        if (fail_fast and not row_valid) or not el.is_valid(fail_fast):
+            row_valid = False
+            values.append(NotGiven)
+            valid.append(0)
+            for message in el.errors:
+                store._add_error(index, column, message)
+        else:
+            values.append(el._safeval)
+            valid.append(1)
+    for validator, msg in (form._validators if form is not None else ()):
+        if fail_fast and not row_valid:
+            break
+        try:
+            validator.to_python(form)
+        except formencode.Invalid as e:
+            row_valid = False
+            msg = msg or str(e)
+            if msg:
+                store._add_error(index, len(fields), msg)
+        except ElementInvalid:
+            # the element's error is already stored
+            row_valid = False
+    store._append(raw, values, valid)
+    return row_valid
+
+
+def validate_batch(form, rows, fail_fast=False, skip_empty=False, keep_raw=False,
+                   vectorize=True, chunk_size=1024):
+    """
+        Validate `rows` (dicts keyed by field name) with the form's elements
+        and validators, see validate_rows().  `fail_fast` stops at the first
+        invalid row.
+    """
+    fields = [el for el in form.submittable_els if el.id != form._form_ident_field]
+    return validate_rows(fields, rows, form, fail_fast, skip_empty, keep_raw, vectorize,
+                         chunk_size)
@@ -0,0 +1,256 @@
+"""
+Cache built form definitions so new processes don't have to run every
+form's __init__:
+
+    from blazeform.cache import DefinitionCache
+
+    definitions = DefinitionCache('/var/cache/myapp/forms')
+
+    form = definitions.get(LoginForm, 'login')
+
+The first get() for a form class (or factory function) and arguments
+constructs the form and pickles it to the cache directory (and memory).
+Later calls, in this or a new process, unpickle a new copy from the (memory
+mapped) file instead.
+
+Entries are keyed by a fingerprint of the BlazeForm version and source, the
+source of the modules defining the form class (and its bases) or function
+and the repr of the arguments.  Only cache forms whose definition depends on nothing else
+(e.g. not on select options read from a database).
+
+Entries that no longer load (e.g. after FormEncode was upgraded, which the
+key doesn't cover) are replaced by constructing the form again.  Loading an
+entry unpickles it, which can run any code: the cache directory must only be
+writable by trusted users.
+
+Forms that can't be pickled (e.g. with a lambda as a validator) are simply
+constructed.  So are forms that build faster than they unpickle, like a
+small form sharing a large list of select options, unless `check_speed` is
+False.
+"""
+import copyreg
+import hashlib
+import inspect
+import io
+import mmap
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import time
+
+from blazeutils.datastructures import LazyOrderedDict
+
+from blazeform.version import VERSION
+
+#: file header: magic, nanoseconds the form took to construct
+_header = struct.Struct('<8sQ')
+_magic = b'BFDEF001'
+
+
+def _reduce_lazy_ordered_dict(lod):
+    # pickle would otherwise set the items before LazyOrderedDict's attributes,
+    # which its __getattr__ doesn't survive
+    return LazyOrderedDict, (), None, None, iter(lod.items())
+
+
+_dispatch_table = copyreg.dispatch_table.copy()
+_dispatch_table[LazyOrderedDict] = _reduce_lazy_ordered_dict
+
+
+def dumps(form, shared=None):
+    """
+        Pickle a form.  `shared` is a dict of id -> object for objects that
+        should be referenced instead of copied, loads() must be given the same
+        dict.
+    """
+    buffer = io.BytesIO()
+    pickler = pickle.Pickler(buffer, pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = _dispatch_table
+    if shared:
+        pickler.persistent_id = lambda obj: id(obj) if id(obj) in shared else None
+    pickler.dump(form)
+    return buffer.getvalue()
+
+
+def loads(data, shared=None):
+    """ unpickle a form pickled with dumps() """
+    if not shared:
+        return pickle.loads(data)
+    unpickler = pickle.Unpickler(io.BytesIO(data))
+    unpickler.persistent_load = shared.__getitem__
+    return unpickler.load()
+
+
+_source_digests = {}
+
+
+def _source_digest(fpath):
+    """ sha256 of a source file (of nothing if it can't be read) """
+    try:
+        return _source_digests[fpath]
+    except KeyError:
+        pass
+    digest = hashlib.sha256()
+    try:
+        with open(fpath, 'rb') as fo:
+            digest.update(fo.read())
+    except (TypeError, OSError):
+        pass
+    _source_digests[fpath] = digest.digest()
+    return _source_digests[fpath]
+
+
+def _module_source(module_name):
+    try:
+        return inspect.getsourcefile(sys.modules[module_name])
+    except (KeyError, TypeError):
+        return None
+
+
+def source_fingerprint(factory):
+    """
+        A hex digest of the BlazeForm version and source and the source of the
+        modules defining `factory` (a form class and its bases, or a function).
+    """
+    digest = hashlib.sha256(VERSION.encode('utf-8'))
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    fpaths = [os.path.join(package_dir, fname) for fname in os.listdir(package_dir)
+              if fname.endswith('.py')]
+    definers = factory.__mro__ if isinstance(factory, type) else (factory,)
+    fpaths.extend(_module_source(definer.__module__) for definer in definers)
+    for fpath in sorted(set(filter(None, fpaths))):
+        digest.update(_source_digest(fpath))
+    digest.update(factory.__module__.encode('utf-8'))
+    digest.update(factory.__qualname__.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class _Entry(object):
+
+    def __init__(self, data, construct_ns):
+        #: the pickled form, None if the form should be constructed instead
+        self.data = data
+        self.construct_ns = construct_ns
+        self.checked = False
+
+
+class DefinitionCache(object):
+    """
+        If `directory` is None, definitions are only cached in memory.
+    """
+
+    def __init__(self, directory=None, check_speed=True):
+        self.directory = directory
+        self.check_speed = check_speed
+        self._entries = {}
+        self._fingerprints = {}
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, factory, args=(), kwargs=None):
+        fingerprint = self._fingerprints.get(factory)
+        if fingerprint is None:
+            fingerprint = self._fingerprints[factory] = source_fingerprint(factory)
+        arguments = repr((args, sorted((kwargs or {}).items())))
+        return hashlib.sha256((fingerprint + arguments).encode('utf-8')).hexdigest()
+
+    def get(self, factory, *args, **kwargs):
+        """
+            A new form like factory(*args, **kwargs) would return, `factory`
+            is a form class or a function returning a form.
+        """
+        key = self.key(factory, args, kwargs)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._read(key)
+        if entry is None:
+            return self._store(key, factory, args, kwargs)
+        if entry.data is None:
+            return factory(*args, **kwargs)
+
+        started = time.perf_counter_ns()
+        try:
+            form = pickle.loads(entry.data)
+        except Exception:
+            # anything can fail, e.g. a class the entry refers to was renamed
+            self._discard(key)
+            return self._store(key, factory, args, kwargs)
+        if not entry.checked and self.check_speed:
+            # the first load, is it worth it?
+            entry.checked = True
+            if time.perf_counter_ns() - started >= entry.construct_ns:
+                entry.data = None
+        return form
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def _store(self, key, factory, args, kwargs):
+        started = time.perf_counter_ns()
+        form = factory(*args, **kwargs)
+        construct_ns = time.perf_counter_ns() - started
+        try:
+            data = dumps(form)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            self._entries[key] = _Entry(None, construct_ns)
+            return form
+
+        self._entries[key] = _Entry(data, construct_ns)
+        if self.directory is not None:
+            self._write(key, _header.pack(_magic, construct_ns) + data)
+        return form
+
+    def _discard(self, key):
+        del self._entries[key]
+        if self.directory is not None:
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def _write(self, key, contents):
+        # write to a temporary file and rename it, so other processes never
+        # read a partial file
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as fo:
+                    fo.write(contents)
+                os.replace(tmp_path, self._path(key))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            # the cache is an optimization, carry on without the file
+            pass
+
+    def _read(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), 'rb') as fo:
+                mapping = mmap.mmap(fo.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(mapping) < _header.size:
+            return None
+        magic, construct_ns = _header.unpack_from(mapping)
+        if magic != _magic:
+            return None
+        entry = _Entry(memoryview(mapping)[_header.size:], construct_ns)
+        self._entries[key] = entry
+        return entry
+
+    def clear(self):
+        """ empty the memory cache and remove the cache files """
+        self._entries.clear()
+        if self.directory is None:
+            return
+        for fname in os.listdir(self.directory):
+            if fname.endswith('.pickle'):
+                try:
+                    os.unlink(os.path.join(self.directory, fname))
+                except OSError:
+                    pass
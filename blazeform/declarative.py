@@ -0,0 +1,253 @@
+"""
+Forms defined with class attributes:
+
+    from blazeform.declarative import DeclarativeForm, Element, Group, Validator
+
+    class SignupForm(DeclarativeForm):
+        form_name = 'signup'
+
+        header = Element('header', 'Sign Up')
+        email = Element('email', 'Email', required=True)
+        password = Element('password', 'Password', required=True)
+        confirm = Element('confirm', 'Confirm Password', match='password')
+        name = Group('Name', first=Element('text', 'First'), last=Element('text', 'Last'))
+        age = Element('text', 'Age', vtype='int').processor(Int(min=13))
+        submit = Element('submit', defaultval='Sign Up')
+
+        not_taken = Validator('check_email')
+
+        def check_email(self, form):
+            ...
+
+    form = SignupForm()
+
+An Element takes the element type and the arguments of the matching add_*()
+method after the id, the attribute name is the id.  Elements are added in the
+order they are declared, those of base classes first.  A subclass can remove
+an inherited element by setting the attribute to something else (e.g. None).
+
+The form is built when the class is created, so mistakes like a bad vtype, a
+confirm element without `match` or an unknown element type raise when the
+module is imported.  That form is kept pickled as a prototype and
+SignupForm() returns an unpickled copy, without running __init__.  List and
+tuple arguments (e.g. select options) are shared by the copies, as they
+would be if passed to add_*() by __init__.
+
+Calls with other arguments (e.g. SignupForm(static=True)) run __init__ once
+and keep a prototype for those arguments too.  __init__ therefore only runs
+once for each set of arguments: a form that needs per request changes (like
+select options from a database) should make them after construction.  Forms
+that can't be pickled (e.g. with a lambda as a validator, or defined in a
+function) are constructed every time.
+"""
+import inspect
+import itertools
+import pickle
+import threading
+
+from blazeform.cache import dumps, loads
+from blazeform.form import Form, FormMeta
+from blazeform.util import NotGiven
+
+_counter = itertools.count()
+
+
+class Declaration(object):
+
+    def __init__(self):
+        # the order declarations were made in
+        self.order = next(_counter)
+
+    def add_to(self, form, name):
+        raise NotImplementedError
+
+    def shareable(self):
+        """ objects the form's copies can share """
+        return ()
+
+
+class Element(Declaration):
+    """
+        Declares an element, `type` is the element type registered with the
+        form (e.g. 'text' for add_text()).
+    """
+
+    def __init__(self, type, *args, **kwargs):
+        Declaration.__init__(self)
+        self.type = type
+        self.args = args
+        self.kwargs = kwargs
+        self.processors = []
+        self.handlers = []
+
+    def processor(self, processor, msg=None):
+        """ add a processor to the element, returns the declaration """
+        self.processors.append((processor, msg))
+        return self
+
+    def handler(self, *args, **kwargs):
+        """ add an exception handler to the element, returns the declaration """
+        self.handlers.append((args, kwargs))
+        return self
+
+    def add_to(self, registrar, eid):
+        el = registrar._create_element(self.type, eid, *self.args, **self.kwargs)
+        for processor, msg in self.processors:
+            el.add_processor(processor, msg)
+        for args, kwargs in self.handlers:
+            el.add_handler(*args, **kwargs)
+        return el
+
+    def shareable(self):
+        for value in itertools.chain(self.args, self.kwargs.values()):
+            if isinstance(value, (list, tuple)):
+                yield value
+
+
+class Group(Element):
+    """
+        Declares an element group ('elgroup').  Keyword arguments that are
+        Element declarations are the group's elements, the rest are the
+        group's arguments.
+    """
+
+    def __init__(self, *args, **kwargs):
+        children = sorted(
+            ((eid, value) for eid, value in kwargs.items() if isinstance(value, Element)),
+            key=lambda child: child[1].order
+        )
+        for eid, value in children:
+            del kwargs[eid]
+        Element.__init__(self, 'elgroup', *args, **kwargs)
+        self.children = children
+
+    def add_to(self, registrar, eid):
+        group = Element.add_to(self, registrar, eid)
+        for child_eid, child in self.children:
+            child.add_to(group, child_eid)
+        return group
+
+    def shareable(self):
+        yield from Element.shareable(self)
+        for eid, child in self.children:
+            yield from child.shareable()
+
+
+class Validator(Declaration):
+    """
+        Declares a form level validator: anything add_validator() accepts or
+        the name of a method of the form.
+    """
+
+    def __init__(self, validator, msg=None):
+        Declaration.__init__(self)
+        self.validator = validator
+        self.msg = msg
+
+    def add_to(self, form, name):
+        validator = self.validator
+        if isinstance(validator, str):
+            validator = getattr(form, validator)
+        form.add_validator(validator, self.msg)
+
+
+def _pickle(form, shared):
+    try:
+        return dumps(form, shared)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return None
+
+
+class DeclarativeMeta(FormMeta):
+
+    def __new__(mcs, name, bases, namespace):
+        own = sorted(
+            ((attr, value) for attr, value in namespace.items() if isinstance(value, Declaration)),
+            key=lambda declaration: declaration[1].order
+        )
+        for attr, value in own:
+            del namespace[attr]
+        namespace['_own_declarations'] = own
+        cls = FormMeta.__new__(mcs, name, bases, namespace)
+
+        declarations = {}
+        for klass in reversed(cls.__mro__):
+            # a subclass attribute of the same name removes the declaration
+            for attr in [attr for attr in declarations if attr in klass.__dict__]:
+                del declarations[attr]
+            declarations.update(klass.__dict__.get('_own_declarations', ()))
+        cls._declarations = list(declarations.items())
+
+        cls._shared = {}
+        for declaration in declarations.values():
+            for obj in declaration.shareable():
+                cls._shared[id(obj)] = obj
+
+        # by constructor arguments: a pickled form, None if it can't be pickled
+        # or a form not pickled yet
+        cls._prototypes = {}
+        # held while a prototype is built or pickled, before that the form
+        # must not be seen by another thread
+        cls._prototypes_lock = threading.Lock()
+        if not namespace.get('_abstract', False) and _takes_no_arguments(cls):
+            # the class can't be pickled before it's assigned to its module,
+            # so the form is only built, to raise definition errors now
+            cls._prototypes[((), frozenset())] = type.__call__(cls)
+        return cls
+
+    def _construct_form(cls, args, kwargs):
+        if cls.__dict__.get('_abstract', False):
+            return type.__call__(cls, *args, **kwargs)
+        try:
+            key = (args, frozenset(kwargs.items()))
+            prototype = cls._prototypes.get(key, NotGiven)
+        except TypeError:
+            # arguments that can't be hashed
+            return type.__call__(cls, *args, **kwargs)
+
+        if prototype is NotGiven or isinstance(prototype, Form):
+            with cls._prototypes_lock:
+                prototype = cls._prototypes.get(key, NotGiven)
+                if prototype is NotGiven:
+                    if len(cls._prototypes) >= cls._max_prototypes:
+                        return type.__call__(cls, *args, **kwargs)
+                    prototype = type.__call__(cls, *args, **kwargs)
+                if isinstance(prototype, Form):
+                    # its fingerprint parts are folded first so copies don't
+                    # carry them
+                    prototype.fingerprint()
+                    pickled = _pickle(prototype, cls._shared)
+                    cls._prototypes[key] = pickled
+                    if pickled is None:
+                        # no other thread can get it anymore
+                        return prototype
+                    prototype = pickled
+        if prototype is None:
+            return type.__call__(cls, *args, **kwargs)
+        return loads(prototype, cls._shared)
+
+
+def _takes_no_arguments(cls):
+    try:
+        inspect.signature(cls.__init__).bind(None)
+        return True
+    except TypeError:
+        return False
+
+
+class DeclarativeForm(Form, metaclass=DeclarativeMeta):
+    """
+        Base class for forms defined with Element, Group and Validator class
+        attributes.  Set `_abstract = True` on a base class that only holds
+        declarations for its subclasses.
+    """
+    _abstract = True
+    #: the form's name, defaults to the class name
+    form_name = None
+    #: the number of different constructor arguments prototypes are kept for
+    _max_prototypes = 32
+
+    def __init__(self, name=None, static=False, **kwargs):
+        Form.__init__(self, name or self.form_name or self.__class__.__name__, static, **kwargs)
+        for attr, declaration in self._declarations:
+            declaration.add_to(self, attr)
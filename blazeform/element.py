@@ -1,21 +1,123 @@
+import decimal
+import hashlib
 import html
 import inspect
+import math
 from os import path
 
 import formencode
 import formencode.validators as fev
 from blazeutils.datastructures import LazyOrderedDict
-from webhelpers2.html import HTML, tags, literal
 
 from blazeform.exceptions import ElementInvalid, ProgrammingError
-from blazeform.file_upload_translators import BaseTranslator
-from blazeform.processors import Confirm, Select, MultiValues, Wrapper, Decimal
+from blazeform.file_upload_translators import BaseTranslator, sniff_content_type, SNIFF_LENGTH
+from blazeform.instrumentation import hooks
+from blazeform.processors import Confirm, Select, MultiValues, Wrapper, Decimal, MaxLength
 from blazeform.util import HtmlAttributeHolder, is_empty, multi_pop, NotGiven, \
-    tolist, NotGivenIter, is_notgiven, is_iterable, ElementRegistrar, is_given
+    tolist, NotGivenIter, is_notgiven, is_iterable, ElementRegistrar, is_given, LazyImport
+
+# webhelpers2 is only needed for rendering, import it on first use
+HTML = LazyImport(globals(), 'HTML', 'webhelpers2.html', 'HTML')
+tags = LazyImport(globals(), 'tags', 'webhelpers2.html.tags')
+literal = LazyImport(globals(), 'literal', 'webhelpers2.html', 'literal')
 
 form_elements = {}
 
 
+# Conversions of values that already are of (or are trivially converted to)
+# a vtype's type, e.g. submitted as JSON.  They give the same results as the
+# FormEncode validators without the validators' overhead and return NotGiven
+# for other values, which are converted by the validators.
+def _typed_int(value):
+    return value if type(value) is int else NotGiven
+
+
+def _typed_number(value):
+    # Number goes through float, only ints that survive that are kept as is
+    if type(value) is int:
+        return value if -2 ** 53 <= value <= 2 ** 53 else NotGiven
+    if type(value) is decimal.Decimal:
+        value = float(value)
+    if type(value) is float and math.isfinite(value):
+        return int(value) if value.is_integer() else value
+    return NotGiven
+
+
+def _typed_bool(value):
+    return value if type(value) is bool else NotGiven
+
+
+def _typed_decimal(value):
+    if type(value) is int:
+        return decimal.Decimal(value)
+    if type(value) is decimal.Decimal:
+        return value
+    return NotGiven
+
+
+def _typed_str(value):
+    return value if type(value) is str else NotGiven
+
+
+_typed_converters = {
+    'boolean': _typed_bool,
+    'bool': _typed_bool,
+    'integer': _typed_int,
+    'int': _typed_int,
+    'number': _typed_number,
+    'num': _typed_number,
+    'float': _typed_number,
+    'decimal': _typed_decimal,
+    'str': _typed_str,
+    'string': _typed_str,
+    'unicode': _typed_str,
+    'uni': _typed_str,
+}
+# submitted values of these types are never empty and have nothing to strip
+_scalar_types = (int, float, bool, decimal.Decimal)
+
+# the JSON types accepted for each vtype, and for elements without one,
+# with the error for other values
+_json_numbers = (int, float, decimal.Decimal)
+_json_types = {
+    'boolean': ((bool,), 'true or false expected'),
+    'bool': ((bool,), 'true or false expected'),
+    'integer': ((int,), 'an integer expected'),
+    'int': ((int,), 'an integer expected'),
+    'number': (_json_numbers, 'a number expected'),
+    'num': (_json_numbers, 'a number expected'),
+    'float': (_json_numbers, 'a number expected'),
+    'decimal': (_json_numbers, 'a number expected'),
+    'str': ((str,), 'a string expected'),
+    'string': ((str,), 'a string expected'),
+    'unicode': ((str,), 'a string expected'),
+    'uni': ((str,), 'a string expected'),
+    NotGiven: ((str, bool) + _json_numbers, 'a single value expected'),
+}
+
+
+def _json_value(el, value):
+    """
+        check a value submitted as JSON against the element's vtype, returns
+        the value and an error message (None if the value is accepted).
+        Floats for decimals are converted from their repr, the number they
+        were written as.
+    """
+    if value is None:
+        return value, None
+    types, error = _json_types[el.vtype]
+    is_list = getattr(el, 'multiple', False) and isinstance(value, list)
+    items = value if is_list else [value]
+    for item in items:
+        # bool is an int subclass
+        if not isinstance(item, types) or (type(item) is bool and bool not in types):
+            return value, error
+    if el.vtype == 'decimal':
+        items = [decimal.Decimal(repr(item)) if type(item) is float else item for item in items]
+        value = items if is_list else items[0]
+    return value, None
+
+
 class MaxLengthMixin(object):
 
     def set_length(self, len):
@@ -30,7 +132,7 @@ class MaxLengthMixin(object):
         self.set_attr('maxlength', len)
 
         # set a maxlength validator on this
-        self.add_processor(fev.MaxLength(len))
+        self.add_processor(MaxLength(len))
 
 
 class Label(object):
@@ -157,6 +259,11 @@ class FormFieldElementBase(HasValueElement):
         self.required = kwargs.pop('required', False)
         #: name attribute
         self.nameattr = kwargs.pop('name', None)
+        #: stop processing at the first error instead of collecting all of them?
+        self.fail_fast = kwargs.pop('fail_fast', False)
+        #: size limits for submitted values, NotGiven means use the form's setting
+        self.max_value_length = kwargs.pop('max_value_length', NotGiven)
+        self.max_list_length = kwargs.pop('max_list_length', NotGiven)
         HasValueElement.__init__(self, form, eid, label, defaultval, **kwargs)
 
         self._submittedval = NotGiven
@@ -207,6 +314,48 @@ class FormFieldElementBase(HasValueElement):
             return super(FormFieldElementBase, self).displayval
         return self.submittedval
 
+    def _size_error(self, value):
+        """
+            returns an error message if the submitted value is larger than the
+            element (or form) limits allow, None otherwise.  This is checked
+            before any processing so that oversized input is rejected cheaply.
+        """
+        max_len = self.max_value_length
+        if is_notgiven(max_len):
+            max_len = self.form._max_value_length
+        max_list = self.max_list_length
+        if is_notgiven(max_list):
+            max_list = self.form._max_list_length
+
+        if isinstance(value, (str, bytes)):
+            if max_len is not None and len(value) > max_len:
+                return 'value is too long (maximum is %d characters)' % max_len
+        elif isinstance(value, (list, tuple)):
+            if max_list is not None and len(value) > max_list:
+                return 'too many values submitted (maximum is %d)' % max_list
+            if max_len is not None:
+                for item in value:
+                    if isinstance(item, (str, bytes)) and len(item) > max_len:
+                        return 'value is too long (maximum is %d characters)' % max_len
+        return None
+
+    def _clear_state(self):
+        """ forget the submitted value and the results of processing it """
+        self._submittedval = NotGiven
+        self._safeval = NotGiven
+        self._valid = None
+        self.errors = []
+
+    def _reject_submitted(self, error):
+        """
+            mark the element invalid without processing (or keeping) the
+            submitted value
+        """
+        self._submittedval = NotGiven
+        self._safeval = NotGiven
+        self.errors = [error]
+        self._save_processed(NotGiven, False)
+
     @property
     def value(self):
         self._to_python_processing()
@@ -230,19 +379,105 @@ class FormFieldElementBase(HasValueElement):
     def required_empty_test(self, value):
         return is_empty(value)
 
-    def _to_python_processing(self):  # noqa
+    def _to_python_processing(self, fail_fast=False):
         """
         filters, validates, and converts the submitted value based on
         element settings and processors
+
+        If `fail_fast` (or the element's fail_fast setting) is True, processing
+        stops at the first error and the remaining processors are skipped.
         """
 
         # if the value has already been processed, don't process it again
         if self._valid is not None:
             return
 
-        valid = True
+        fail_fast = fail_fast or self.fail_fast
         value = self.submittedval
+        if type(value) in _scalar_types and not self.processors and \
+                not getattr(self, 'multiple', False) and not hooks.active and \
+                not (self.required and self.required_empty_test(value)):
+            # e.g. from JSON, only the type conversion applies (checkboxes
+            # submit False when unchecked, their required test is needed)
+            if self.vtype is not NotGiven:
+                value = _typed_converters[self.vtype](value)
+            if value is not NotGiven:
+                self._save_processed(value, True)
+                return
+            value = self.submittedval
+
+        value = self._prepare_value(value)
+        valid = self._check_required(value)
+
+        # process processors
+        for processor, msg in self.processors:
+            if fail_fast and not valid:
+                break
+            try:
+                mv_processor = MultiValues(processor)
+                if hooks.active:
+                    ap_value = hooks.call('processor', mv_processor.to_python, (value, self),
+                                          self.form, self, processor, value)
+                else:
+                    ap_value = mv_processor.to_python(value, self)
+
+                # FormEncode takes "empty" values and returns None
+                # Since NotGiven == '', FormEncode thinks its empty
+                # and returns None on us.  We override that here.
+                if ap_value is not None or value is not NotGiven:
+                    value = ap_value
+            except formencode.Invalid as e:
+                valid = False
+                self.add_error((msg or str(e)))
+        else:
+            # we rely on MultiValues for this, but if no processor,
+            # it doesn't get called
+            if getattr(self, 'multiple', False) and not is_iterable(value):
+                value = tolist(value)
+
+        value, valid = self._convert_value(value, valid, fail_fast)
+        self._save_processed(value, valid)
 
+    def _to_python_processing_many(self, values, fail_fast=False):
+        """
+        processes the submitted `values` (e.g. one per row of a batch) like
+        _to_python_processing() would, but applies each processor to all of
+        the values at once with its to_python_many().  Only for elements
+        that aren't multiple and whose processors are all batchable, see
+        blazeform.processors.BaseValidator.
+
+        Returns a (valid, value, errors) tuple for each value and leaves the
+        element's state cleared.
+        """
+        fail_fast = fail_fast or self.fail_fast
+        # [value, valid, errors] for each value
+        states = []
+        for value in values:
+            self.errors = []
+            value = self._prepare_value(value)
+            states.append([value, self._check_required(value), self.errors])
+
+        for processor, msg in self.processors:
+            pending = [state for state in states if state[1] or not fail_fast]
+            results = MultiValues(processor).to_python_many([state[0] for state in pending], self)
+            for state, result in zip(pending, results):
+                if isinstance(result, formencode.Invalid):
+                    state[1] = False
+                    state[2].append(msg or str(result))
+                elif result is not None or state[0] is not NotGiven:
+                    state[0] = result
+
+        retval = []
+        for value, valid, errors in states:
+            self._clear_state()
+            self.errors = errors
+            self._save_processed(*self._convert_value(value, valid, fail_fast))
+            retval.append((self._valid, self._safeval, errors))
+        self._clear_state()
+        return retval
+
+    def _prepare_value(self, value):
+        """ the submitted value stripped, with if_missing and if_empty applied """
         # strip if necessary
         if self.strip and isinstance(value, str):
             value = value.strip()
@@ -266,32 +501,20 @@ class FormFieldElementBase(HasValueElement):
         # standardize all empty values as None if if_empty not given
         elif is_empty(value) and not is_notgiven(value):
             value = None
+        return value
 
-        # process required
+    def _check_required(self, value):
+        """ adds the required error if applicable, returns False if it did """
         if self.required and self.required_empty_test(value):
-            valid = False
             self.add_error('field is required')
+            return False
+        return True
 
-        # process processors
-        for processor, msg in self.processors:
-            try:
-                processor = MultiValues(processor)
-                ap_value = processor.to_python(value, self)
-
-                # FormEncode takes "empty" values and returns None
-                # Since NotGiven == '', FormEncode thinks its empty
-                # and returns None on us.  We override that here.
-                if ap_value is not None or value is not NotGiven:
-                    value = ap_value
-            except formencode.Invalid as e:
-                valid = False
-                self.add_error((msg or str(e)))
-        else:
-            # we rely on MultiValues for this, but if no processor,
-            # it doesn't get called
-            if getattr(self, 'multiple', False) and not is_iterable(value):
-                value = tolist(value)
-
+    def _convert_value(self, value, valid, fail_fast):
+        """
+        the processed value converted to the vtype, returns the value and
+        whether it (still) is valid
+        """
         ###
         # Doing these again in case the processors changed the value
         ###
@@ -304,7 +527,7 @@ class FormFieldElementBase(HasValueElement):
 
         # process required
         if self.required and self.required_empty_test(value) and \
-                'field is required' not in self.errors:
+                'field is required' not in self.errors and not (fail_fast and not valid):
             valid = False
             self.add_error('field is required')
 
@@ -312,8 +535,12 @@ class FormFieldElementBase(HasValueElement):
         # the validators don't do anything if the value is empty and they WILL
         # try to convert our NotGiven value, which we want to avoid.  Therefore,
         # just skip the conversion.
-        if not is_empty(value):
+        if not is_empty(value) and not (fail_fast and not valid):
             # process type conversion
+            if self.vtype is not NotGiven and not hooks.active:
+                converted = _typed_converters[self.vtype](value)
+                if converted is not NotGiven:
+                    return converted, valid
             if self.vtype is not NotGiven:
                 if self.vtype in ('boolean', 'bool'):
                     tvalidator = formencode.compound.Any(fev.Bool(), fev.StringBool())
@@ -328,12 +555,18 @@ class FormFieldElementBase(HasValueElement):
                 elif self.vtype in ('unicode', 'uni'):
                     tvalidator = fev.UnicodeString
                 try:
-                    tvalidator = MultiValues(tvalidator, multi_check=False)
-                    value = tvalidator.to_python(value, self)
+                    mv_tvalidator = MultiValues(tvalidator, multi_check=False)
+                    if hooks.active:
+                        value = hooks.call('processor', mv_tvalidator.to_python, (value, self),
+                                           self.form, self, tvalidator, value)
+                    else:
+                        value = mv_tvalidator.to_python(value, self)
                 except formencode.Invalid as e:
                     valid = False
                     self.add_error(str(e))
+        return value, valid
 
+    def _save_processed(self, value, valid):
         # save
         if valid:
             self._safeval = value
@@ -351,8 +584,8 @@ class FormFieldElementBase(HasValueElement):
     def is_submitted(self):
         return self.submittedval is not NotGiven
 
-    def is_valid(self):
-        self._to_python_processing()
+    def is_valid(self, fail_fast=False):
+        self._to_python_processing(fail_fast)
         return self._valid
 
     def add_error(self, error):
@@ -371,10 +604,15 @@ class FormFieldElementBase(HasValueElement):
                 processor = processor()
 
         self.processors.append((processor, msg))
+        self.form._fingerprint_update('processor', self.id, processor, msg)
 
     def add_handler(self, exception_txt=NotGiven, error_msg=NotGiven, exc_type=NotGiven,
                     callback=NotGiven):
         self.exception_handlers.append((exception_txt, error_msg, exc_type, callback))
+        # the form's compiled handlers are out of date
+        self.form._handler_index = None
+        self.form._fingerprint_update('handler', self.id, exception_txt, error_msg, exc_type,
+                                      callback)
 
     def handle_exception(self, exc):
         def can_handle(error_msg):
@@ -544,6 +782,16 @@ form_elements['checkbox'] = CheckboxElement
 
 
 class FileElement(InputElementBase):
+    """
+        The extension and content type checks use what the browser sent about
+        the file.  allow_content(), maxbytes() and hash_content() check the
+        content itself: it is read from the translator's stream in chunks of
+        `chunk_size` bytes (and the stream returned to where it was), so the
+        stream must be seekable.
+    """
+
+    #: bytes read at a time by the content checks
+    chunk_size = 64 * 1024
 
     def __init__(self, form, eid, label=NotGiven, vtype=NotGiven, defaultval=NotGiven, strip=True,
                  **kwargs):
@@ -556,6 +804,9 @@ class FileElement(InputElementBase):
         self._denied_exts = []
         self._denied_types = []
         self._maxsize = NotGiven
+        self._allowed_content = []
+        self._maxbytes = None
+        self._hash_content = False
 
         # characterstics of this element
         self.is_defaultable = False
@@ -604,7 +855,67 @@ class FileElement(InputElementBase):
         "denied mime type strings"
         self._denied_types.extend(args)
 
-    def _to_python_processing(self):
+    def allow_content(self, *args):
+        "allowed mime type strings, of the type sniffed from the content"
+        self._allowed_content.extend(args)
+
+    def maxbytes(self, size):
+        "set the maximum size of the content, reading stops once it's exceeded"
+        self._maxbytes = size
+
+    def hash_content(self, enabled=True):
+        "compute the SHA-256 of the content, as the submitted value's sha256"
+        self._hash_content = enabled
+
+    def _check_content(self, value):
+        """
+            reads the content (as far as needed) to sniff its type, size and
+            hash, returns the errors
+        """
+        stream = value.stream
+        try:
+            seekable = stream is not None and stream.seekable()
+        except AttributeError:
+            # e.g. SpooledTemporaryFile before Python 3.11
+            seekable = hasattr(stream, 'seek') and hasattr(stream, 'tell')
+        if not seekable:
+            return ['the file\'s content could not be checked']
+        sha256 = hashlib.sha256() if self._hash_content else None
+        # the type only needs the first bytes
+        read_all = sha256 is not None or self._maxbytes is not None
+        head = b''
+        size = 0
+        start = stream.tell()
+        try:
+            while True:
+                chunk = stream.read(self.chunk_size)
+                if not chunk:
+                    break
+                if len(head) < SNIFF_LENGTH:
+                    head += chunk[:SNIFF_LENGTH - len(head)]
+                size += len(chunk)
+                if self._maxbytes is not None and size > self._maxbytes:
+                    return ['file too big, max size %s' % self._maxbytes]
+                if sha256 is not None:
+                    sha256.update(chunk)
+                if not read_all and len(head) == SNIFF_LENGTH:
+                    break
+        finally:
+            stream.seek(start)
+
+        value.sniffed_type = sniff_content_type(head)
+        if read_all:
+            value.size = size
+        if sha256 is not None:
+            value.sha256 = sha256.hexdigest()
+        if self._allowed_content:
+            if value.sniffed_type is None:
+                return ['the file\'s content type could not be determined']
+            if value.sniffed_type not in self._allowed_content:
+                return ['file content "%s" not allowed' % value.sniffed_type]
+        return []
+
+    def _to_python_processing(self, fail_fast=False):
         # if the value has already been processed, don't process it again
         if self._valid is not None:
             return
@@ -652,6 +963,13 @@ class FileElement(InputElementBase):
                     valid = False
                     self.add_error('file too big (%s), max size %s' %
                                    (value.content_length, self._maxsize))
+
+            # only read the content of files that are otherwise acceptable
+            if valid and (self._allowed_content or self._maxbytes is not None or
+                          self._hash_content):
+                for error in self._check_content(value):
+                    valid = False
+                    self.add_error(error)
         elif self.required:
             valid = False
             self.add_error('field is required')
@@ -920,12 +1238,12 @@ class SelectElement(FormFieldElementBase):
     def __call__(self, **kwargs):
         return self.render(**kwargs)
 
-    def _to_python_processing(self):
+    def _to_python_processing(self, fail_fast=False):
         """
             if "choose" value was chosen, we need to return an emtpy
             value appropriate to `multi`
         """
-        FormFieldElementBase._to_python_processing(self)
+        FormFieldElementBase._to_python_processing(self, fail_fast)
         # multiple select fields should always return a list
         if self.multiple and not is_notgiven(self._safeval):
             self._safeval = tolist(self._safeval)
@@ -1124,7 +1442,7 @@ class LogicalGroupElement(FormFieldElementBase):
         if is_given(value) and self.is_valid():
             self._set_members(self.value)
 
-    def _to_python_processing(self):
+    def _to_python_processing(self, fail_fast=False):
         """
             we may need to add a processor, but this can't happen in init
             because we want to allow more members to be added
@@ -1133,13 +1451,13 @@ class LogicalGroupElement(FormFieldElementBase):
             self.to_python_first = False
             if self.auto_validate:
                 options = list(self.members.items())
-                if self.required:
-                    self.add_processor(Select(options, self.invalid), self.error_msg)
-                else:
+                if not self.required:
                     # NotGiven is a valid option as long as a value isn't required
-                    self.add_processor(Select(options + [(NotGivenIter, 0)], self.invalid),
-                                       self.error_msg)
-        FormFieldElementBase._to_python_processing(self)
+                    options.append((NotGivenIter, 0))
+                # not with add_processor(), the processor follows from the
+                # members and must not change the form's fingerprint()
+                self.processors.append((Select(options, self.invalid), self.error_msg))
+        FormFieldElementBase._to_python_processing(self, fail_fast)
 
     def _set_members(self, values):
         # convert to dict with unicode keys so our comparisons are always
@@ -1277,6 +1595,338 @@ class GroupElement(StaticElement, ElementRegistrar):
 form_elements['elgroup'] = GroupElement
 
 
+class FormSetElement(HasValueElement, ElementRegistrar):
+    """
+    Repeating rows of the same fields, e.g. the lines of an invoice:
+
+        lines = form.add_formset('lines', 'Lines', rows=3)
+        lines.add_text('description', 'Description', required=True)
+        lines.add_text('quantity', 'Quantity', vtype='int')
+
+    The fields are defined once, on the formset's template form, and rows only
+    keep their own state: the submitted values, defaults and errors.  A row is
+    validated (and rendered) by loading its state into the template's
+    elements, so fields in a row can refer to each other (e.g. confirm).
+
+    Rows are submitted as "<formset>-<row>-<field>" and "<formset>-rows"
+    holds the number of rows, so rows can be added on the client.  The value
+    is a list with a dict of the field values for each row, defaults are set
+    the same way.  Rows where nothing was filled in are left out of the value
+    and not validated if `skip_empty` is True.  File fields, element groups,
+    radio buttons and multi checkboxes are not supported.
+    """
+
+    def __init__(self, form, eid, label=NotGiven, rows=1, extra=0, max_rows=1000,
+                 skip_empty=False, defaultval=NotGiven, **kwargs):
+        # imported here, the form module imports this one
+        from blazeform.form import Form
+
+        #: number of blank rows after the rows for the defaults
+        self.extra = extra
+        #: the number of rows rendered
+        self.rows = rows
+        self.max_rows = max_rows
+        self.skip_empty = skip_empty
+        self.required = kwargs.pop('required', False)
+        self.nameattr = kwargs.pop('name', None)
+        self.fail_fast = kwargs.pop('fail_fast', False)
+        self._submittedval = NotGiven
+        self._safeval = NotGiven
+        self._valid = None
+        #: the formset's errors, including those of the rows' fields
+        self.errors = []
+        # the messages about the rows' fields in errors
+        self._row_messages = []
+        # the rows' state, a blazeform.batch.ColumnStore
+        self._store = None
+        self.exception_handlers = []
+        HasValueElement.__init__(self, form, eid, label, defaultval, **kwargs)
+        self.add_attr('class', 'formset')
+
+        # bypass FormMeta, the template isn't a form of its own
+        self.template = Form.__new__(Form)
+        Form.__init__(self.template, form._name, static=form._static,
+                      max_value_length=form._max_value_length,
+                      max_list_length=form._max_list_length)
+        self.template._fingerprint_update = self._fingerprint_update
+        ElementRegistrar.__init__(self, self.template)
+        self._compiled = None
+
+    def _fingerprint_update(self, *part):
+        self.form._fingerprint_update('formset', self.id, *part)
+
+    def _create_element(self, type, eid, *args, **kwargs):
+        eclass = self.template._registered_types.get(type)
+        if eclass is not None and issubclass(
+                eclass, (FileElement, GroupElement, FormSetElement, LogicalSupportElement)):
+            raise ProgrammingError('%s elements are not supported in formsets' % type)
+        self._compiled = None
+        return ElementRegistrar._create_element(self, type, eid, *args, **kwargs)
+
+    @property
+    def fields(self):
+        return [el for el in self.template.els.values()
+                if el.id != self.template._form_ident_field]
+
+    @property
+    def defaultval(self):
+        return self._defaultval
+
+    @defaultval.setter
+    def defaultval(self, value):
+        self._displayval = NotGiven
+        self._defaultval = value
+        if not is_notgiven(value):
+            self.rows = len(value) + self.extra
+
+    @property
+    def submittedval(self):
+        return self._submittedval
+
+    @submittedval.setter
+    def submittedval(self, value):
+        self._valid = None
+        self.errors = []
+        self._store = None
+        self._submittedval = value
+        if not is_notgiven(value):
+            self.rows = len(value)
+
+    def is_submitted(self):
+        return self._submittedval is not NotGiven
+
+    def _key(self, row, el):
+        return '%s-%d-%s' % (self.nameattr or self.id, row, el.nameattr or el.id)
+
+    def _set_submitted_rows(self, values):
+        """ read the rows from the form's submitted values """
+        rows_key = '%s-rows' % (self.nameattr or self.id)
+        if rows_key not in values:
+            self.submittedval = NotGiven
+            return
+        try:
+            count = int(values.get(rows_key))
+            if count < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            self._reject_submitted('invalid number of rows')
+            return
+        if count > self.max_rows:
+            self._reject_submitted('too many rows submitted (maximum is %d)' % self.max_rows)
+            return
+
+        rows = []
+        fields = [el for el in self.fields if el.is_submittable]
+        for row in range(count):
+            submitted = {}
+            for el in fields:
+                key = self._key(row, el)
+                if key in values:
+                    multiple = getattr(el, 'multiple', False)
+                    submitted[el.nameattr or el.id] = values.get(key, multiple)
+                elif isinstance(el, (CheckboxElement, MultiSelectElement)):
+                    submitted[el.nameattr or el.id] = None
+            rows.append(submitted)
+        self.submittedval = rows
+
+    def _set_submitted_list(self, values):
+        """ read the rows from a JSON submission, a list of dicts """
+        key = self.nameattr or self.id
+        if key not in values:
+            self.submittedval = NotGiven
+            return
+        rows = values.get(key)
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            self._reject_submitted('invalid rows')
+            return
+        if len(rows) > self.max_rows:
+            self._reject_submitted('too many rows submitted (maximum is %d)' % self.max_rows)
+            return
+        fields = [el for el in self.fields if el.is_submittable]
+        checked = []
+        for number, row in enumerate(rows, 1):
+            row = dict(row)
+            for el in fields:
+                key = el.nameattr or el.id
+                if key in row:
+                    row[key], error = _json_value(el, row[key])
+                    if error:
+                        self._reject_submitted('row %d: %s: %s' % (number, el.label, error))
+                        return
+            checked.append(row)
+        self.submittedval = checked
+
+    def _reject_submitted(self, error):
+        self._submittedval = NotGiven
+        self._safeval = NotGiven
+        self.errors = [error]
+        self._store = None
+        self._valid = False
+
+    def _clear_state(self):
+        """ forget the submitted rows and the results of validating them """
+        self.submittedval = NotGiven
+
+    def _to_python_processing(self, fail_fast=False):
+        """ validate the rows, one after the other through the template's elements """
+        # imported here, the batch module imports this one
+        from blazeform.batch import validate_rows
+
+        if self._valid is not None:
+            return
+        rows = self._submittedval if is_given(self._submittedval) else []
+        store = validate_rows(self.fields, rows, fail_fast=fail_fast or self.fail_fast,
+                              skip_empty=self.skip_empty)
+        self._store = store
+        valid = store.is_valid()
+        values = [store.row(index) for index in range(len(store)) if not store.skipped[index]]
+
+        if self.required and not values and valid:
+            valid = False
+            self.errors.append('field is required')
+        labels = dict((el.nameattr or el.id, el.label) for el in self.fields
+                      if el.is_submittable)
+        self._row_messages = [
+            'row %d: %s: %s' % (row + 1, labels[store.keys[column]], msg)
+            for row, column, msg in zip(store.error_rows, store.error_columns,
+                                        store.error_messages)
+        ]
+        self.errors.extend(self._row_messages)
+        self._valid = valid
+        self._safeval = values if valid else NotGiven
+
+    def is_valid(self, fail_fast=False):
+        self._to_python_processing(fail_fast)
+        return self._valid
+
+    @property
+    def value(self):
+        self._to_python_processing()
+        if not self._valid:
+            raise ElementInvalid(self.label)
+        return self._safeval
+
+    @property
+    def row_errors(self):
+        """ for each row validated, a dict of field name -> errors """
+        if self._store is None:
+            return []
+        return [self._store.errors(index) for index in range(len(self._store))]
+
+    @property
+    def formset_errors(self):
+        """ the errors that are not about one of the rows' fields """
+        row_messages = set(map(id, self._row_messages))
+        return [msg for msg in self.errors if id(msg) not in row_messages]
+
+    def add_error(self, error):
+        self.errors.append(error)
+
+    def add_row(self, defaults=None):
+        """ add a row at the end, `defaults` is a dict of field id -> default """
+        if defaults:
+            current = [] if is_notgiven(self._defaultval) else self._defaultval
+            current = current[:self.rows] + [{}] * (self.rows - len(current))
+            self._defaultval = current + [defaults]
+            self._displayval = NotGiven
+        self.rows += 1
+
+    def remove_row(self, index):
+        """ remove the row at `index` (its submitted values and defaults) """
+        if not 0 <= index < self.rows:
+            raise IndexError('formset has no row %d' % index)
+        if is_given(self._submittedval) and index < len(self._submittedval):
+            self._submittedval = self._submittedval[:index] + self._submittedval[index + 1:]
+            self._valid = None
+            self.errors = []
+            self._store = None
+        if is_given(self._defaultval) and index < len(self._defaultval):
+            self._defaultval = self._defaultval[:index] + self._defaultval[index + 1:]
+            self._displayval = NotGiven
+        self.rows -= 1
+
+    def _compile(self):
+        """
+            the fields rendered, the table head and the row markup, with a
+            %s for each field's cell
+        """
+        if self._compiled is None:
+            fields = [el for el in self.fields if el.is_renderable]
+            head = ''.join('<th>%s</th>' % html.escape(str(el.label) if el.label.value else '')
+                           for el in fields if not isinstance(el, HiddenElement))
+            cells = ''.join(
+                '%s' if isinstance(el, HiddenElement)
+                else '<td class="%s">%%s</td>' % html.escape(el.id).replace('%', '%%')
+                for el in fields
+            )
+            self._compiled = fields, '<thead><tr>%s</tr></thead>' % head, \
+                '<tr class="formset-row">%s</tr>' % cells
+        return self._compiled
+
+    def _render_cell(self, el, row, submitted, defaults, errors):
+        attributes = el.attributes
+        if not isinstance(el, FormFieldElementBase):
+            # e.g. static and header elements, the same in each row
+            try:
+                el.attributes = dict(attributes)
+                name = '%s-%d-%s' % (self.nameattr or self.id, row, el.id)
+                return str(el.render(id='%s-%s' % (self.form._name, name)))
+            finally:
+                el.attributes = attributes
+
+        defaultval = el._defaultval
+        nameattr = el.nameattr
+        try:
+            el.attributes = dict(attributes)
+            key = nameattr or el.id
+            if key in submitted:
+                el._submittedval = submitted[key]
+            el.errors = errors.get(key, [])
+            if el.id in defaults:
+                el.defaultval = defaults[el.id]
+            # the elements render their name attribute from nameattr
+            el.nameattr = self._key(row, el)
+            output = str(el.render(id='%s-%s' % (self.form._name, el.nameattr)))
+            for msg in el.errors:
+                output += '<p class="error">%s</p>' % html.escape(str(msg))
+            return output
+        finally:
+            el.attributes = attributes
+            el.nameattr = nameattr
+            el.defaultval = defaultval
+            el._clear_state()
+
+    def __call__(self, **kwargs):
+        return self.render(**kwargs)
+
+    def render(self, **kwargs):
+        self.set_attrs(**kwargs)
+        self.template._static = self.form._static
+        fields, head, row_template = self._compile()
+        submitted_rows = self._submittedval if is_given(self._submittedval) else []
+        default_rows = self._defaultval if is_given(self._defaultval) else []
+
+        rows = []
+        for row in range(self.rows):
+            submitted = submitted_rows[row] if row < len(submitted_rows) else {}
+            defaults = default_rows[row] if row < len(default_rows) else {}
+            errors = {}
+            if self._store is not None and row < len(self._store):
+                errors = self._store.errors(row)
+            rows.append(row_template % tuple(
+                self._render_cell(el, row, submitted, defaults, errors) for el in fields
+            ))
+        table = HTML.table(literal('%s<tbody>%s</tbody>' % (head, ''.join(rows))),
+                           **self.attributes)
+        if self.form._static:
+            return table
+        return HTML.input(type='hidden', name='%s-rows' % (self.nameattr or self.id),
+                          value=str(self.rows)) + table
+
+
+form_elements['formset'] = FormSetElement
+
+
 class HeaderElement(StaticElement):
     """
     A rendering element used for adding headers to a form.  It can also be used,
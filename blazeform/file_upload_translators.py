@@ -1,10 +1,66 @@
+import codecs
+
+# (offset, magic bytes, content type) of the types sniff_content_type() knows
+_signatures = (
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'II*\x00', 'image/tiff'),
+    (0, b'MM\x00*', 'image/tiff'),
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'PK\x05\x06', 'application/zip'),
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (0, b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (0, b'Rar!\x1a\x07', 'application/vnd.rar'),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'fLaC', 'audio/flac'),
+    (0, b'ID3', 'audio/mpeg'),
+    (4, b'ftyp', 'video/mp4'),
+    (257, b'ustar', 'application/x-tar'),
+)
+#: the number of bytes sniff_content_type() needs
+SNIFF_LENGTH = 262
+
+
+def sniff_content_type(head):
+    """
+        The content type of a file from its first SNIFF_LENGTH bytes, by its
+        magic bytes, "text/plain" for UTF-8 text without NUL characters or
+        None if unknown.
+    """
+    for offset, magic, content_type in _signatures:
+        if head[offset:offset + len(magic)] == magic:
+            return content_type
+    if head[8:12] == b'WEBP' and head[:4] == b'RIFF':
+        return 'image/webp'
+    if head and b'\x00' not in head:
+        try:
+            # the head may end in the middle of a character
+            codecs.getincrementaldecoder('utf-8')().decode(head)
+        except UnicodeDecodeError:
+            return None
+        return 'text/plain'
+    return None
+
 
 class BaseTranslator(object):
 
-    def __init__(self, file_name, content_type, content_length):
+    def __init__(self, file_name, content_type, content_length, stream=None):
         self.file_name = file_name
         self.content_type = content_type
         self.content_length = content_length
+        #: a binary file object of the content, if available
+        self.stream = stream
+        # set by FileElement when it checks the content
+        #: the content type from the content's first bytes
+        self.sniffed_type = None
+        #: the number of bytes of the content
+        self.size = None
+        #: hex digest of the content, if FileElement.hash_content() was used
+        self.sha256 = None
 
     @property
     def is_uploaded(self):
@@ -16,4 +72,5 @@ class BaseTranslator(object):
 class WerkzeugTranslator(BaseTranslator):
 
     def __init__(self, value):
-        BaseTranslator.__init__(self, value.filename, value.content_type, value.content_length)
+        BaseTranslator.__init__(self, value.filename, value.content_type, value.content_length,
+                                value.stream)
@@ -1,26 +1,179 @@
+import collections
+import collections.abc
+import datetime
+import decimal
 import formencode
+import hashlib
 import inspect
+import json
+import re
+import typing
 from blazeutils.datastructures import LazyOrderedDict
 
 from blazeform.element import form_elements, CancelElement, CheckboxElement, \
-    MultiSelectElement, LogicalGroupElement
+    FileElement, FormSetElement, MultiSelectElement, LogicalGroupElement, _json_value
 from blazeform.exceptions import ElementInvalid, ProgrammingError
 from blazeform.file_upload_translators import WerkzeugTranslator
+from blazeform.instrumentation import hooks, Event
 from blazeform.processors import Wrapper
-from blazeform.util import HtmlAttributeHolder, NotGiven, ElementRegistrar, is_notgiven
+from blazeform.submission_adapters import adapt_submission, DictAdapter
+from blazeform.util import HtmlAttributeHolder, NotGiven, ElementRegistrar, is_notgiven, \
+    ExceptionHandlerIndex, canonical_repr
+
+
+def _get_renderer(el):
+    # imported here to avoid a circular import and so the rendering
+    # dependencies are only loaded when a form is rendered
+    from blazeform.render import get_renderer
+    return get_renderer(el)
+
+
+# state in these containers is copied by checkpoint(), so changes made to them
+# in place can be undone
+_copied_types = (dict, list)
+
+
+def _save_state(obj):
+    return dict(
+        (key, value.copy() if type(value) in _copied_types else value)
+        for key, value in obj.__dict__.items() if key != '_checkpoint'
+    )
+
+
+def _restore_state(obj, saved):
+    state = obj.__dict__
+    for key in [key for key in state if key not in saved and key != '_checkpoint']:
+        del state[key]
+    for key, value in saved.items():
+        current = state.get(key, NotGiven)
+        if type(value) in _copied_types:
+            # only replace containers that changed
+            if type(current) is not type(value) or current != value:
+                state[key] = value.copy()
+        elif current is not value:
+            state[key] = value
+
+
+# the annotations of record_type() fields by vtype
+_vtype_types = {
+    'boolean': bool,
+    'bool': bool,
+    'integer': int,
+    'int': int,
+    'number': float,
+    'num': float,
+    'float': float,
+    'decimal': decimal.Decimal,
+    'str': str,
+    'string': str,
+    'unicode': str,
+    'uni': str,
+}
+# record_type() classes by name and fields, forms with the same returning
+# elements share them
+_record_types = {}
+
+
+def _record_type(form_name, fields):
+    key = (form_name, fields)
+    try:
+        return _record_types[key]
+    except KeyError:
+        pass
+    typename = ''.join(part.capitalize() for part in re.split(r'[\W_]+', form_name)) + 'Record'
+    if not typename.isidentifier():
+        typename = 'FormRecord'
+    names = [re.sub(r'\W', '_', name) for name, annotation in fields]
+    cls = collections.namedtuple(typename, names, rename=True)
+    cls.__annotations__ = dict(zip(cls._fields, [annotation for name, annotation in fields]))
+    _record_types[key] = cls
+    return cls
+
+
+#: the format of snapshot()s, restore() rejects others
+SNAPSHOT_VERSION = 1
+
+# values JSON doesn't have, saved as {"$t": tag, "v": str(value)}.  Dicts
+# with a "$t" key are saved as {"$t": "dict", "v": [[key, value], ...]}.
+_snapshot_types = (
+    ('datetime', datetime.datetime, datetime.datetime.fromisoformat),
+    ('date', datetime.date, datetime.date.fromisoformat),
+    ('time', datetime.time, datetime.time.fromisoformat),
+    ('decimal', decimal.Decimal, decimal.Decimal),
+)
+_snapshot_parsers = dict((tag, parse) for tag, cls, parse in _snapshot_types)
+
+
+def _snapshot_default(value):
+    for tag, cls, parse in _snapshot_types:
+        if isinstance(value, cls):
+            return {'$t': tag, 'v': str(value)}
+    raise TypeError('%r can not be saved in a snapshot' % (value,))
+
+
+def _snapshot_escape(value):
+    """ the value with the dicts that have a "$t" key escaped """
+    if isinstance(value, dict):
+        value = dict((key, _snapshot_escape(item)) for key, item in value.items())
+        if '$t' in value:
+            return {'$t': 'dict', 'v': [[key, item] for key, item in value.items()]}
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_snapshot_escape(item) for item in value]
+    return value
+
+
+def _snapshot_object_hook(obj):
+    if '$t' in obj:
+        tag = obj['$t']
+        if tag == 'dict':
+            return dict(obj['v'])
+        try:
+            parse = _snapshot_parsers[tag]
+        except (KeyError, TypeError):
+            raise ValueError('unknown snapshot value type: %r' % (tag,))
+        return parse(obj['v'])
+    return obj
+
+
+class FormMeta(type):
+    """
+    Times the complete construction of a form (including the subclass's
+    __init__) when instrumentation is active.
+    """
 
-# fix the bug in the formencode MaxLength validator
-from formencode.validators import MaxLength
-MaxLength._messages['__buggy_toolong'] = MaxLength._messages['tooLong']
-MaxLength._messages['tooLong'] = 'Enter a value not greater than %(maxLength)i characters long'
+    def __call__(cls, *args, **kwargs):
+        if not hooks.active:
+            return cls._construct_form(args, kwargs)
+        started = hooks.start()
+        form = cls._construct_form(args, kwargs)
+        event = Event('form_init', form)
+        event.result = form
+        hooks.finish(event, started)
+        return form
 
+    def _construct_form(cls, args, kwargs):
+        return type.__call__(cls, *args, **kwargs)
 
-class FormBase(HtmlAttributeHolder, ElementRegistrar):
+
+class FormBase(HtmlAttributeHolder, ElementRegistrar, metaclass=FormMeta):
     """
     Base class for forms.
     """
 
     def __init__(self, name, static=False, **kwargs):
+        # limits on the size of submitted values, None means no limit.
+        # Elements can override the value and list limits.
+        self._max_value_length = kwargs.pop('max_value_length', None)
+        self._max_list_length = kwargs.pop('max_list_length', None)
+        self._max_submitted_keys = kwargs.pop('max_submitted_keys', None)
+        # the structural fingerprint is a digest chained over the parts of the
+        # definition as they are added, folded in when fingerprint() is called
+        self._fingerprint_digest = b''
+        self._fingerprint_parts = [('form', self.__class__, name, static, kwargs)]
+        # incremented with each change to the definition, the caches of the
+        # definition are keyed on it
+        self._definition_version = 0
         HtmlAttributeHolder.__init__(self, **kwargs)
         ElementRegistrar.__init__(self, self)
 
@@ -43,14 +196,27 @@ class FormBase(HtmlAttributeHolder, ElementRegistrar):
         self._fu_translator = WerkzeugTranslator
         # form errors
         self._errors = []
+        # was the submission rejected before processing (e.g. too many keys)?
+        self._submission_rejected = False
         # exception handlers
         self._exception_handlers = []
+        # form and element exception handlers compiled for lookup, built
+        # when first needed
+        self._handler_index = None
         # is the form static?
         self._static = static
+        # the form's and elements' state saved by checkpoint()
+        self._checkpoint = None
+        # (definition version, [(key, element)], {key: element}) of the
+        # returning elements, see get_values()
+        self._returning_cache = None
+        # (definition version, record_type(), returning elements), see
+        # values_as()
+        self._record_cache = None
 
         # init actions
         self.register_elements(form_elements)
-        self.add_hidden(self._form_ident_field, value='submitted')
+        self.add_hidden(self._form_ident_field, value='submitted', max_value_length=None)
 
     @property
     def defaultable_els(self):
@@ -85,7 +251,129 @@ class FormBase(HtmlAttributeHolder, ElementRegistrar):
             raise ValueError('type "%s" is already registered' % type)
         self._registered_types[type] = eclass
 
+    def _fingerprint_update(self, *part):
+        self._fingerprint_parts.append(part)
+        self._definition_version += 1
+
+    def fingerprint(self):
+        """
+            A hex digest of the form's structure: its class, name and
+            attributes, and each element, processor, validator and exception
+            handler added (with their arguments) in the order they were added.
+            It is the same across processes, so it can be used as a cache key.
+
+            Changes made after an element is created other than with its
+            add_processor() and add_handler() (e.g. set_attr()) are not
+            included.
+        """
+        if self._fingerprint_parts:
+            digest = self._fingerprint_digest
+            for part in self._fingerprint_parts:
+                digest = hashlib.sha256(digest + canonical_repr(part).encode('utf-8')).digest()
+            self._fingerprint_digest = digest
+            self._fingerprint_parts = []
+        return self._fingerprint_digest.hex()
+
+    def __getstate__(self):
+        # the record type may not be importable, it's made again when needed
+        state = self.__dict__.copy()
+        state['_returning_cache'] = None
+        state['_record_cache'] = None
+        return state
+
+    def checkpoint(self):
+        """
+            Save the state of the form and its elements, reset() returns them
+            to it.  Call it once the form is defined, elements added later are
+            not removed by reset().
+        """
+        self._checkpoint = [(self, _save_state(self))]
+        self._checkpoint.extend((el, _save_state(el)) for el in self.els.values())
+
+    def reset(self):
+        """
+            Return the form and its elements to the state saved by
+            checkpoint(): submitted and default values, validation results,
+            errors and attributes set while rendering.  Only state that changed
+            is copied, so a form can be reused instead of constructing a new
+            one, e.g. by a FormPool.
+        """
+        if self._checkpoint is None:
+            raise ProgrammingError('reset() needs the state saved by checkpoint()')
+        for obj, saved in self._checkpoint:
+            _restore_state(obj, saved)
+
+    def snapshot(self):
+        """
+            The per-request state of the form as a compact JSON string, to
+            keep between the steps of a wizard (e.g. in a signed cookie or the
+            session) instead of the whole form.  It holds, by element id, the
+            submitted values, the defaults that differ from checkpoint() (all
+            defaults that were set if there is no checkpoint) and the errors,
+            plus the form's errors.  Submitted files are not included.
+
+            Values other than those JSON supports, dates, times and decimals
+            raise a TypeError.
+        """
+        saved = dict((id(obj), state) for obj, state in self._checkpoint or ())
+        data = {'v': SNAPSHOT_VERSION, 'f': self._name}
+        submitted = {}
+        defaults = {}
+        errors = {}
+        for el in self.els.values():
+            if el.is_defaultable:
+                original = saved.get(id(el), {}).get('_defaultval', NotGiven)
+                if not is_notgiven(el._defaultval) and el._defaultval is not original \
+                        and el._defaultval != original:
+                    defaults[el.id] = _snapshot_escape(el._defaultval)
+            if not el.is_submittable or isinstance(el, FileElement):
+                continue
+            if not is_notgiven(el._submittedval):
+                submitted[el.id] = _snapshot_escape(el._submittedval)
+            if el.errors:
+                errors[el.id] = el.errors
+        for key, value in (('s', submitted), ('d', defaults), ('e', errors),
+                           ('fe', self._errors), ('r', self._submission_rejected)):
+            if value:
+                data[key] = value
+        return json.dumps(data, separators=(',', ':'), default=_snapshot_default)
+
+    def restore(self, snapshot):
+        """
+            Set the state saved by snapshot() on this form, which should be a
+            new (or reset()) instance of the same form.  Elements that are not
+            in the snapshot are left alone, ids the form doesn't have are
+            ignored.  Elements that had errors are invalid again, the others
+            are validated when needed.
+        """
+        data = json.loads(snapshot, object_hook=_snapshot_object_hook)
+        if data.get('v') != SNAPSHOT_VERSION:
+            raise ValueError('unsupported snapshot version: %r' % data.get('v'))
+        if data['f'] != self._name:
+            raise ValueError('snapshot is of form "%s", not "%s"' % (data['f'], self._name))
+        if data.get('s') and self._static:
+            raise ProgrammingError('static forms should not get submitted values')
+
+        for eid, value in data.get('d', {}).items():
+            if eid in self.els:
+                self.els[eid].defaultval = value
+        for eid, value in data.get('s', {}).items():
+            if eid in self.els:
+                self.els[eid].submittedval = value
+        for eid, errors in data.get('e', {}).items():
+            if eid in self.els:
+                el = self.els[eid]
+                el.errors = errors
+                el._valid = False
+        self._errors = data.get('fe', [])
+        self._submission_rejected = data.get('r', False)
+
     def render(self, **kwargs):
+        if hooks.active:
+            return hooks.call('render', self._render, (kwargs,), self)
+        return self._render(kwargs)
+
+    def _render(self, kwargs):
         return self._renderer(self).render(**kwargs)
 
     def is_submitted(self):
@@ -143,6 +431,7 @@ class FormBase(HtmlAttributeHolder, ElementRegistrar):
                 validator = validator()
 
         self._validators.append((validator, msg))
+        self._fingerprint_update('validator', validator, msg)
 
     def add_field_errors(self, errors):
         errors = errors.copy()
@@ -162,20 +451,42 @@ class FormBase(HtmlAttributeHolder, ElementRegistrar):
             return False
         return True
 
-    def is_valid(self):
-        if not self.is_submitted():
+    def is_valid(self, fail_fast=False):
+        """
+            Validates all submittable elements and then runs the form level
+            validators.
+
+            If `fail_fast` is True, validation stops at the first error: the
+            failing element only records its first error and the remaining
+            elements and form validators are not processed.  Useful when only
+            a yes/no answer (and the first error) is needed.
+        """
+        if hooks.active:
+            return hooks.call('validate', self._is_valid, (fail_fast,), self)
+        return self._is_valid(fail_fast)
+
+    def _is_valid(self, fail_fast):
+        if not self.is_submitted() or self._submission_rejected:
             return False
         valid = True
 
         # element validation
         for element in self.submittable_els:
-            if not element.is_valid():
+            if not element.is_valid(fail_fast):
                 valid = False
+                if fail_fast:
+                    return False
 
         # whole form validation
         for validator, msg in self._validators:
+            if fail_fast and not valid:
+                break
             try:
-                validator.to_python(self)
+                if hooks.active:
+                    hooks.call('form_validator', validator.to_python, (self,), self,
+                               processor=validator)
+                else:
+                    validator.to_python(self)
             except formencode.Invalid as e:
                 valid = False
                 msg = (msg or str(e))
@@ -191,40 +502,120 @@ class FormBase(HtmlAttributeHolder, ElementRegistrar):
 
         return valid
 
-    def _set_submitted_values(self, values):
+    def _set_submitted_values(self, values, source='form'):
         for el in self.submittable_els:
+            if isinstance(el, FormSetElement):
+                if source == 'json':
+                    el._set_submitted_list(values)
+                else:
+                    el._set_submitted_rows(values)
+                continue
             key = el.nameattr or el.id
             if key in values:
-                el.submittedval = values[key]
+                value = values.get(key, getattr(el, 'multiple', False))
+                error = el._size_error(value)
+                if not error and source == 'json':
+                    value, error = _json_value(el, value)
+                if error:
+                    el._reject_submitted(error)
+                else:
+                    el.submittedval = value
             elif isinstance(el, (CheckboxElement, MultiSelectElement, LogicalGroupElement)):
                 el.submittedval = None
 
-    def set_submitted(self, values):
-        """ values should be dict like """
+    def set_submitted(self, values, source='form'):
+        """
+            values should be dict like, a MultiDict like object (anything with
+            a getlist() method) or the raw bytes of an
+            application/x-www-form-urlencoded request body.
+
+            If `source` is "json", values is a dict decoded from JSON (or the
+            JSON str or bytes, decoded with decimals for numbers with a
+            fraction): a value must be of the JSON type of its element's vtype
+            (e.g. an integer for "int", not 5.7 or true) and is only type
+            checked, a list is only accepted by multiple elements and a
+            formset's value is a list of row dicts.  Values of other types
+            make the element invalid.  The form counts as submitted without
+            its submit flag.
+        """
+        if hooks.active:
+            return hooks.call('set_submitted', self._set_submitted, (values, source), self)
+        return self._set_submitted(values, source)
+
+    def _set_submitted(self, values, source='form'):
 
         # if the form is static, it shoudl not get submitted values
         if self._static:
             raise ProgrammingError('static forms should not get submitted values')
 
         self._errors = []
+        self._submission_rejected = False
+        if source == 'json':
+            if isinstance(values, (str, bytes, bytearray)):
+                # decimals keep the digits submitted
+                values = json.loads(values, parse_float=decimal.Decimal)
+            if not isinstance(values, dict):
+                raise ValueError('JSON values should be an object')
+            values = DictAdapter(values)
+        elif source == 'form':
+            values = adapt_submission(
+                values,
+                (el.nameattr or el.id for el in self.submittable_els),
+                ['%s-' % (el.nameattr or el.id) for el in self.submittable_els
+                 if isinstance(el, FormSetElement)]
+            )
+        else:
+            raise ValueError('source should be "form" or "json", got %r' % (source,))
 
         # ident field first since we need to know that to now if we need to
         # apply the submitted values
         identel = getattr(self.elements, self._form_ident_field)
         ident_key = identel.nameattr or identel.id
         if ident_key in values:
-            identel.submittedval = values[ident_key]
+            identel.submittedval = values.get(ident_key)
+        elif source == 'json':
+            identel.submittedval = 'submitted'
 
         if self._is_submitted():
-            self._set_submitted_values(values)
+            # distinct keys, whatever the type of the submission
+            max_keys = self._max_submitted_keys
+            if max_keys is not None and values.key_count() > max_keys:
+                self._submission_rejected = True
+                # a reused form must not keep the previous submission's values
+                for el in self.submittable_els:
+                    if el is not identel:
+                        el._clear_state()
+                self.add_error('too many values submitted')
+                return
+            self._set_submitted_values(values, source)
 
     def set_defaults(self, values):
         for el in self.defaultable_els:
             if el.id in values:
                 el.defaultval = values[el.id]
 
-    def get_values(self):
-        "return a dictionary of element values"
+    def _returning(self):
+        """ the returning elements by key, cached until the definition changes """
+        version = self._definition_version
+        if self._returning_cache is None or self._returning_cache[0] != version:
+            items = []
+            for element in self.returning_els:
+                try:
+                    key = element.nameattr or element.id
+                except AttributeError:
+                    key = element.id
+                items.append((key, element))
+            self._returning_cache = (version, items, dict(items))
+        return self._returning_cache
+
+    def get_values(self, only=None):
+        """
+            return a dictionary of element values, only of the elements with
+            the keys in `only` if given (the others aren't processed)
+        """
+        if only is not None:
+            by_key = self._returning()[2]
+            return dict((key, by_key[key].value) for key in only)
         retval = {}
         for element in self.returning_els:
             try:
@@ -235,38 +626,87 @@ class FormBase(HtmlAttributeHolder, ElementRegistrar):
         return retval
     values = property(get_values)
 
+    def values_view(self):
+        """
+            a read-only mapping of the element values like get_values(), but
+            an element's value is only processed when it is first read
+        """
+        return FormValues(self)
+
+    def _record_info(self):
+        version, items, by_key = self._returning()
+        if self._record_cache is None or self._record_cache[0] != version:
+            els = []
+            fields = []
+            for key, element in items:
+                if element.id == self._form_ident_field:
+                    continue
+                els.append(element)
+                fields.append((key, _vtype_types.get(getattr(element, 'vtype', None),
+                                                     typing.Any)))
+            self._record_cache = (version, _record_type(self._name, tuple(fields)), els)
+        return self._record_cache
+
+    def record_type(self):
+        """
+            A namedtuple class with a field for each returning element except
+            the submit flag, named like the keys of get_values() ("-" and other
+            characters replaced by "_", invalid names by _0, _1, ... by
+            position) and annotated with the type of its vtype.  It is made
+            once per form definition.
+        """
+        return self._record_info()[1]
+
+    def values_as(self, record_type=None):
+        """
+            The element values as a `record_type` (record_type() by default),
+            constructed with the values as positional arguments in the order
+            of the returning elements, without making a dict like
+            get_values().
+        """
+        version, default_type, els = self._record_info()
+        return (record_type or default_type)(*[element.value for element in els])
+
     def add_handler(self, exception_txt=NotGiven, error_msg=NotGiven, exc_type=NotGiven,
                     callback=NotGiven):
         self._exception_handlers.append((exception_txt, error_msg, exc_type, callback))
+        self._handler_index = None
+        self._fingerprint_update('handler', None, exception_txt, error_msg, exc_type, callback)
+
+    def _get_handler_index(self):
+        if self._handler_index is None:
+            index = ExceptionHandlerIndex()
+            # element handlers are tried before the form's handlers
+            for el in self.submittable_els:
+                for handler in el.exception_handlers:
+                    index.add(el, handler, check_type=False)
+            for handler in self._exception_handlers:
+                index.add(self, handler)
+            self._handler_index = index
+        return self._handler_index
 
     def handle_exception(self, exc):
-        def can_handle(error_msg):
-            self._valid = False
+        if hooks.active:
+            return hooks.call('handle_exception', self._handle_exception, (exc,), self,
+                              value=exc)
+        return self._handle_exception(exc)
+
+    def _handle_exception(self, exc):
+        def can_handle(owner, error_msg):
+            owner._valid = False
             if is_notgiven(error_msg):
                 error_msg = str(exc)
-            self.add_error(error_msg)
+            owner.add_error(error_msg)
             return True
 
-        # try element handlers first
-        for el in self.submittable_els:
-            if el.handle_exception(exc):
-                return True
-
-        for looking_for, error_msg, exc_type, callback in self._exception_handlers:
-            if not is_notgiven(exc_type):
-                if isinstance(exc_type, str):
-                    if exc.__class__.__name__ != exc_type:
-                        continue
-                else:
-                    if not isinstance(exc, exc_type):
-                        continue
+        for owner, handler in self._get_handler_index().candidates(exc):
+            looking_for, error_msg, exc_type, callback = handler
             if is_notgiven(callback):
-                if is_notgiven(looking_for):
-                    return can_handle(error_msg)
-                elif looking_for in str(exc):
-                    return can_handle(error_msg)
-            else:
+                return can_handle(owner, error_msg)
+            elif owner is self:
                 return callback(exc)
+            elif callback(exc):
+                return can_handle(owner, error_msg)
         return False
 
     def all_errors(self, id_as_key=False):
@@ -293,6 +733,29 @@ class FormBase(HtmlAttributeHolder, ElementRegistrar):
         return form_errors, field_errors
 
 
+class FormValues(collections.abc.Mapping):
+    """
+        The element values of a form by key (see FormBase.get_values()),
+        processed when read.  Reading an invalid element's value raises
+        ElementInvalid, and later changes to the form are seen.
+    """
+
+    def __init__(self, form):
+        self.form = form
+
+    def __getitem__(self, key):
+        return self.form._returning()[2][key].value
+
+    def __iter__(self):
+        return (key for key, element in self.form._returning()[1])
+
+    def __len__(self):
+        return len(self.form._returning()[1])
+
+    def __contains__(self, key):
+        return key in self.form._returning()[2]
+
+
 class Form(FormBase):
     """
     Main form class using default HTML renderer and Werkzeug file upload
@@ -305,6 +768,4 @@ class Form(FormBase):
 
         FormBase.__init__(self, name, static, **kwargs)
 
-        # import here or we get circular import problems
-        from blazeform.render import get_renderer
-        self._renderer = get_renderer
+        self._renderer = _get_renderer
@@ -0,0 +1,229 @@
+"""
+Validate a CSV or JSON lines file with a form and write the results as JSON
+lines:
+
+    from blazeform.ingest import ingest
+
+    counts = ingest(ContactForm, 'contacts.csv', 'contacts.jsonl', 'errors.jsonl',
+                    columns={'E-mail': 'email'})
+    log.info('%(valid)d of %(rows)d contacts imported', counts)
+
+The valid rows are written as objects of their processed values (dates,
+times and decimals as strings) and the errors as one object per row and
+element:
+
+    {"row": 2, "element": "email", "messages": ["An email address must contain a single @"]}
+
+"element" is null for the form's errors (and rows that couldn't be read).
+Rows are numbered from 1, the line after a CSV file's header being row 1,
+and blank lines are not rows.
+
+Rows are read lazily and validated `chunk_size` at a time with
+blazeform.batch, so memory use doesn't depend on the file's size.  With
+`processes`, chunks are validated by that many worker processes; the form
+factory must then be picklable (e.g. a form class defined in a module) and
+the results are still written in the file's order.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import csv
+import datetime
+import decimal
+from itertools import islice
+import json
+import os
+
+from blazeform.batch import validate_batch
+from blazeform.util import is_notgiven
+
+_formats = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+}
+# the worker process's form for each factory
+_worker_forms = {}
+
+
+class RowError(object):
+    """ a row that could not be read, in place of its values """
+
+    def __init__(self, message):
+        self.message = message
+
+
+def read_csv(source, columns=None, encoding='utf-8', **kwargs):
+    """
+        the rows of a CSV file (path or text stream) with a header row, as
+        dicts.  `columns` maps the file's column names to element ids, other
+        keyword arguments are passed to csv.DictReader.
+    """
+    with _opened(source, 'r', encoding) as stream:
+        for row in csv.DictReader(stream, **kwargs):
+            yield _renamed(row, columns)
+
+
+def read_jsonl(source, columns=None, encoding='utf-8'):
+    """
+        the rows of a JSON lines file (path or text stream), a JSON object per
+        line.  Blank lines are ignored and lines that aren't objects are
+        returned as RowError instances.
+    """
+    with _opened(source, 'r', encoding) as stream:
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield RowError('invalid JSON: %s' % e)
+                continue
+            if not isinstance(row, dict):
+                yield RowError('the line is not a JSON object')
+                continue
+            yield _renamed(row, columns)
+
+
+def ingest(factory, source, valid_out, errors_out, format=None, columns=None,
+           chunk_size=1024, processes=None, skip_empty=True, encoding='utf-8'):
+    """
+        Validate the rows of `source` (a CSV or JSON lines file path or text
+        stream) with the form returned by `factory` (a form class or a
+        function) and write the valid rows to `valid_out` and the errors to
+        `errors_out` (paths or text streams).
+
+        `format` is "csv" or "jsonl", from the source's extension if not
+        given.  `columns` maps the source's column names to element ids.
+
+        Returns a dict of counts: rows, valid, invalid and skipped (empty rows
+        if `skip_empty`).
+    """
+    if format is None:
+        format = _formats.get(os.path.splitext(_path(source) or '')[1].lower())
+    if format == 'csv':
+        rows = read_csv(source, columns, encoding)
+    elif format == 'jsonl':
+        rows = read_jsonl(source, columns, encoding)
+    else:
+        raise ValueError('unknown format, "csv" or "jsonl" expected')
+
+    counts = {'rows': 0, 'valid': 0, 'invalid': 0, 'skipped': 0}
+    with _opened(valid_out, 'w', encoding) as valid_stream, \
+            _opened(errors_out, 'w', encoding) as errors_stream:
+        for valid_lines, error_lines, chunk_counts in \
+                _validated_chunks(factory, rows, chunk_size, processes, skip_empty):
+            valid_stream.writelines(valid_lines)
+            errors_stream.writelines(error_lines)
+            for key, count in chunk_counts.items():
+                counts[key] += count
+    return counts
+
+
+def _validated_chunks(factory, rows, chunk_size, processes, skip_empty):
+    """ the results of _validate_chunk() for the rows' chunks, in order """
+    chunks = _chunks(rows, chunk_size)
+    if not processes or processes < 2:
+        form = factory()
+        for start, chunk in chunks:
+            yield _validate_chunk(form, start, chunk, skip_empty)
+        return
+
+    with ProcessPoolExecutor(processes) as executor:
+        # a few chunks per worker are read ahead, not the whole file
+        pending = []
+        for start, chunk in chunks:
+            pending.append(executor.submit(_validate_chunk_in_worker, factory, start, chunk,
+                                           skip_empty))
+            if len(pending) >= processes * 2:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def _chunks(rows, size):
+    """ (number of the first row, rows) for each chunk of `size` rows """
+    rows = iter(rows)
+    start = 1
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def _validate_chunk_in_worker(factory, start, rows, skip_empty):
+    try:
+        form = _worker_forms[factory]
+    except KeyError:
+        form = _worker_forms[factory] = factory()
+    return _validate_chunk(form, start, rows, skip_empty)
+
+
+def _validate_chunk(form, start, rows, skip_empty):
+    """ the valid rows' and errors' JSON lines and the counts of a chunk """
+    store = validate_batch(form, [row for row in rows if not isinstance(row, RowError)],
+                           skip_empty=skip_empty)
+    valid_lines = []
+    error_lines = []
+    counts = {'rows': len(rows), 'valid': 0, 'invalid': 0, 'skipped': 0}
+    index = 0
+    for number, row in enumerate(rows, start):
+        if isinstance(row, RowError):
+            counts['invalid'] += 1
+            error_lines.append(_error_line(number, None, [row.message]))
+            continue
+        if store.skipped[index]:
+            counts['skipped'] += 1
+        elif store.is_valid(index):
+            counts['valid'] += 1
+            valid_lines.append(_dumps(store.row(index)) + '\n')
+        else:
+            counts['invalid'] += 1
+            # a form validator may fail without a message
+            errors = store.errors(index) or {None: []}
+            for key, messages in errors.items():
+                error_lines.append(_error_line(number, key, messages))
+        index += 1
+    return valid_lines, error_lines, counts
+
+
+def _error_line(number, key, messages):
+    return _dumps({'row': number, 'element': key, 'messages': messages}) + '\n'
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if is_notgiven(value):
+        return None
+    raise TypeError('%r can not be written as JSON' % (value,))
+
+
+def _dumps(obj):
+    return json.dumps(obj, default=_json_default)
+
+
+def _renamed(row, columns):
+    if not columns:
+        return row
+    return dict((columns.get(key, key), value) for key, value in row.items())
+
+
+def _path(target):
+    if isinstance(target, (str, os.PathLike)):
+        return os.fspath(target)
+    return None
+
+
+@contextmanager
+def _opened(target, mode, encoding):
+    """ the stream for a path (closed afterwards), or the stream given """
+    path = _path(target)
+    if path is None:
+        yield target
+        return
+    with open(path, mode, encoding=encoding, newline='') as stream:
+        yield stream
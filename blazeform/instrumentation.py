@@ -0,0 +1,152 @@
+"""
+Hooks for timing what BlazeForm spends its time on.
+
+Subscribers are callables that receive an Event for each instrumented call:
+
+    from blazeform.instrumentation import hooks
+
+    def subscriber(event):
+        print(event.name, event.form_name, event.element_id, event.elapsed_ns)
+
+    hooks.subscribe(subscriber)
+
+Events are emitted for:
+
+    form_init           form construction (the complete __init__)
+    set_submitted       FormBase.set_submitted()
+    validate            FormBase.is_valid(), the result is True or False
+    processor           each processor (and vtype conversion) of an element
+    form_validator      each form level validator in FormBase.is_valid()
+    render              FormBase.render(), the result is the rendered HTML
+    render_row          each top level row rendered by FormRenderer.render(), the
+                        row's Renderer is given as the event's processor
+    handle_exception    FormBase.handle_exception()
+
+When nothing is subscribed, the instrumented code only checks `hooks.active`.
+"""
+import time
+
+from blazeform.util import NotGiven, LazyImport
+
+# only needed when tracking memory
+tracemalloc = LazyImport(globals(), 'tracemalloc', 'tracemalloc')
+
+
+class Event(object):
+    """
+        `form`, `element` and `processor` are the objects involved (when
+        applicable), `value` is the value given to a processor or validator
+        and `result` is what the call returned.  `error` is the exception
+        raised by the call, if any.  `memory_delta` is the change in memory
+        traced by tracemalloc during the call, only set when the hooks are
+        tracking memory.
+    """
+    __slots__ = ('name', 'form', 'element', 'processor', 'value', 'result', 'error',
+                 'elapsed_ns', 'memory_delta')
+
+    def __init__(self, name, form=None, element=None, processor=None, value=NotGiven):
+        self.name = name
+        self.form = form
+        self.element = element
+        self.processor = processor
+        self.value = value
+        self.result = NotGiven
+        self.error = None
+        self.elapsed_ns = None
+        self.memory_delta = None
+
+    @property
+    def form_name(self):
+        return getattr(self.form, '_name', None)
+
+    @property
+    def element_id(self):
+        return getattr(self.element, 'id', None)
+
+    @property
+    def processor_class(self):
+        if self.processor is None:
+            return None
+        if isinstance(self.processor, type):
+            return self.processor.__name__
+        return self.processor.__class__.__name__
+
+    def __repr__(self):
+        return '<Event %s form=%s element=%s processor=%s elapsed_ns=%s>' % (
+            self.name, self.form_name, self.element_id, self.processor_class, self.elapsed_ns
+        )
+
+
+class Instrumentation(object):
+
+    def __init__(self):
+        #: True when there is at least one subscriber
+        self.active = False
+        self.subscribers = []
+        self.clock = time.perf_counter_ns
+        #: record tracemalloc's traced memory change for each event?  Only
+        #: has an effect while tracemalloc is tracing.
+        self.track_memory = False
+
+    def subscribe(self, subscriber):
+        self.subscribers.append(subscriber)
+        self.active = True
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.remove(subscriber)
+        self.active = bool(self.subscribers)
+
+    def subscribed(self, subscriber):
+        """ context manager: subscriber only receives events inside the block """
+        return _Subscription(self, subscriber)
+
+    def emit(self, event):
+        for subscriber in list(self.subscribers):
+            subscriber(event)
+
+    def start(self):
+        """ returns the starting point to give to finish() """
+        memory = None
+        if self.track_memory and tracemalloc.is_tracing():
+            memory = tracemalloc.get_traced_memory()[0]
+        return self.clock(), memory
+
+    def finish(self, event, started):
+        """ record the measurements since start() on the event and emit it """
+        started_ns, started_memory = started
+        event.elapsed_ns = self.clock() - started_ns
+        if started_memory is not None and tracemalloc.is_tracing():
+            event.memory_delta = tracemalloc.get_traced_memory()[0] - started_memory
+        self.emit(event)
+
+    def call(self, name, func, args=(), form=None, element=None, processor=None,
+             value=NotGiven):
+        """ call func(*args), timing it, and emit an event """
+        event = Event(name, form, element, processor, value)
+        started = self.start()
+        try:
+            event.result = func(*args)
+            return event.result
+        except Exception as e:
+            event.error = e
+            raise
+        finally:
+            self.finish(event, started)
+
+
+class _Subscription(object):
+
+    def __init__(self, instrumentation, subscriber):
+        self.instrumentation = instrumentation
+        self.subscriber = subscriber
+
+    def __enter__(self):
+        self.instrumentation.subscribe(self.subscriber)
+        return self.subscriber
+
+    def __exit__(self, exc_type, exc, tb):
+        self.instrumentation.unsubscribe(self.subscriber)
+
+
+#: the process wide instrumentation hooks
+hooks = Instrumentation()
@@ -0,0 +1,287 @@
+"""
+Process level metrics about forms, collected through the instrumentation
+hooks:
+
+    from blazeform.instrumentation import hooks
+    from blazeform.metrics import FormMetrics, registry
+
+    hooks.subscribe(FormMetrics())
+
+    # later, e.g. in a /metrics view
+    text = registry.exposition()    # Prometheus text format
+    data = registry.snapshot()      # plain dicts, e.g. to push as JSON
+
+FormMetrics records:
+
+    blazeform_forms_constructed_total       forms constructed, by form name
+    blazeform_validations_total             is_valid() calls, by form and result
+                                            (valid, invalid or unsubmitted)
+    blazeform_invalid_fields_total          invalid elements, by form and element
+    blazeform_errors_total                  error messages, by form, element and
+                                            message (form level errors have an
+                                            empty element)
+    blazeform_render_seconds                render() durations, by form
+    blazeform_render_bytes                  size of the rendered HTML, by form
+
+The registry can also hold an application's own metrics.
+"""
+import threading
+
+#: default Histogram buckets for durations in seconds
+DURATION_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+#: default Histogram buckets for sizes in bytes
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in labels)
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric(object):
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        #: tuple of label values -> the metric's value(s)
+        self.values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError('%s needs the labels: %s' % (self.name, ', '.join(self.labelnames)))
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key):
+        return list(zip(self.labelnames, key))
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield self.name, self._labels(key), value
+
+    def snapshot(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return [{'labels': dict(self._labels(key)), 'value': value} for key, value in items]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        Metric.__init__(self, name, help, labelnames)
+        if 'le' in self.labelnames:
+            raise ValueError('"le" is reserved for histogram buckets')
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # [bucket counts (not cumulative), sum, count]
+                state = self.values[key] = [[0] * len(self.buckets), 0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def get(self, **labels):
+        """ returns (cumulative bucket counts, sum, count) """
+        state = self.values.get(self._key(labels))
+        if state is None:
+            return [0] * len(self.buckets), 0, 0
+        return self._cumulative(state[0]), state[1], state[2]
+
+    def _cumulative(self, counts):
+        retval = []
+        total = 0
+        for count in counts:
+            total += count
+            retval.append(total)
+        return retval
+
+    def _items(self):
+        with self.lock:
+            return sorted(
+                (key, (self._cumulative(state[0]), state[1], state[2]))
+                for key, state in self.values.items()
+            )
+
+    def samples(self):
+        for key, (buckets, total, count) in self._items():
+            labels = self._labels(key)
+            for bound, bucket_count in zip(self.buckets, buckets):
+                yield self.name + '_bucket', labels + [('le', _format_number(bound))], bucket_count
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, count
+
+    def snapshot(self):
+        return [
+            {
+                'labels': dict(self._labels(key)),
+                'buckets': dict(zip((_format_number(bound) for bound in self.buckets), buckets)),
+                'sum': total,
+                'count': count,
+            }
+            for key, (buckets, total, count) in self._items()
+        ]
+
+
+class Registry(object):
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        """ add a metric, or return the already registered one of the same name """
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is None:
+                self.metrics[metric.name] = metric
+                return metric
+        if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+            raise ValueError('metric "%s" is already registered differently' % metric.name)
+        return existing
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def exposition(self):
+        """ the metrics in the Prometheus text exposition format (0.0.4) """
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append('# HELP %s %s' % (name, metric.help.replace('\\', r'\\')
+                                           .replace('\n', r'\n')))
+            lines.append('# TYPE %s %s' % (name, metric.type))
+            for sample_name, labels, value in metric.samples():
+                lines.append('%s%s %s' % (sample_name, _format_labels(labels),
+                                          _format_number(value)))
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        return {
+            name: {'type': metric.type, 'help': metric.help, 'samples': metric.snapshot()}
+            for name, metric in self.metrics.items()
+        }
+
+    def clear(self):
+        """ reset the values of all metrics """
+        for metric in self.metrics.values():
+            metric.clear()
+
+
+#: the process wide registry
+registry = Registry()
+
+
+class FormMetrics(object):
+    """
+        An instrumentation subscriber recording form metrics in `registry`
+        (the process wide registry by default).
+
+        Messages can include the submitted values (e.g. Email's), so only the
+        first `max_messages` distinct messages get their own label in
+        blazeform_errors_total, the others are counted as "other".  Pass
+        `error_messages=False` to not record blazeform_errors_total at all.
+    """
+
+    def __init__(self, registry=registry, error_messages=True, max_messages=100,
+                 duration_buckets=DURATION_BUCKETS, size_buckets=SIZE_BUCKETS):
+        self.error_messages = error_messages
+        self.max_messages = max_messages
+        # the messages with their own label
+        self._messages = set()
+        self._messages_lock = threading.Lock()
+        self.constructed = registry.counter(
+            'blazeform_forms_constructed_total', 'Forms constructed', ('form',))
+        self.validations = registry.counter(
+            'blazeform_validations_total', 'Form validations', ('form', 'result'))
+        self.invalid_fields = registry.counter(
+            'blazeform_invalid_fields_total', 'Invalid elements in validated forms',
+            ('form', 'element'))
+        self.errors = registry.counter(
+            'blazeform_errors_total', 'Error messages of validated forms',
+            ('form', 'element', 'message'))
+        self.render_seconds = registry.histogram(
+            'blazeform_render_seconds', 'Time spent rendering forms', ('form',),
+            duration_buckets)
+        self.render_bytes = registry.histogram(
+            'blazeform_render_bytes', 'Size of the rendered form HTML', ('form',), size_buckets)
+
+    def __call__(self, event):
+        if event.name == 'form_init':
+            self.constructed.inc(form=event.form_name)
+        elif event.name == 'validate' and event.error is None:
+            self.validated(event.form, event.result)
+        elif event.name == 'render' and event.error is None:
+            self.render_seconds.observe(event.elapsed_ns / 1e9, form=event.form_name)
+            self.render_bytes.observe(len(event.result.encode('utf-8')), form=event.form_name)
+
+    def validated(self, form, valid):
+        form_name = form._name
+        if valid:
+            self.validations.inc(form=form_name, result='valid')
+            return
+        if not form._is_submitted():
+            self.validations.inc(form=form_name, result='unsubmitted')
+            return
+        self.validations.inc(form=form_name, result='invalid')
+        for el in form.submittable_els:
+            if el.errors:
+                self.invalid_fields.inc(form=form_name, element=el.id)
+                if self.error_messages:
+                    for msg in el.errors:
+                        self.errors.inc(form=form_name, element=el.id, message=self._label(msg))
+        if self.error_messages:
+            for msg in form._errors:
+                self.errors.inc(form=form_name, element='', message=self._label(msg))
+
+    def _label(self, msg):
+        """ the message label of an error message """
+        if msg in self._messages:
+            return msg
+        with self._messages_lock:
+            if len(self._messages) >= self.max_messages:
+                return 'other'
+            self._messages.add(msg)
+        return msg
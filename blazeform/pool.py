@@ -0,0 +1,74 @@
+"""
+Reuse forms instead of constructing one for every request:
+
+    from blazeform.pool import FormPool
+
+    login_forms = FormPool(LoginForm, size=4)
+
+    def login_view(request):
+        with login_forms.form() as form:
+            form.set_submitted(request.form)
+            if form.is_valid():
+                ...
+            return form.render()
+
+Each thread keeps up to `size` idle forms.  A form is handed out by only one
+acquire() at a time, so tasks sharing a thread (e.g. with asyncio) get their
+own form too.  release() (or leaving the `with` block) resets the form to its
+state after construction, see Form.reset(), and returns it to the pool.
+
+Forms must not be used after they are released, and changes to a form's
+definition (e.g. elements added, or select options replaced per request) are
+not undone by reset(), so only pool forms that are fully defined by their
+constructor.
+"""
+from contextlib import contextmanager
+import threading
+
+
+class FormPool(object):
+
+    def __init__(self, factory, *args, size=8, **kwargs):
+        """
+            `factory` is a form class or a function returning a form, called
+            with `args` and `kwargs` when the pool needs a new form.
+        """
+        self.factory = factory
+        self.args = args
+        self.kwargs = kwargs
+        self.size = size
+        self._local = threading.local()
+
+    def _idle(self):
+        try:
+            return self._local.idle
+        except AttributeError:
+            self._local.idle = []
+            return self._local.idle
+
+    def acquire(self):
+        """ an idle form from the current thread's pool or a new form """
+        idle = self._idle()
+        if idle:
+            return idle.pop()
+        form = self.factory(*self.args, **self.kwargs)
+        form.checkpoint()
+        return form
+
+    def release(self, form):
+        """
+            reset the form and keep it for the next acquire() in this thread,
+            unless the pool is full
+        """
+        form.reset()
+        idle = self._idle()
+        if len(idle) < self.size:
+            idle.append(form)
+
+    @contextmanager
+    def form(self):
+        form = self.acquire()
+        try:
+            yield form
+        finally:
+            self.release(form)
@@ -1,13 +1,54 @@
 import decimal
 
-from formencode import Invalid
-from formencode.validators import FancyValidator
+from formencode import Invalid, NoDefault
+from formencode.validators import FancyValidator, MaxLength as FEMaxLength
 
 from blazeform.exceptions import ValueInvalid
 from blazeform.util import tolist, is_iterable, is_notgiven
 
 
+def to_python_many(validator, values, state=None):
+    """
+        the validator's to_python_many(), or its to_python() for each value if
+        it has none (e.g. FormEncode's validators)
+    """
+    many = getattr(validator, 'to_python_many', None)
+    if many is not None:
+        return many(values, state)
+    retval = []
+    for value in values:
+        try:
+            retval.append(validator.to_python(value, state))
+        except Invalid as e:
+            retval.append(e)
+    return retval
+
+
 class BaseValidator(FancyValidator):
+    """
+        to_python_many(values, state) converts several values at once and
+        returns a list with the converted value, or the Invalid exception,
+        for each value.  Override it to do the work once for all of the
+        values, e.g. one database query for a uniqueness check instead of one
+        per value.  to_python() is still used for single values.
+
+        Set `batchable` to True if the conversion doesn't depend on the rest
+        of the form (e.g. another element's value), batch validation (see
+        blazeform.batch) then calls to_python_many() with a column of values
+        from many rows.
+    """
+
+    batchable = False
+
+    def to_python_many(self, values, state=None):
+        retval = []
+        for value in values:
+            try:
+                retval.append(self.to_python(value, state))
+            except Invalid as e:
+                retval.append(e)
+        return retval
+
     def __classinit__(cls, new_attrs):
         depricated_methods = getattr(cls, '_deprecated_methods', None) or \
             new_attrs.get('_deprecated_methods')
@@ -29,6 +70,7 @@ class Select(BaseValidator):
     invalid = []
     as_empty = []
     handles_multiples = True
+    batchable = True
     __unpackargs__ = ('options', 'invalid', 'as_empty')
     messages = {
         'notthere': "the value did not come from the given options",
@@ -37,7 +79,7 @@ class Select(BaseValidator):
 
     def _to_python(self, value, state):
         valiter = tolist(value)
-        as_empty = [str(d) for d in tolist(self.as_empty)]
+        as_empty = set([str(d) for d in tolist(self.as_empty)])
         vallist = [str(d) for d in valiter]
         # single
         if len(vallist) == 1:
@@ -45,15 +87,7 @@ class Select(BaseValidator):
                 return None
             return value
         # multiple
-        to_remove = []
-        for index, val in enumerate(vallist):
-            if val in as_empty:
-                to_remove.append(index)
-        adjust = 0
-        for index in to_remove:
-            del valiter[index - adjust]
-            adjust += 1
-        return valiter
+        return [item for item, val in zip(valiter, vallist) if val not in as_empty]
 
     def validate_other(self, values, state):
         soptions = set([str(d[0] if isinstance(d, tuple) else d) for d in self.options])
@@ -68,10 +102,47 @@ class Select(BaseValidator):
 
         return
 
+    def to_python_many(self, values, state=None):
+        # the same as to_python() for each value, with the sets made once.
+        # Subclasses and the FancyValidator options applied before the
+        # conversion are left to to_python().
+        if type(self) is not Select or self.strip or self.not_empty or \
+                self.if_empty is not NoDefault:
+            return BaseValidator.to_python_many(self, values, state)
+        soptions = set([str(d[0] if isinstance(d, tuple) else d) for d in self.options])
+        sinvalid = set([str(d) for d in tolist(self.invalid)])
+        as_empty = set([str(d) for d in tolist(self.as_empty)])
+        retval = []
+        for value in values:
+            if hasattr(value, 'mixed'):
+                # like to_python(), for Paste's MultiDict
+                value = value.mixed()
+            if self.is_empty(value):
+                retval.append(self.empty_value(value))
+                continue
+            valiter = tolist(value)
+            vallist = [str(d) for d in valiter]
+            svalues = set(vallist)
+            if sinvalid.intersection(svalues):
+                error = Invalid(self.message('invalid', state), value, state)
+            elif len(soptions.intersection(svalues)) != len(svalues):
+                error = Invalid(self.message('notthere', state), value, state)
+            elif len(vallist) == 1:
+                retval.append(None if vallist[0] in as_empty else value)
+                continue
+            else:
+                retval.append([item for item, val in zip(valiter, vallist)
+                               if val not in as_empty])
+                continue
+            retval.append(error if self.if_invalid is NoDefault else self.if_invalid)
+        return retval
+
 
 class Confirm(BaseValidator):
     """
         Matches one field's value with another
+
+        Not batchable, the other field's value is the one of the same row.
     """
 
     __unpackargs__ = ('tomatch', )
@@ -123,12 +194,30 @@ class MultiValues(BaseValidator):
                 getattr(self.validator, 'handles_multiples', False):
             return self.validator.to_python(value, state)
         else:
+            # one value at a time, stopping at the first invalid one
             retval = []
             for v in tolist(value):
                 retval.append(self.validator.to_python(v, state))
             return retval
     _convert_from_python = _to_python
 
+    def to_python_many(self, values, state=None):
+        """ to_python() for each value of a field that isn't multiple """
+        retval = [None] * len(values)
+        pending = []
+        for index, value in enumerate(values):
+            if self.is_empty(value):
+                # like to_python(), see FancyValidator.to_python()
+                continue
+            if self.multi_check and is_iterable(value):
+                retval[index] = Invalid(self.message('nonmultiple', state), value, state)
+            else:
+                pending.append(index)
+        results = to_python_many(self.validator, [values[index] for index in pending], state)
+        for index, result in zip(pending, results):
+            retval[index] = result
+        return retval
+
 
 class Wrapper(BaseValidator):
 
@@ -142,15 +231,21 @@ class Wrapper(BaseValidator):
 
     Unlike validators, the `state` argument is not used.
 
+    A `to_python_many` function is given a list of values and returns a list
+    with the converted value, or a ValueInvalid instance, for each value.
+    It makes the wrapper batchable and is used for `to_python` too if that
+    isn't given.
+
     """
 
     func_to_python = None
+    func_to_python_many = None
     func_from_python = None
     func_validate_python = None
     func_validate_other = None
 
     def __init__(self, *args, **kw):
-        for n in ['to_python', 'from_python', 'validate_python',
+        for n in ['to_python', 'to_python_many', 'from_python', 'validate_python',
                   'validate_other']:
             if n in kw:
                 kw['func_%s' % n] = kw[n]
@@ -166,21 +261,67 @@ class Wrapper(BaseValidator):
             self._from_python = self.wrap(self.func_from_python)
             self.validate_python = self.wrap(self.func_validate_python)
             self.validate_other = self.wrap(self.func_validate_other)
+        if self.func_to_python_many:
+            self.batchable = True
+            if not self.func_to_python:
+                if hasattr(self, '_deprecated_methods'):
+                    self._convert_to_python = _WrappedManyFunction(self.func_to_python_many)
+                else:
+                    self._to_python = _WrappedManyFunction(self.func_to_python_many)
+
+    def to_python_many(self, values, state=None):
+        if not self.func_to_python_many:
+            return BaseValidator.to_python_many(self, values, state)
+        retval = []
+        for value, result in zip(values, self.func_to_python_many(list(values))):
+            if isinstance(result, ValueInvalid):
+                result = Invalid(str(result), {}, value, state)
+            retval.append(result)
+        return retval
 
     def wrap(self, func):
         if not func:
             return None
+        return _WrappedFunction(func)
 
-        def result(value, state, func=func):
-            try:
-                return func(value)
-            except ValueInvalid as e:
-                raise Invalid(str(e), {}, value, state)
+
+class _WrappedFunction(object):
+    """ a class instead of a closure so wrapped validators can be pickled """
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, value, state):
+        try:
+            return self.func(value)
+        except ValueInvalid as e:
+            raise Invalid(str(e), {}, value, state)
+
+
+class _WrappedManyFunction(_WrappedFunction):
+    """ a to_python_many function used for to_python """
+
+    def __call__(self, value, state):
+        result = self.func([value])[0]
+        if isinstance(result, ValueInvalid):
+            raise Invalid(str(result), {}, value, state)
         return result
 
 
+class MaxLength(FEMaxLength):
+    """
+        FormEncode's MaxLength says "less than" when it means "not greater
+        than" the maximum length.
+    """
+    messages = dict(
+        tooLong='Enter a value not greater than %(maxLength)i characters long',
+    )
+
+
 class Decimal(BaseValidator):
 
+    batchable = True
+
     def _to_python(self, value, state):
         try:
             return decimal.Decimal(value)
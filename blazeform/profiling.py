@@ -0,0 +1,163 @@
+"""
+Profile a form definition through its whole lifecycle:
+
+    from blazeform.profiling import profile
+
+    result = profile(MyForm, [payload1, payload2], iterations=20)
+    print(result.report())
+
+The form is constructed, submitted, validated, its values read and rendered
+once per payload per iteration.  A plain pass gives the time spent in each
+phase of the lifecycle.  A second pass attributes time and memory to element
+ids and processors using the instrumentation hooks (with tracemalloc), and a
+third runs under cProfile for a function level view.
+"""
+import cProfile
+import io
+import pstats
+import tracemalloc
+
+from blazeform.exceptions import ElementInvalid
+from blazeform.instrumentation import hooks
+
+FORM_LEVEL = '(form)'
+
+
+class ProfileRow(object):
+    """ totals for one (element id, event name, processor) combination """
+
+    def __init__(self, element_id, name, processor):
+        self.element_id = element_id
+        self.name = name
+        self.processor = processor
+        self.calls = 0
+        self.total_ns = 0
+        self.memory_delta = 0
+
+    @property
+    def mean_ns(self):
+        return self.total_ns / self.calls if self.calls else 0
+
+    def add(self, event):
+        self.calls += 1
+        self.total_ns += event.elapsed_ns
+        if event.memory_delta is not None:
+            self.memory_delta += event.memory_delta
+
+
+class ProfileResult(object):
+
+    def __init__(self, rows, phases, stats, runs):
+        #: ProfileRow instances, the most expensive first
+        self.rows = rows
+        #: lifecycle phase name -> total ns
+        self.phases = phases
+        #: pstats.Stats of the cProfile pass
+        self.stats = stats
+        #: the number of times the lifecycle was run (payloads * iterations)
+        self.runs = runs
+
+    def report(self, limit=25, functions=15):
+        out = io.StringIO()
+        out.write('lifecycle totals over %d runs:\n' % self.runs)
+        for phase, total_ns in self.phases.items():
+            out.write('    %-15s %12.3f ms\n' % (phase, total_ns / 1e6))
+
+        out.write('\n%-25s %-16s %-20s %8s %12s %12s %12s\n' % (
+            'element', 'event', 'processor', 'calls', 'total ms', 'mean us', 'mem delta'))
+        for row in self.rows[:limit]:
+            out.write('%-25s %-16s %-20s %8d %12.3f %12.3f %12d\n' % (
+                row.element_id, row.name, row.processor or '', row.calls,
+                row.total_ns / 1e6, row.mean_ns / 1e3, row.memory_delta
+            ))
+
+        if functions:
+            out.write('\n')
+            stream = self.stats.stream
+            self.stats.stream = out
+            try:
+                self.stats.sort_stats('cumulative').print_stats(functions)
+            finally:
+                self.stats.stream = stream
+        return out.getvalue()
+
+
+def _lifecycle(form_factory, payload, phases, clock):
+    started = clock()
+    form = form_factory()
+    construct_ns = clock()
+    form.set_submitted(payload)
+    submit_ns = clock()
+    valid = form.is_valid()
+    valid_ns = clock()
+    if valid:
+        try:
+            form.get_values()
+        except ElementInvalid:
+            pass
+    values_ns = clock()
+    form.render()
+    render_ns = clock()
+
+    if phases is not None:
+        phases['construct'] += construct_ns - started
+        phases['set_submitted'] += submit_ns - construct_ns
+        phases['is_valid'] += valid_ns - submit_ns
+        phases['get_values'] += values_ns - valid_ns
+        phases['render'] += render_ns - values_ns
+
+
+def profile(form_factory, payloads, iterations=10):
+    """
+        Run the lifecycle of the form returned by `form_factory()` for each
+        of `payloads` (submitted values), `iterations` times.  Returns a
+        ProfileResult.
+    """
+    rows = {}
+
+    def subscriber(event):
+        if event.name == 'form_init':
+            key = (FORM_LEVEL, event.name, event.form.__class__.__name__)
+        elif event.name == 'render_row':
+            key = (event.element_id, event.name, None)
+        else:
+            key = (event.element_id or FORM_LEVEL, event.name, event.processor_class)
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = ProfileRow(*key)
+        row.add(event)
+
+    def run(phases=None):
+        for _ in range(iterations):
+            for payload in payloads:
+                _lifecycle(form_factory, payload, phases, hooks.clock)
+
+    # plain timing pass
+    phases = dict.fromkeys(('construct', 'set_submitted', 'is_valid', 'get_values', 'render'), 0)
+    run(phases)
+
+    # attribution pass
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    track_memory = hooks.track_memory
+    hooks.track_memory = True
+    try:
+        with hooks.subscribed(subscriber):
+            run()
+    finally:
+        hooks.track_memory = track_memory
+        if not was_tracing:
+            tracemalloc.stop()
+
+    # function level pass, without the hooks so they don't skew the results
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        run()
+    finally:
+        profiler.disable()
+    stats = pstats.Stats(profiler)
+
+    ranked = sorted(rows.values(), key=lambda row: row.total_ns, reverse=True)
+    return ProfileResult(ranked, phases, stats, iterations * len(payloads))
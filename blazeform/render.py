@@ -2,6 +2,7 @@ from webhelpers2.html import tags, HTML
 
 from blazeform import element
 from blazeform.form import FormBase
+from blazeform.instrumentation import hooks
 from blazeform.util import StringIndentHelper, NotGiven, HtmlAttributeHolder
 
 
@@ -37,7 +38,10 @@ class FormRenderer(object):
             r = rcls(child, self.output, on_first, on_alt, 'row', self.settings)
             if (r.uses_first and on_first) or isinstance(child, element.HeaderElement):
                 self.render_required_note(isinstance(child, element.HeaderElement))
-            r.render()
+            if hooks.active:
+                hooks.call('render_row', r.render, (), self.element, child, r)
+            else:
+                r.render()
             if r.uses_alt:
                 on_alt = not on_alt
             if r.uses_first:
@@ -192,10 +196,12 @@ class FieldRenderer(Renderer):
             self.label_class = ' %s' % ' '.join(classes)
 
     def label(self):
-        if self.element.label.value:
+        label = self.element.label
+        if label.value:
             if not self.element.label_after:
-                self.element.label.value += ':'
-            self.output(self.element.label())
+                # a new label, so rendering again doesn't add another colon
+                label = element.Label(self.element, label.value + ':')
+            self.output(label())
 
     def field_wrapper(self):
         self.output.inc('<div id="%s-fw" class="field-wrapper%s">' %
@@ -220,15 +226,19 @@ class FieldRenderer(Renderer):
                 ))
             self.output.dec('</ul>')
 
+    def error_messages(self):
+        return self.element.errors
+
     def errors(self):
-        if len(self.element.errors) == 1:
+        messages = self.error_messages()
+        if len(messages) == 1:
             self.output('<p class="error">%s%s</p>' % (
                 self.setting('error_prefix'),
-                self.element.errors[0]
+                messages[0]
             ))
-        elif len(self.element.errors) > 1:
+        elif len(messages) > 1:
             self.output.inc('<ul class="errors">')
-            for msg in self.element.errors:
+            for msg in messages:
                 self.output('<li>%s%s</li>' % (
                     self.setting('error_prefix'),
                     msg
@@ -297,6 +307,12 @@ class GroupRenderer(StaticRenderer):
                 on_first = False
 
 
+class FormSetRenderer(FieldRenderer):
+    def error_messages(self):
+        # the rows' errors are rendered with their fields
+        return self.element.formset_errors
+
+
 def get_renderer(el):
     plain = (
         element.HiddenElement,
@@ -317,6 +333,8 @@ def get_renderer(el):
         return FormRenderer(el)
     elif isinstance(el, element.GroupElement):
         return GroupRenderer
+    elif isinstance(el, element.FormSetElement):
+        return FormSetRenderer
     elif isinstance(el, element.HeaderElement):
         return HeaderRenderer
     elif isinstance(el, plain):
@@ -0,0 +1,151 @@
+"""
+Find the processors, form validators and exception handlers that are slow:
+
+    from blazeform.instrumentation import hooks
+    from blazeform.slowlog import SlowLog
+
+    slowlog = SlowLog(threshold_ms=50, thresholds={'handle_exception': 10})
+    hooks.subscribe(slowlog)
+
+Calls slower than their threshold are logged as warnings on the
+`blazeform.slow` logger.  The record's `extra` fields (event_name, form_name,
+element_id, processor, value and elapsed_ms) make it easy to pick out with
+structured logging.
+
+Every call, slow or not, is also counted in a histogram per (form name,
+element id, processor class):
+
+    slowlog.histogram('login', 'email', 'Email').percentile(99)
+"""
+import bisect
+import logging
+
+from blazeform.util import NotGiven
+
+log = logging.getLogger('blazeform.slow')
+
+#: upper bounds of the histogram buckets, in milliseconds
+DEFAULT_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+def truncated_repr(value, length):
+    retval = repr(value)
+    if len(retval) > length:
+        retval = retval[:length - 3] + '...'
+    return retval
+
+
+class Histogram(object):
+    """ counts of call timings in fixed buckets, the last bucket is unbounded """
+
+    def __init__(self, bounds_ns):
+        self.bounds_ns = bounds_ns
+        self.counts = [0] * (len(bounds_ns) + 1)
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, elapsed_ns):
+        self.counts[bisect.bisect_left(self.bounds_ns, elapsed_ns)] += 1
+        self.count += 1
+        self.total_ns += elapsed_ns
+        self.max_ns = max(self.max_ns, elapsed_ns)
+
+    @property
+    def mean_ns(self):
+        return self.total_ns / self.count if self.count else 0
+
+    def percentile(self, percent):
+        """
+            An upper bound, in nanoseconds, of the given percentile: the bound
+            of the bucket it falls in (or the maximum seen, for the last
+            bucket).
+        """
+        if not self.count:
+            return 0
+        wanted = self.count * percent / 100.0
+        seen = 0
+        for bound, count in zip(self.bounds_ns, self.counts):
+            seen += count
+            if seen >= wanted:
+                return min(bound, self.max_ns)
+        return self.max_ns
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total_ns': self.total_ns,
+            'max_ns': self.max_ns,
+            'buckets': list(zip(list(self.bounds_ns) + [None], self.counts)),
+        }
+
+
+class SlowLog(object):
+    """
+        An instrumentation subscriber.  `threshold_ms` applies to all of
+        the watched events, `thresholds` can override it per event name.
+        Values are logged as their repr, truncated to `max_value_length`.
+        At most `max_histograms` histograms are kept, calls for any more
+        (form, element, processor) combinations are only counted in
+        `dropped`.
+    """
+    #: the event names watched
+    events = ('processor', 'form_validator', 'handle_exception')
+
+    def __init__(self, threshold_ms=100, thresholds=None, max_value_length=100,
+                 max_histograms=1000, buckets_ms=DEFAULT_BUCKETS_MS, logger=log):
+        self.thresholds_ns = dict.fromkeys(self.events, threshold_ms * 1e6)
+        for name, ms in (thresholds or {}).items():
+            if name not in self.thresholds_ns:
+                raise ValueError('"%s" is not a watched event' % name)
+            self.thresholds_ns[name] = ms * 1e6
+        self.max_value_length = max_value_length
+        self.max_histograms = max_histograms
+        self.bounds_ns = tuple(int(ms * 1e6) for ms in buckets_ms)
+        self.logger = logger
+        self.histograms = {}
+        self.dropped = 0
+
+    def __call__(self, event):
+        threshold_ns = self.thresholds_ns.get(event.name)
+        if threshold_ns is None:
+            return
+
+        key = (event.form_name, event.element_id, event.processor_class)
+        histogram = self.histograms.get(key)
+        if histogram is None and len(self.histograms) < self.max_histograms:
+            histogram = self.histograms[key] = Histogram(self.bounds_ns)
+        if histogram is None:
+            self.dropped += 1
+        else:
+            histogram.add(event.elapsed_ns)
+
+        if event.elapsed_ns >= threshold_ns:
+            self.log(event)
+
+    def log(self, event):
+        value = None if event.value is NotGiven else \
+            truncated_repr(event.value, self.max_value_length)
+        processor = None if event.processor is None else \
+            truncated_repr(event.processor, self.max_value_length)
+        elapsed_ms = event.elapsed_ns / 1e6
+        self.logger.warning(
+            'slow %s: %.3fms form=%s element=%s processor=%s value=%s',
+            event.name, elapsed_ms, event.form_name, event.element_id, processor, value,
+            extra={
+                'event_name': event.name,
+                'form_name': event.form_name,
+                'element_id': event.element_id,
+                'processor': processor,
+                'value': value,
+                'elapsed_ms': elapsed_ms,
+            }
+        )
+
+    def histogram(self, form_name, element_id=None, processor=None):
+        """ the Histogram for the combination, None if nothing was recorded """
+        return self.histograms.get((form_name, element_id, processor))
+
+    def clear(self):
+        self.histograms.clear()
+        self.dropped = 0
@@ -0,0 +1,149 @@
+from collections.abc import Mapping
+from urllib.parse import unquote_to_bytes
+
+
+class BaseAdapter(Mapping):
+    """
+        Gives the form a uniform way to read submitted values.  Adapters only
+        need to answer for the keys the form asks about, so they can avoid
+        building a dictionary of everything that was posted.
+
+        An adapter is a read-only mapping of the keys it holds (all of them,
+        or only those the form asked about) to their values, except that
+        get() takes `multiple` instead of a default.
+    """
+
+    def __contains__(self, key):
+        raise NotImplementedError('this method needs to be overriden')
+
+    def __iter__(self):
+        raise NotImplementedError('this method needs to be overriden')
+
+    def __len__(self):
+        raise NotImplementedError('this method needs to be overriden')
+
+    def key_count(self):
+        """ the number of distinct keys submitted, including those not held """
+        return len(self)
+
+    def get(self, key, multiple=False):
+        """
+            return the value submitted for key.  If `multiple` is True, the
+            value is always a list.
+        """
+        raise NotImplementedError('this method needs to be overriden')
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+
+class DictAdapter(BaseAdapter):
+    """ plain dict-like values, used as given """
+
+    def __init__(self, values):
+        self._values = values
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, key, multiple=False):
+        return self._values[key]
+
+
+def _from_list(values, multiple):
+    if multiple or len(values) != 1:
+        return values
+    return values[0]
+
+
+class MultiDictAdapter(BaseAdapter):
+    """
+        MultiDict-like values (e.g. Werkzeug's request.form), read with
+        getlist() so there is no need to call to_dict(flat=False) and fix up
+        lists by hand.
+    """
+
+    def __init__(self, values):
+        self._values = values
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __iter__(self):
+        # a MultiDict's keys are distinct
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, key, multiple=False):
+        return _from_list(self._values.getlist(key), multiple)
+
+
+class UrlEncodedAdapter(BaseAdapter):
+    """
+        A raw application/x-www-form-urlencoded body.  Only the values for
+        `keys` and keys starting with one of `prefixes` are decoded, everything
+        else is skipped.
+    """
+
+    def __init__(self, body, keys, encoding='utf-8', errors='replace', prefixes=()):
+        self.encoding = encoding
+        self.errors = errors
+        self._values = {}
+        # all keys submitted, only counted
+        self._keys = set()
+
+        wanted = set(keys)
+        prefixes = tuple(prefixes)
+        for pair in bytes(body).split(b'&'):
+            if not pair:
+                continue
+            key, _, value = pair.partition(b'=')
+            key = self._decode(key)
+            self._keys.add(key)
+            if key in wanted or (prefixes and key.startswith(prefixes)):
+                self._values.setdefault(key, []).append(self._decode(value))
+
+    def _decode(self, value):
+        if b'+' in value:
+            value = value.replace(b'+', b' ')
+        if b'%' in value:
+            value = unquote_to_bytes(value)
+        return value.decode(self.encoding, self.errors)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def key_count(self):
+        return len(self._keys)
+
+    def get(self, key, multiple=False):
+        return _from_list(self._values[key], multiple)
+
+
+def adapt_submission(values, keys, prefixes=()):
+    """
+        wrap submitted values in the appropriate adapter.  `keys` should be an
+        iterable of the keys the form cares about and `prefixes` the starts of
+        keys it cares about (e.g. the rows of a formset).
+    """
+    if isinstance(values, BaseAdapter):
+        return values
+    if isinstance(values, (bytes, bytearray, memoryview)):
+        return UrlEncodedAdapter(values, keys, prefixes=prefixes)
+    if hasattr(values, 'getlist'):
+        return MultiDictAdapter(values)
+    return DictAdapter(values)
@@ -4,8 +4,8 @@ from blazeform.form import Form
 
 
 class TestForm(Form):
-    def __init__(self):
-        Form.__init__(self, 'testform')
+    def __init__(self, static=False):
+        Form.__init__(self, 'testform', static=static)
 
         self.add_button('button', 'Button', defaultval='PushMe')
         self.add_checkbox('checkbox', 'Checkbox')
@@ -0,0 +1,228 @@
+from unittest import SkipTest
+
+import formencode
+from formencode.validators import Int
+
+from blazeform import batch
+from blazeform.batch import ColumnStore, validate_batch
+from blazeform.exceptions import ValueInvalid
+from blazeform.form import Form
+from blazeform.processors import BaseValidator
+from blazeform.util import NotGiven
+
+
+def contact_form():
+    form = Form('contact')
+    form.add_text('name', 'Name', required=True)
+    form.add_text('age', 'Age').add_processor(Int(min=0))
+    form.add_checkbox('subscribed', 'Subscribed')
+    form.add_static('note', 'Note')
+
+    def adults_subscribe(form):
+        if form.elements.subscribed.value and (form.elements.age.value or 0) < 18:
+            raise ValueInvalid('only adults can subscribe')
+    form.add_validator(adults_subscribe)
+    return form
+
+
+ROWS = [
+    {'name': 'bob', 'age': '30', 'subscribed': 'on'},
+    {'name': '', 'age': 'x'},
+    {'name': 'sue', 'age': '12', 'subscribed': 'on'},
+    {'name': 'tim'},
+]
+
+
+def test_validate_batch():
+    form = contact_form()
+    store = validate_batch(form, iter(ROWS))
+    assert len(store) == 4
+    assert store.keys == ['name', 'age', 'subscribed']
+    assert not store.is_valid()
+    assert list(store.invalid_rows()) == [1, 2]
+    assert list(store.valid_rows()) == [0, 3]
+    assert store.row(0) == {'name': 'bob', 'age': 30, 'subscribed': True}
+    assert store.row(3) == {'name': 'tim', 'age': NotGiven, 'subscribed': False}
+    assert store.column('age')[:3] == [30, NotGiven, 12]
+    assert store.errors(0) == {}
+    assert store.errors(1) == {'name': ['field is required'],
+                               'age': ['Please enter an integer value']}
+    assert store.errors(2) == {None: ['only adults can subscribe']}
+    assert store.raw is None
+
+    # the form isn't left with the last row's state
+    assert form.elements.name.submittedval is NotGiven
+    assert form.elements.name.errors == []
+
+
+def test_options():
+    store = validate_batch(contact_form(), ROWS, fail_fast=True)
+    assert len(store) == 2
+    assert store.errors(1) == {'name': ['field is required']}
+
+    rows = [{'name': 'bob'}, {'name': '', 'age': ''}]
+    store = validate_batch(contact_form(), rows, skip_empty=True, keep_raw=True)
+    assert store.is_valid()
+    assert list(store.valid_rows()) == [0]
+    assert store.raw[0] == ['bob', '']
+
+
+def test_size_limits():
+    form = Form('f', max_value_length=3)
+    form.add_text('name')
+    store = validate_batch(form, [{'name': 'abcd'}])
+    assert store.errors(0) == {'name': ['value is too long (maximum is 3 characters)']}
+
+
+def test_missing_values():
+    # like a submitted form without the values
+    form = Form('f')
+    form.add_text('name')
+    form.add_radio('r1', 'One', 'one', 'color')
+    form.add_radio('r2', 'Two', 'two', 'color')
+    form.add_mselect('sizes', [(1, 's')])
+    store = validate_batch(form, [{'name': 'bob'}])
+    assert store.row(0) == {'name': 'bob', 'color': None, 'sizes': []}
+    # NotGiven == None
+    assert store.row(0)['color'] is None
+
+
+def test_empty_store():
+    store = ColumnStore(['a'])
+    assert len(store) == 0
+    assert store.is_valid()
+    assert store.errors(0) == {}
+
+
+def numbers_form():
+    form = Form('numbers')
+    form.add_text('count', 'Count', vtype='int', required=True)
+    form.add_text('price', 'Price', vtype='float', if_invalid=0)
+    form.add_text('limited', 'Limited', vtype='int', max_value_length=4)
+    form.add_text('positive', 'Positive', vtype='int').add_processor(Int(min=0))
+    return form
+
+
+NUMBER_ROWS = [
+    {'count': '12', 'price': '1.5', 'limited': '12345', 'positive': '-1'},
+    {'count': '-007', 'price': '+2.0', 'limited': '1'},
+    {'count': ' 3 ', 'price': '.5', 'limited': '+1'},
+    {'count': '1.5', 'price': 'x', 'limited': '1e3'},
+    {'count': '', 'price': '-0.0'},
+    {'count': 12, 'price': '123456789012345678901234567890123'},
+    {'count': '1234567890123456789012', 'price': '1e3'},
+    {'count': '+-1', 'price': '1.2.3'},
+    {'count': '١٢', 'price': '٣'},
+    {'count': '1\x002', 'price': '-'},
+]
+
+
+def store_state(store):
+    return store.values, store.valid, [store.errors(index) for index in range(len(store))]
+
+
+def test_vectorized_matches_scalar():
+    if batch.numpy is None:
+        raise SkipTest('NumPy is not installed')
+    scalar = validate_batch(numbers_form(), NUMBER_ROWS, vectorize=False)
+    vectorized = validate_batch(numbers_form(), NUMBER_ROWS, chunk_size=3)
+    assert store_state(vectorized) == store_state(scalar)
+    assert [type(value) for value in vectorized.column('count')[:3]] == [int, int, int]
+    assert vectorized.column('price')[:3] == [1.5, 2, 0.5]
+    assert type(vectorized.column('price')[1]) is int
+    assert vectorized.errors(3) == {'count': ['Please enter an integer value'],
+                                    'limited': ['Please enter an integer value']}
+
+
+def test_vectorizable():
+    form = numbers_form()
+    form.add_text('name')
+    form.add_checkbox('agree', vtype='int')
+    assert [el.id for el in form.submittable_els if batch._vectorizable(el)] == \
+        ['count', 'price', 'limited']
+
+
+def test_convert_column():
+    if batch.numpy is None:
+        raise SkipTest('NumPy is not installed')
+    assert batch._convert_column([], 'int') == []
+    assert batch._convert_column(['1', '', None, '-2', 'x'], 'int') == \
+        [1, NotGiven, NotGiven, -2, NotGiven]
+    assert batch._convert_column(['1.25', '3.', '1e3'], 'number') == [1.25, 3, NotGiven]
+    # long values are left to the element, they don't widen the array
+    assert batch._convert_column(['1', '-' + '1' * 18, '1' * 20], 'int') == \
+        [1, -111111111111111111, NotGiven]
+    assert batch._convert_column(['1', '1' * 33], 'number') == [1, NotGiven]
+
+
+def test_scalar_fallback():
+    numpy = batch.numpy
+    batch.numpy = None
+    try:
+        store = validate_batch(numbers_form(), NUMBER_ROWS)
+    finally:
+        batch.numpy = numpy
+    assert store.column('count')[:2] == [12, -7]
+    assert store.errors(3)['count'] == ['Please enter an integer value']
+    assert store.column('price')[3] == 0
+
+
+class Unique(BaseValidator):
+    """ like a database check, one "query" per call """
+    batchable = True
+    taken = {'bob', 'sue'}
+    queries = 0
+
+    def _to_python(self, value, state):
+        result = self.to_python_many([value], state)[0]
+        if isinstance(result, formencode.Invalid):
+            raise result
+        return result
+
+    def to_python_many(self, values, state=None):
+        Unique.queries += 1
+        return [formencode.Invalid('%s is taken' % value, value, state)
+                if value in self.taken else value for value in values]
+
+
+def users_form():
+    form = Form('users')
+    form.add_text('name', 'Name', required=True).add_processor(Unique())
+    form.add_select('color', COLORS, 'Color', choose=None, required=True)
+    form.add_text('age', 'Age').add_processor(Int())
+    return form
+
+
+COLORS = [('1', 'red'), ('2', 'blue')]
+USER_ROWS = [
+    {'name': 'tim', 'color': '1', 'age': '5'},
+    {'name': 'bob', 'color': '3', 'age': 'x'},
+    {'name': '', 'color': ['1', '2']},
+    {'name': ' ann ', 'color': '2'},
+    {'name': 'x' * 20, 'color': '1'},
+]
+
+
+def test_batchable_processors():
+    form = users_form()
+    assert [el.id for el in form.submittable_els if batch._batchable(el)] == ['name', 'color']
+    form.elements.name.max_value_length = 10
+    Unique.queries = 0
+    store = validate_batch(form, USER_ROWS, chunk_size=3)
+    assert Unique.queries == 2
+
+    # the same as validating the rows one at a time
+    for index, row in enumerate(USER_ROWS):
+        single = users_form()
+        single.elements.name.max_value_length = 10
+        values = dict(row)
+        values['users-submit-flag'] = 'submitted'
+        single.set_submitted(values)
+        single.is_valid()
+        errors = dict((el.id, el.errors) for el in single.submittable_els if el.errors)
+        assert store.errors(index) == errors, index
+        for el in single.submittable_els:
+            if el.id in store.columns:
+                assert store.column(el.id)[index] == \
+                    (el._safeval if el._valid else NotGiven), (index, el.id)
+    assert store.row(3)['name'] == 'ann'
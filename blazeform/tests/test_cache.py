@@ -0,0 +1,158 @@
+import os
+import pickle
+import shutil
+import tempfile
+
+from blazeform.cache import DefinitionCache, source_fingerprint, dumps
+from blazeform.form import Form
+from blazeform.util import NotGiven, NotGivenIter
+
+
+class ProfileForm(Form):
+    constructed = 0
+
+    def __init__(self, name='profile', maxlength=10):
+        ProfileForm.constructed += 1
+        Form.__init__(self, name)
+        self.add_text('name', 'Name', required=True, maxlength=maxlength)
+        self.add_select('color', [(1, 'red'), (2, 'blue')], 'Color')
+        self.add_checkbox('agree', 'Agree')
+        self.add_validator(self.validator)
+
+    def validator(self, form):
+        pass
+
+
+class LambdaForm(Form):
+    def __init__(self):
+        Form.__init__(self, 'lambda')
+        self.add_text('name', 'Name')
+        self.add_validator(lambda form: None)
+
+
+class OtherForm(ProfileForm):
+    pass
+
+
+def values(name='bob'):
+    return {'profile-submit-flag': 'submitted', 'name': name, 'color': '2'}
+
+
+def test_dumps():
+    form = ProfileForm()
+    copy = pickle.loads(dumps(form))
+    assert copy.elements.keys() == form.elements.keys()
+    assert copy.elements.name.form is copy
+    assert copy.elements.name.defaultval is NotGiven
+    assert pickle.loads(pickle.dumps(NotGivenIter)) is NotGivenIter
+    assert copy.render() == form.render()
+    assert copy.fingerprint() == form.fingerprint()
+
+
+def test_memory():
+    cache = DefinitionCache(check_speed=False)
+    ProfileForm.constructed = 0
+    first = cache.get(ProfileForm)
+    second = cache.get(ProfileForm)
+    assert ProfileForm.constructed == 1
+    assert first is not second
+
+    second.set_submitted(values())
+    assert second.is_valid()
+    assert second.get_values()['name'] == 'bob'
+    third = cache.get(ProfileForm)
+    assert not third.is_submitted()
+    third.set_submitted(values('x' * 11))
+    assert not third.is_valid()
+
+    # the arguments are part of the key
+    cache.get(ProfileForm, maxlength=20)
+    assert ProfileForm.constructed == 2
+    assert cache.key(ProfileForm) != cache.key(ProfileForm, kwargs={'maxlength': 20})
+    assert cache.key(ProfileForm) != cache.key(OtherForm)
+
+
+def test_fingerprint():
+    assert source_fingerprint(ProfileForm) == source_fingerprint(ProfileForm)
+    assert source_fingerprint(ProfileForm) != source_fingerprint(OtherForm)
+
+
+def test_directory():
+    directory = tempfile.mkdtemp()
+    try:
+        ProfileForm.constructed = 0
+        DefinitionCache(directory).get(ProfileForm)
+        assert ProfileForm.constructed == 1
+        assert len(os.listdir(directory)) == 1
+
+        # e.g. a new process
+        form = DefinitionCache(directory, check_speed=False).get(ProfileForm)
+        assert ProfileForm.constructed == 1
+        form.set_submitted(values())
+        assert form.is_valid()
+
+        cache = DefinitionCache(directory)
+        cache.clear()
+        assert not os.listdir(directory)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_corrupt_file():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = DefinitionCache(directory)
+        with open(os.path.join(directory, cache.key(ProfileForm) + '.pickle'), 'wb') as fo:
+            fo.write(b'not a cache file')
+        ProfileForm.constructed = 0
+        cache.get(ProfileForm)
+        assert ProfileForm.constructed == 1
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_stale_entry():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = DefinitionCache(directory)
+        path = os.path.join(directory, cache.key(ProfileForm) + '.pickle')
+        cache.get(ProfileForm)
+        with open(path, 'rb') as fo:
+            header = fo.read(16)
+        # a valid header, but the pickle refers to a class that's gone
+        with open(path, 'wb') as fo:
+            fo.write(header + b'cblazeform.gone\nForm\n.')
+
+        ProfileForm.constructed = 0
+        cache = DefinitionCache(directory, check_speed=False)
+        form = cache.get(ProfileForm)
+        assert ProfileForm.constructed == 1
+        form.set_submitted(values())
+        assert form.is_valid()
+        # the entry was written again
+        DefinitionCache(directory, check_speed=False).get(ProfileForm)
+        assert ProfileForm.constructed == 1
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_unpicklable():
+    cache = DefinitionCache()
+    first = cache.get(LambdaForm)
+    second = cache.get(LambdaForm)
+    assert first is not second
+    assert cache._entries[cache.key(LambdaForm)].data is None
+
+
+def test_check_speed():
+    cache = DefinitionCache()
+    cache.get(ProfileForm)
+    entry = cache._entries[cache.key(ProfileForm)]
+    # pretend construction is faster than unpickling
+    entry.construct_ns = 0
+    ProfileForm.constructed = 0
+    cache.get(ProfileForm)
+    assert ProfileForm.constructed == 0
+    assert entry.data is None
+    cache.get(ProfileForm)
+    assert ProfileForm.constructed == 1
@@ -0,0 +1,202 @@
+import threading
+
+from blazeutils.testing import raises
+from formencode.validators import Int
+
+from blazeform.declarative import DeclarativeForm, Element, Group, Validator
+from blazeform.exceptions import ProgrammingError, ValueInvalid
+from blazeform.form import Form
+
+COLORS = [(1, 'red'), (2, 'blue')]
+# __init__ calls, the class doesn't exist yet when its prototype is built
+initialized = []
+
+
+class ProfileForm(DeclarativeForm):
+    form_name = 'profile'
+
+    header = Element('header', 'Profile')
+    name = Element('text', 'Name', required=True)
+    age = Element('text', 'Age').processor(Int())
+    color = Element('select', COLORS, 'Color', choose=None)
+    address = Group('Address', street=Element('text', 'Street'), city=Element('text', 'City'))
+    password = Element('password', 'Password')
+    confirm = Element('confirm', 'Confirm', match='password')
+
+    not_bob = Validator('check_name')
+
+    def __init__(self, *args, **kwargs):
+        initialized.append(self)
+        DeclarativeForm.__init__(self, *args, **kwargs)
+
+    def check_name(self, form):
+        assert form is self
+        if form.elements.name.value == 'bob':
+            raise ValueInvalid('not bob')
+
+
+class ChildForm(ProfileForm):
+    password = None
+    confirm = None
+    email = Element('email', 'Email')
+
+
+def profile_form():
+    form = Form('profile')
+    form.add_header('header', 'Profile')
+    form.add_text('name', 'Name', required=True)
+    form.add_text('age', 'Age').add_processor(Int())
+    form.add_select('color', COLORS, 'Color', choose=None)
+    address = form.add_elgroup('address', 'Address')
+    address.add_text('street', 'Street')
+    address.add_text('city', 'City')
+    form.add_password('password', 'Password')
+    form.add_confirm('confirm', 'Confirm', match='password')
+    return form
+
+
+def values(name='fred'):
+    return {'profile-submit-flag': 'submitted', 'name': name, 'age': '5', 'color': '2'}
+
+
+def test_elements():
+    form = ProfileForm()
+    assert list(form.els.keys()) == ['profile-submit-flag', 'header', 'name', 'age', 'color',
+                                     'address', 'street', 'city', 'password', 'confirm']
+    assert form.elements.street.renders_in_group
+    assert form._name == 'profile'
+    assert form.render() == profile_form().render()
+
+
+def test_copies():
+    del initialized[:]
+    first = ProfileForm()
+    second = ProfileForm()
+    assert len(initialized) == 0
+    assert first is not second
+    assert first.elements.name is not second.elements.name
+    assert first.elements.color.options is COLORS
+
+    first.set_submitted(values())
+    assert first.is_valid()
+    assert first.get_values()['age'] == 5
+    assert not second.is_submitted()
+
+    # the validator is bound to each copy
+    second.set_submitted(values('bob'))
+    assert not second.is_valid()
+    assert second._errors == ['not bob']
+
+
+def test_arguments():
+    del initialized[:]
+    form = ProfileForm(static=True)
+    assert form._static
+    ProfileForm(static=True)
+    assert len(initialized) == 1
+    assert ProfileForm('other')._name == 'other'
+    assert not ProfileForm()._static
+
+
+def test_fingerprint():
+    assert ProfileForm().fingerprint() != profile_form().fingerprint()
+    assert ProfileForm().fingerprint() == ProfileForm().fingerprint()
+
+
+def test_inheritance():
+    form = ChildForm()
+    assert list(form.els.keys()) == ['profile-submit-flag', 'header', 'name', 'age', 'color',
+                                     'address', 'street', 'city', 'email']
+    assert form._name == 'profile'
+    assert 'email' not in ProfileForm().els
+
+
+class ThreadedForm(DeclarativeForm):
+    name = Element('text', 'Name')
+
+
+def test_prototype_not_returned():
+    prototype = ThreadedForm._prototypes[((), frozenset())]
+    assert isinstance(prototype, Form)
+    forms = []
+    barrier = threading.Barrier(4)
+
+    def construct():
+        barrier.wait()
+        forms.append(ThreadedForm())
+    threads = [threading.Thread(target=construct) for number in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # every form is an unpickled copy
+    assert len(set(map(id, forms + [prototype]))) == 5
+    assert isinstance(ThreadedForm._prototypes[((), frozenset())], bytes)
+
+
+def test_unpicklable():
+    class LambdaForm(DeclarativeForm):
+        name = Element('text', 'Name')
+        check = Validator(lambda form: None)
+
+    LambdaForm()
+    assert LambdaForm._prototypes[((), frozenset())] is None
+    assert LambdaForm() is not LambdaForm()
+
+
+def test_unhashable_arguments():
+    del initialized[:]
+    form = ProfileForm(class_=['a'])
+    assert len(initialized) == 1
+    assert 'class' in form.attributes
+
+
+def test_abstract():
+    class Base(DeclarativeForm):
+        _abstract = True
+        name = Element('text', 'Name')
+        confirm = Element('confirm', 'Confirm', match='name')
+
+    class Concrete(Base):
+        pass
+
+    assert not Base._prototypes
+    assert 'confirm' in Concrete().els
+
+
+def test_required_arguments():
+    class UserForm(DeclarativeForm):
+        name = Element('text', 'Name')
+
+        def __init__(self, user):
+            DeclarativeForm.__init__(self)
+            self.elements.name.defaultval = user
+
+    assert not UserForm._prototypes
+    assert UserForm('bob').elements.name.defaultval == 'bob'
+    assert UserForm('sue').elements.name.defaultval == 'sue'
+
+
+@raises(ValueError, 'invalid vtype "nope"')
+def test_bad_vtype():
+    class BadForm(DeclarativeForm):
+        name = Element('text', 'Name', vtype='nope')
+
+
+@raises(ProgrammingError, 'match argument is required for Confirm elements')
+def test_confirm_without_match():
+    class BadForm(DeclarativeForm):
+        confirm = Element('confirm', 'Confirm')
+
+
+@raises(ValueError, 'element id "name" already used')
+def test_duplicate_id():
+    class BadForm(DeclarativeForm):
+        name = Element('text', 'Name')
+        group = Group(name=Element('text', 'Name'))
+
+
+@raises(ValueError, '"nope" is not a registered element type')
+def test_unknown_type():
+    class BadForm(DeclarativeForm):
+        name = Element('nope')
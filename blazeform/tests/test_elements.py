@@ -1,13 +1,18 @@
 import datetime
 import decimal
+import hashlib
+import io
 import unittest
 
-from formencode.validators import Int, MaxLength
+from blazeutils.testing import raises
+from formencode.validators import Int
 from webhelpers2.html import literal
 
 from blazeform.form import Form
 from blazeform.exceptions import ValueInvalid, ProgrammingError
-from blazeform.file_upload_translators import BaseTranslator
+from blazeform.file_upload_translators import BaseTranslator, sniff_content_type
+from blazeform.instrumentation import hooks
+from blazeform.processors import MaxLength
 from blazeform.util import NotGiven, NotGivenIter
 
 L = literal
@@ -310,6 +315,44 @@ class CommonTest(unittest.TestCase):
         self.assertEqual(True, el.is_valid())
         self.assertEqual(len(el.errors), 0)
 
+    def test_fail_fast(self):
+        class validator(object):
+            vcalled = 0
+
+            def __call__(self, value):
+                self.vcalled += 1
+                return value
+
+        # all processors run by default
+        v = validator()
+        form = Form('f')
+        el = form.add_text('field', 'Field', maxlength=1)
+        el.add_processor(Int)
+        el.add_processor(v)
+        el.submittedval = 'ab'
+        self.assertEqual(False, el.is_valid())
+        self.assertEqual(len(el.errors), 2)
+        self.assertEqual(1, v.vcalled)
+
+        # stop after the first failing processor
+        v = validator()
+        form = Form('f')
+        el = form.add_text('field', 'Field', maxlength=1, fail_fast=True)
+        el.add_processor(Int)
+        el.add_processor(v)
+        el.submittedval = 'ab'
+        self.assertEqual(False, el.is_valid())
+        self.assertEqual(el.errors, ['Enter a value not greater than 1 characters long'])
+        self.assertEqual(0, v.vcalled)
+        assert 'fail_fast' not in el.attributes
+
+        # can also be requested per call
+        form = Form('f')
+        el = form.add_text('field', 'Field', required=True, vtype='int')
+        el.add_processor(Int)
+        self.assertEqual(False, el.is_valid(fail_fast=True))
+        self.assertEqual(el.errors, ['field is required'])
+
     def test_notes(self):
         form = Form('f')
         el = form.add_text('field', 'Field')
@@ -1681,6 +1724,96 @@ class FileUploadsTest(unittest.TestCase):
         el.submittedval = self.blank
         assert el.is_valid(), el.errors
 
+    def upload(self, content, name='file.png', content_type='image/png'):
+        stream = io.BytesIO(content)
+        # as if something read the start of the request before
+        stream.seek(0)
+        return BaseTranslator(name, content_type, None, stream)
+
+    def test_allow_content(self):
+        png = b'\x89PNG\r\n\x1a\n' + b'\x00' * 1000
+        el = Form('f').add_file('f')
+        el.allow_content('image/png', 'image/gif')
+        el.submittedval = self.upload(png)
+        assert el.is_valid(), el.errors
+        assert el.value.sniffed_type == 'image/png'
+        # only the start was read and the stream is where it was
+        assert el.value.size is None
+        assert el.value.stream.tell() == 0
+
+        # the browser's content type and extension don't matter
+        el = Form('f').add_file('f')
+        el.allow_content('image/png')
+        el.submittedval = self.upload(b'%PDF-1.4 ...')
+        assert not el.is_valid()
+        assert el.errors == ['file content "application/pdf" not allowed']
+
+        el = Form('f').add_file('f')
+        el.allow_content('image/png')
+        el.submittedval = self.upload(b'\xff\xfe\x00\x01')
+        assert not el.is_valid()
+        assert el.errors == ["the file's content type could not be determined"]
+
+        el = Form('f').add_file('f')
+        el.allow_content('text/plain')
+        # a character cut by the sniffing length is still text
+        el.submittedval = self.upload('a,b\n'.encode() + 'é'.encode() * 200, 'f.csv', 'text/csv')
+        assert el.is_valid(), el.errors
+
+    def test_maxbytes(self):
+        el = Form('f').add_file('f')
+        el.chunk_size = 10
+        el.maxbytes(25)
+        el.submittedval = self.upload(b'x' * 25)
+        assert el.is_valid(), el.errors
+        assert el.value.size == 25
+
+        el = Form('f').add_file('f')
+        el.chunk_size = 10
+        el.maxbytes(25)
+        upload = self.upload(b'x' * 1000)
+        reads = []
+        read = upload.stream.read
+        upload.stream.read = lambda size: reads.append(size) or read(size)
+        el.submittedval = upload
+        assert not el.is_valid()
+        assert el.errors == ['file too big, max size 25']
+        # reading stopped after the limit
+        assert len(reads) == 3
+        assert upload.stream.tell() == 0
+
+    def test_hash_content(self):
+        content = b'x' * 100000
+        el = Form('f').add_file('f')
+        el.hash_content()
+        el.submittedval = self.upload(content)
+        assert el.is_valid()
+        assert el.value.sha256 == hashlib.sha256(content).hexdigest()
+        assert el.value.size == 100000
+
+    def test_content_not_checkable(self):
+        el = Form('f').add_file('f')
+        el.hash_content()
+        el.submittedval = self.text
+        assert not el.is_valid()
+        assert el.errors == ["the file's content could not be checked"]
+
+        # other errors are reported without reading the content
+        el = Form('f').add_file('f')
+        el.allow_extension('pdf')
+        el.hash_content()
+        el.submittedval = self.text
+        assert el.errors == [] and not el.is_valid()
+        assert el.errors == ['extension ".txt" not allowed']
+
+    def test_sniff_content_type(self):
+        assert sniff_content_type(b'GIF89a...') == 'image/gif'
+        assert sniff_content_type(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == 'image/webp'
+        assert sniff_content_type(b'\x00\x00\x00\x18ftypmp42') == 'video/mp4'
+        assert sniff_content_type(b'x' * 257 + b'ustar') == 'application/x-tar'
+        assert sniff_content_type(b'hello') == 'text/plain'
+        assert sniff_content_type(b'') is None
+
     def test_allowexts(self):
         tosub = self.text
         el = Form('f').add_file('f')
@@ -1816,6 +1949,278 @@ class FileUploadsTest(unittest.TestCase):
         assert el.errors[0] == 'field is required'
 
 
+class FormSetTest(unittest.TestCase):
+
+    def invoice(self, **kwargs):
+        form = Form('invoice')
+        form.add_text('customer', 'Customer')
+        lines = form.add_formset('lines', 'Lines', **kwargs)
+        lines.add_text('description', 'Description', required=True)
+        lines.add_text('quantity', 'Quantity', vtype='int')
+        lines.add_checkbox('taxed', 'Taxed')
+        return form
+
+    def values(self, **rows):
+        values = {'invoice-submit-flag': 'submitted', 'customer': 'bob'}
+        values.update(('lines-%s' % key.lstrip('_').replace('_', '-'), value)
+                      for key, value in rows.items())
+        return values
+
+    def test_values(self):
+        form = self.invoice()
+        form.set_submitted(self.values(rows='2', _0_description='nails', _0_quantity='10',
+                                       _1_description='glue', _1_taxed='on'))
+        assert form.is_valid()
+        self.assertEqual(form.get_values()['lines'], [
+            {'description': 'nails', 'quantity': 10, 'taxed': False},
+            {'description': 'glue', 'quantity': None, 'taxed': True},
+        ])
+        # the template doesn't keep the last row's state
+        assert form.elements.lines.description.submittedval is NotGiven
+
+    def test_json(self):
+        form = self.invoice(max_rows=2)
+        form.set_submitted({'customer': 'bob', 'lines': [
+            {'description': 'nails', 'quantity': 10},
+            {'description': 'glue', 'taxed': True},
+        ]}, source='json')
+        assert form.is_valid()
+        self.assertEqual(form.get_values()['lines'], [
+            {'description': 'nails', 'quantity': 10, 'taxed': False},
+            {'description': 'glue', 'quantity': None, 'taxed': True},
+        ])
+
+        form = self.invoice(max_rows=2)
+        form.set_submitted({'lines': [{}, {}, {}]}, source='json')
+        assert form.elements.lines.errors == ['too many rows submitted (maximum is 2)']
+        form.set_submitted({'lines': 'x'}, source='json')
+        assert form.elements.lines.errors == ['invalid rows']
+
+    def test_urlencoded(self):
+        form = self.invoice()
+        form.set_submitted(b'invoice-submit-flag=submitted&lines-rows=1&lines-0-description=a+b'
+                           b'&other-0-description=x')
+        assert form.is_valid()
+        self.assertEqual(form.elements.lines.value[0]['description'], 'a b')
+
+    def test_errors(self):
+        form = self.invoice()
+        form.set_submitted(self.values(rows='2', _0_description='nails', _1_quantity='x'))
+        assert not form.is_valid()
+        lines = form.elements.lines
+        self.assertEqual(lines.row_errors, [
+            {},
+            {'description': ['field is required'], 'quantity': ['Please enter an integer value']},
+        ])
+        self.assertEqual(form.all_errors()[1], {'Lines': [
+            'row 2: Description: field is required',
+            'row 2: Quantity: Please enter an integer value',
+        ]})
+        html = form.render()
+        assert '<p class="error">Please enter an integer value</p>' in html
+        assert 'value="x"' in html
+        # the errors are shown with the row, not again for the formset
+        assert html.count('field is required') == 1
+
+    def test_rows(self):
+        form = self.invoice()
+        form.set_submitted(self.values(rows='abc'))
+        assert not form.is_valid()
+        self.assertEqual(form.elements.lines.errors, ['invalid number of rows'])
+
+        form = self.invoice(max_rows=2)
+        form.set_submitted(self.values(rows='3'))
+        assert not form.is_valid()
+        self.assertEqual(form.elements.lines.errors, ['too many rows submitted (maximum is 2)'])
+
+        # nothing submitted for the formset
+        form = self.invoice()
+        form.set_submitted(self.values())
+        assert form.is_valid()
+        assert form.get_values()['lines'] == []
+
+        form = self.invoice(required=True)
+        form.set_submitted(self.values(rows='0'))
+        assert not form.is_valid()
+        self.assertEqual(form.elements.lines.errors, ['field is required'])
+
+    def test_skip_empty(self):
+        form = self.invoice(skip_empty=True)
+        form.set_submitted(self.values(rows='2', _0_description='nails', _1_description=''))
+        assert form.is_valid()
+        self.assertEqual(form.get_values()['lines'],
+                         [{'description': 'nails', 'quantity': None, 'taxed': False}])
+
+    def test_render(self):
+        form = self.invoice(rows=2)
+        html = str(form.elements.lines.render())
+        assert html.startswith('<input name="lines-rows" type="hidden" value="2" />'
+                               '<table class="formset" id="invoice-lines"><thead><tr>'
+                               '<th>Description</th><th>Quantity</th><th>Taxed</th></tr></thead>')
+        assert '<td class="quantity"><input class="text" id="invoice-lines-1-quantity" ' \
+            'name="lines-1-quantity" type="text" /></td>' in html
+        assert html.count('<tr class="formset-row">') == 2
+        # rendering doesn't change the template
+        assert str(form.elements.lines.render()) == html
+        assert 'name' not in form.elements.lines.description.attributes
+
+    def test_defaults_and_rows(self):
+        form = self.invoice(extra=1)
+        lines = form.elements.lines
+        lines.defaultval = [{'description': 'nails', 'quantity': 10}]
+        assert lines.rows == 2
+        lines.add_row({'description': 'glue'})
+        assert lines.rows == 3
+        html = str(lines.render())
+        assert 'name="lines-0-description" type="text" value="nails"' in html
+        assert 'name="lines-2-description" type="text" value="glue"' in html
+
+        lines.remove_row(0)
+        assert lines.rows == 2
+        html = str(lines.render())
+        assert 'nails' not in html
+        assert 'name="lines-1-description" type="text" value="glue"' in html
+        with self.assertRaises(IndexError):
+            lines.remove_row(2)
+
+        form.set_submitted(self.values(rows='2', _0_description='a', _1_description='b'))
+        lines.remove_row(0)
+        assert form.is_valid()
+        self.assertEqual([row['description'] for row in lines.value], ['b'])
+
+    def test_static(self):
+        form = Form('invoice', static=True)
+        lines = form.add_formset('lines', 'Lines')
+        lines.add_text('description', 'Description')
+        lines.defaultval = [{'description': 'nails'}]
+        html = str(lines.render())
+        assert 'lines-rows' not in html
+        assert 'nails' in html
+        assert '<input' not in html
+
+    def test_confirm_in_row(self):
+        form = Form('f')
+        users = form.add_formset('users', 'Users')
+        users.add_password('password', 'Password')
+        users.add_confirm('confirm', 'Confirm', match='password')
+        form.set_submitted({'f-submit-flag': 'submitted', 'users-rows': '2',
+                            'users-0-password': 'a', 'users-0-confirm': 'a',
+                            'users-1-password': 'a', 'users-1-confirm': 'b'})
+        assert not form.is_valid()
+        assert users.row_errors[0] == {}
+        assert list(users.row_errors[1]) == ['confirm']
+
+    def test_fingerprint(self):
+        assert self.invoice().fingerprint() == self.invoice().fingerprint()
+        form = self.invoice()
+        form.elements.lines.add_text('note')
+        assert form.fingerprint() != self.invoice().fingerprint()
+
+    @raises(ProgrammingError, 'file elements are not supported in formsets')
+    def test_no_files(self):
+        Form('f').add_formset('rows').add_file('upload')
+
+    def test_unsupported_elements(self):
+        rows = Form('f').add_formset('rows')
+        for type in ('radio', 'mcheckbox', 'elgroup', 'formset'):
+            with self.assertRaises(ProgrammingError):
+                getattr(rows, 'add_%s' % type)('x')
+
+    def test_render_elements(self):
+        form = Form('f')
+        lines = form.add_formset('lines', 'Lines')
+        lines.add_header('head', 'Line')
+        lines.add_select('color', [(1, 'red'), (2, 'blue')], 'Color')
+        lines.add_mselect('sizes', [(1, 's'), (2, 'm')], 'Sizes')
+        lines.add_textarea('note', 'Note')
+        form.set_submitted({'f-submit-flag': 'submitted', 'lines-rows': '1',
+                            'lines-0-color': '2', 'lines-0-sizes': ['1', '2'],
+                            'lines-0-note': 'hi'})
+        html = str(lines.render())
+        assert '<h3 id="f-lines-0-head">Line</h3>' in html
+        assert '<select id="f-lines-0-color" name="lines-0-color">' in html
+        assert '<option selected="selected" value="2">blue</option>' in html
+        assert 'name="lines-0-sizes"' in html
+        assert html.count('selected="selected"') == 3
+        assert '<textarea cols="40" id="f-lines-0-note" name="lines-0-note" rows="7">hi' in html
+        assert lines.color.nameattr is None
+        assert 'name' not in lines.note.attributes
+
+    def test_formset_errors(self):
+        form = self.invoice()
+        form.set_submitted(self.values(rows='1'))
+        assert not form.is_valid()
+        lines = form.elements.lines
+        lines.add_error('db says no')
+        assert lines.errors == ['row 1: Description: field is required', 'db says no']
+        assert lines.formset_errors == ['db says no']
+
+    def test_static_in_row(self):
+        form = Form('f')
+        lines = form.add_formset('lines', 'Lines')
+        lines.add_header('head', 'Line')
+        lines.add_static('note', 'Note', 'fill in the name')
+        lines.add_text('name', 'Name', required=True)
+        form.set_submitted({'f-submit-flag': 'submitted', 'lines-rows': '2',
+                            'lines-0-name': 'a'})
+        assert not form.is_valid()
+        assert lines.errors == ['row 2: Name: field is required']
+        assert lines.row_errors == [{}, {'name': ['field is required']}]
+
 # need to test adding group first and then members
 # test setting attributes for each element with a render()
 # from_python_exception test needs to be created
+
+
+class TypedConversionTest(unittest.TestCase):
+    """ typed values skip FormEncode, but the results must be the same """
+
+    values = [0, 5, -3, 2 ** 53, 2 ** 60 + 1, True, False, 1.5, 2.0, -0.0, float('inf'),
+              float('nan'), decimal.Decimal('1.25'), 'text']
+
+    def convert(self, vtype, value, typed):
+        form = Form('f')
+        el = form.add_text('field', vtype=vtype)
+        el.submittedval = value
+        try:
+            if typed:
+                el.is_valid()
+            else:
+                # the typed conversions are skipped when hooks are active
+                with hooks.subscribed(lambda event: None):
+                    el.is_valid()
+        except Exception as e:
+            # e.g. FormEncode's Int doesn't handle infinity
+            return type(e)
+        return el._valid, el._safeval, el.errors
+
+    def test_same_results(self):
+        for vtype in ('bool', 'int', 'number', 'decimal', 'str'):
+            for value in self.values:
+                typed = self.convert(vtype, value, True)
+                scalar = self.convert(vtype, value, False)
+                # nan != nan
+                assert repr(typed) == repr(scalar), (vtype, value, typed, scalar)
+                if isinstance(typed, tuple):
+                    assert type(typed[1]) is type(scalar[1]), (vtype, value)
+
+    def test_required_checkbox(self):
+        for value in (NotGiven, False, True, '', 'on'):
+            results = []
+            for typed in (True, False):
+                form = Form('f')
+                el = form.add_checkbox('terms', required=True)
+                el.submittedval = value
+                if typed:
+                    el.is_valid()
+                else:
+                    with hooks.subscribed(lambda event: None):
+                        el.is_valid()
+                results.append((el._valid, el._safeval, el.errors))
+            assert results[0] == results[1], (value, results)
+
+        form = Form('f')
+        form.add_checkbox('terms', required=True)
+        form.set_submitted({'f-submit-flag': 'submitted'})
+        assert not form.is_valid()
+        assert form.elements.terms.errors == ['field is required']
@@ -1,8 +1,15 @@
+import collections
+import datetime
+import decimal
 from formencode.validators import Int
+import os
+import subprocess
+import sys
 import unittest
 
 from webhelpers2.html.builder import literal
 
+from blazeform import cache
 from blazeform.form import Form
 from blazeform.element import TextElement
 from blazeform.exceptions import ValueInvalid, ElementInvalid, ProgrammingError
@@ -247,6 +254,100 @@ class CommonFormUsageTest(unittest.TestCase):
         f.set_submitted({'f-submit-flag': 'submitted', 'f': 'foo'})
         assert f.is_valid()
 
+    def test_is_valid_fail_fast(self):
+        vcalled = []
+
+        def validator(form):
+            vcalled.append(True)
+
+        f = Form('f')
+        f.add_text('f1', 'f1', required=True)
+        f.add_text('f2', 'f2', required=True)
+        f.add_validator(validator)
+        f.set_submitted({'f-submit-flag': 'submitted'})
+        assert not f.is_valid(fail_fast=True)
+        self.assertEqual(f.elements.f1.errors, ['field is required'])
+        # the second element and the form validators were never processed
+        assert f.elements.f2._valid is None
+        assert not vcalled
+
+        # default is still to collect everything
+        f.set_submitted({'f-submit-flag': 'submitted'})
+        assert not f.is_valid()
+        self.assertEqual(f.elements.f2.errors, ['field is required'])
+        assert vcalled
+
+        # stops at the first failing form validator
+        def failing(form):
+            raise ValueInvalid('first')
+
+        def failing2(form):
+            raise ValueInvalid('second')
+        f = Form('f')
+        f.add_validator(failing)
+        f.add_validator(failing2)
+        f.set_submitted({'f-submit-flag': 'submitted'})
+        assert not f.is_valid(fail_fast=True)
+        self.assertEqual(f._errors, ['first'])
+
+    def test_size_limits(self):
+        f = Form('f', max_value_length=5, max_list_length=2)
+        f.add_text('text', 'Text')
+        f.add_text('long', 'Long', max_value_length=None)
+        f.add_mselect('mselect', [(1, 'one'), (2, 'two'), (3, 'three')], 'Multi')
+        assert 'max_value_length' not in f.attributes
+        f.set_submitted({'f-submit-flag': 'submitted', 'text': '123456', 'long': '123456',
+                         'mselect': ['1', '2', '3']})
+        assert not f.is_valid()
+        self.assertEqual(f.elements.text.errors,
+                         ['value is too long (maximum is 5 characters)'])
+        self.assertEqual(f.elements.mselect.errors, ['too many values submitted (maximum is 2)'])
+        # rejected values are not kept around
+        assert f.elements.text.submittedval is NotGiven
+        assert f.elements.long.is_valid()
+
+        # items of a list are checked for length too
+        f.set_submitted({'f-submit-flag': 'submitted', 'mselect': ['1', '123456']})
+        self.assertEqual(f.elements.mselect.errors,
+                         ['value is too long (maximum is 5 characters)'])
+
+        f.set_submitted({'f-submit-flag': 'submitted', 'text': '12345', 'mselect': ['1', '2']})
+        assert f.is_valid()
+
+    def test_max_submitted_keys(self):
+        f = Form('f', max_submitted_keys=2)
+        f.add_text('text', 'Text')
+        f.set_submitted({'f-submit-flag': 'submitted', 'text': 'foo', 'other': 'bar'})
+        assert f.is_submitted()
+        assert not f.is_valid()
+        self.assertEqual(f._errors, ['too many values submitted'])
+        assert f.elements.text.submittedval is NotGiven
+
+        f.set_submitted({'f-submit-flag': 'submitted', 'text': 'foo'})
+        assert f.is_valid()
+        self.assertEqual(f._errors, [])
+
+        # the previous submission's values are cleared
+        f = Form('f', max_submitted_keys=3)
+        f.add_text('text', 'Text')
+        f.add_checkbox('check', 'Check')
+        lines = f.add_formset('lines', 'Lines')
+        lines.add_text('name', 'Name')
+        f.set_submitted({'f-submit-flag': 'submitted', 'text': 'foo', 'check': 'on'})
+        assert f.get_values()['text'] == 'foo'
+        f.set_submitted({'f-submit-flag': 'submitted', 'a': '1', 'b': '2', 'c': '3'})
+        assert not f.is_valid()
+        assert f.elements.text.value is NotGiven
+        assert f.elements.check.submittedval is NotGiven
+        assert f.elements.lines.submittedval is NotGiven
+
+    def test_rejected_if_invalid(self):
+        f = Form('f', max_value_length=3)
+        f.add_text('text', 'Text', if_invalid='default')
+        f.set_submitted({'f-submit-flag': 'submitted', 'text': 'toolong'})
+        assert f.is_valid()
+        assert f.elements.text.value == 'default'
+
     def test_form_validators(self):
         def validator(form):
             if form.elements.myfield.is_valid():
@@ -406,6 +507,66 @@ class CommonFormUsageTest(unittest.TestCase):
         assert not f.handle_exception(Exception('text'))
         self.assertEqual(len(f._errors), 0)
 
+    def test_exception_handling_index(self):
+        class IntegrityError(Exception):
+            pass
+
+        class SubIntegrityError(IntegrityError):
+            pass
+
+        form = Form('f')
+        els = []
+        for num in range(20):
+            el = form.add_text('field%d' % num, 'Field')
+            el.add_handler('"uq_field%d"' % num, 'field%d taken' % num, IntegrityError)
+            els.append(el)
+        form.add_handler('uq_field', 'form level')
+
+        # subclasses match by type, the first handler in order wins
+        assert form.handle_exception(SubIntegrityError('violates "uq_field12"'))
+        self.assertEqual(els[12].errors, ['field12 taken'])
+        assert not els[1].errors
+        assert not form._errors
+
+        # wrong type, so falls through to the form handler
+        assert form.handle_exception(ValueError('violates "uq_field3"'))
+        assert not els[3].errors
+        self.assertEqual(form._errors, ['form level'])
+
+        # exception types given by name must match exactly
+        form = Form('f')
+        form.add_handler('foo', 'by name', 'IntegrityError')
+        assert not form.handle_exception(SubIntegrityError('foo'))
+        assert form.handle_exception(IntegrityError('foo'))
+        self.assertEqual(form._errors, ['by name'])
+
+        # handlers added after a lookup are seen
+        form = Form('f')
+        el = form.add_text('field', 'Field')
+        assert not form.handle_exception(Exception('late'))
+        el.add_handler('late', 'late msg')
+        assert form.handle_exception(Exception('late'))
+        self.assertEqual(el.errors, ['late msg'])
+
+        # callbacks are called in order and the form's callback result is used
+        calls = []
+
+        def el_callback(exc):
+            calls.append('el')
+            return False
+
+        def form_callback(exc):
+            calls.append('form')
+            return 'handled'
+        form = Form('f')
+        el = form.add_text('field', 'Field')
+        el.add_handler(callback=el_callback, exc_type=ValueError)
+        form.add_handler(callback=form_callback, exc_type=KeyError)
+        assert not form.handle_exception(Exception('foo'))
+        self.assertEqual(calls, ['el'])
+        self.assertEqual(form.handle_exception(KeyError('foo')), 'handled')
+        self.assertEqual(calls, ['el', 'el', 'form'])
+
     def test_submitted_only_when_appropriate(self):
         f1 = Form('login1')
         f1.add_text('field')
@@ -464,6 +625,387 @@ class CommonFormUsageTest(unittest.TestCase):
         form_errors, field_errors = f1.all_errors(id_as_key=True)
         self.assertEqual(field_errors, {'field': ['field is required']})
 
+    def test_rendering_imports_are_lazy(self):
+        # a fresh interpreter, since the tests have already rendered forms
+        code = 'import sys, blazeform.form\n' \
+            'f = blazeform.form.Form("f")\n' \
+            'f.add_text("t", maxlength=5)\n' \
+            'f.set_submitted({"f-submit-flag": "submitted", "t": "foo"})\n' \
+            'assert f.is_valid()\n' \
+            'assert "webhelpers2" not in sys.modules, "webhelpers2 imported"\n' \
+            'assert "blazeform.render" not in sys.modules, "render imported"\n' \
+            'f.render()\n' \
+            'assert "webhelpers2" in sys.modules\n'
+        subprocess.check_call([sys.executable, '-c', code])
+
+
+def fingerprint_form(label='Name', maxlength=10, extra=False):
+    form = Form('fp', class_='fp')
+    form.add_text('name', label, maxlength=maxlength)
+    form.add_select('color', [(1, 'red'), (2, 'blue')], 'Color')
+    form.add_password('password', 'Password')
+    form.add_confirm('confirm', 'Confirm', match='password')
+    form.add_text('age', 'Age', vtype='int').add_processor(Int(min=1))
+    form.add_handler('uq_name', 'name is taken', exc_type=ValueError)
+    group = form.add_elgroup('group')
+    group.add_checkbox('agree', 'Agree', attrs={'b': 1, 'a': {'x', 'y'}})
+    if extra:
+        form.add_text('extra')
+    return form
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def test_stable(self):
+        fingerprint = fingerprint_form().fingerprint()
+        assert len(fingerprint) == 64
+        assert fingerprint_form().fingerprint() == fingerprint
+        # folding in the parts doesn't change the result
+        assert fingerprint_form().fingerprint() == fingerprint
+
+    def test_changes(self):
+        fingerprint = fingerprint_form().fingerprint()
+        assert fingerprint_form(label='Your Name').fingerprint() != fingerprint
+        assert fingerprint_form(maxlength=11).fingerprint() != fingerprint
+        assert fingerprint_form(extra=True).fingerprint() != fingerprint
+
+        form = fingerprint_form()
+        assert form.fingerprint() == fingerprint
+        form.elements.name.add_processor(Int)
+        assert form.fingerprint() != fingerprint
+
+        form = fingerprint_form()
+        form.add_validator(lambda form: None)
+        assert form.fingerprint() != fingerprint
+
+    def test_processing(self):
+        def radio_form():
+            form = Form('f')
+            form.add_radio('r1', 'One', 'one', 'color')
+            form.add_radio('r2', 'Two', 'two', 'color')
+            return form
+        form = radio_form()
+        fingerprint = form.fingerprint()
+        # the group's Select processor is added when it's first processed
+        form.set_submitted({'f-submit-flag': 'submitted', 'color': 'one'})
+        assert form.is_valid()
+        assert form.fingerprint() == fingerprint == radio_form().fingerprint()
+
+    def test_order(self):
+        f1 = Form('f')
+        f1.add_text('a')
+        f1.add_text('b')
+        f2 = Form('f')
+        f2.add_text('b')
+        f2.add_text('a')
+        assert f1.fingerprint() != f2.fingerprint()
+
+    def test_across_processes(self):
+        code = 'from blazeform.tests.test_form import fingerprint_form\n' \
+            'print(fingerprint_form().fingerprint())'
+        fingerprints = set()
+        for seed in ('1', '2'):
+            env = dict(os.environ, PYTHONHASHSEED=seed)
+            output = subprocess.check_output([sys.executable, '-c', code], env=env)
+            fingerprints.add(output.decode().strip())
+        assert fingerprints == {fingerprint_form().fingerprint()}
+
+
+class ResetTest(unittest.TestCase):
+
+    def test_reset(self):
+        form = fingerprint_form()
+        form.checkpoint()
+        html = form.render()
+        values = form.get_values()
+
+        form.set_defaults({'name': 'fred'})
+        form.set_submitted({'fp-submit-flag': 'submitted', 'name': 'x' * 11, 'age': '0',
+                            'password': 'a', 'confirm': 'b', 'agree': 'on'})
+        assert not form.is_valid()
+        form.add_error('form error')
+        form.elements.age.render(class_='wide')
+        assert form.render() != html
+
+        form.reset()
+        assert not form.is_submitted()
+        assert form.all_errors() == ([], {})
+        assert form.elements.name.defaultval is NotGiven
+        assert form.elements.age.errors == []
+        assert form.get_values() == values
+        assert form.render() == html
+
+        # the form can be used again
+        form.set_submitted({'fp-submit-flag': 'submitted', 'name': 'bob', 'age': '5'})
+        assert form.is_valid()
+        assert form.get_values()['age'] == 5
+
+    def test_unchanged_state_is_kept(self):
+        form = fingerprint_form()
+        form.checkpoint()
+        attributes = form.elements.color.attributes
+        errors = form.elements.color.errors
+        form.set_submitted({'fp-submit-flag': 'submitted', 'name': 'bob'})
+        form.reset()
+        assert form.elements.color.attributes is attributes
+        assert form.elements.color.errors is errors
+
+    def test_not_checkpointed(self):
+        form = fingerprint_form()
+        with self.assertRaises(ProgrammingError):
+            form.reset()
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def submitted(self):
+        form = fingerprint_form()
+        form.set_submitted({'fp-submit-flag': 'submitted', 'name': 'x' * 11, 'age': '5',
+                            'color': '2', 'agree': 'on'})
+        assert not form.is_valid()
+        form.add_error('form error')
+        return form
+
+    def test_round_trip(self):
+        snapshot = self.submitted().snapshot()
+        assert len(snapshot) < 300
+
+        form = fingerprint_form()
+        form.restore(snapshot)
+        assert form.is_submitted()
+        assert not form.is_valid()
+        self.assertEqual(form.elements.name.errors,
+                         ['Enter a value not greater than 10 characters long'])
+        assert form._errors == ['form error']
+        assert form.elements.age.is_valid()
+        assert form.elements.age.value == 5
+        assert form.elements.agree.value is True
+        assert form.elements.color.value == '2'
+        assert form.all_errors() == self.submitted().all_errors()
+
+    def test_defaults(self):
+        form = fingerprint_form()
+        form.elements.name.defaultval = 'fred'
+        form.checkpoint()
+        form.set_defaults({'age': datetime.date(2020, 1, 2),
+                           'color': decimal.Decimal('1.5')})
+        snapshot = form.snapshot()
+        # unchanged since the checkpoint
+        assert 'fred' not in snapshot
+
+        form = fingerprint_form()
+        form.restore(snapshot)
+        assert form.elements.name.defaultval is NotGiven
+        assert form.elements.age.defaultval == datetime.date(2020, 1, 2)
+        assert form.elements.color.defaultval == decimal.Decimal('1.5')
+        assert not form.is_submitted()
+
+        form = fingerprint_form()
+        form.elements.name.defaultval = object()
+        with self.assertRaises(TypeError):
+            form.snapshot()
+
+    def test_dict_values(self):
+        # e.g. submitted as JSON, dicts that look like saved values are kept
+        values = [{'$t': 'nope', 'v': 1}, {'$t': 'date', 'v': '2020-01-02'},
+                  {'a': [{'$t': {'$t': 'x'}}], 'b': datetime.date(2020, 1, 2)}]
+        form = Form('f')
+        form.add_text('field')
+        form.elements.field.submittedval = values
+        snapshot = form.snapshot()
+
+        form = Form('f')
+        form.add_text('field')
+        form.restore(snapshot)
+        assert form.elements.field.submittedval == values
+
+        with self.assertRaises(ValueError):
+            form.restore('{"v":1,"f":"f","s":{"field":{"$t":"nope","v":1}}}')
+
+    def test_mismatch(self):
+        snapshot = self.submitted().snapshot()
+        with self.assertRaises(ValueError):
+            Form('other').restore(snapshot)
+        with self.assertRaises(ValueError):
+            fingerprint_form().restore(snapshot.replace('"v":1', '"v":2'))
+        with self.assertRaises(ProgrammingError):
+            Form('fp', static=True).restore(snapshot)
+
+        # elements the form doesn't have are ignored
+        form = Form('fp')
+        form.add_text('name')
+        form.restore(snapshot)
+        assert form.elements.name.errors
+
+
+class RecordTest(unittest.TestCase):
+
+    def submitted(self):
+        form = fingerprint_form()
+        form.set_submitted({'fp-submit-flag': 'submitted', 'name': 'fred', 'age': '5',
+                            'color': '2', 'agree': 'on'})
+        assert form.is_valid()
+        return form
+
+    def test_values_as(self):
+        form = self.submitted()
+        record = form.values_as()
+        values = form.get_values()
+        del values['fp-submit-flag']
+        assert record._asdict() == values
+        assert record.age == 5
+        assert type(record).__name__ == 'FpRecord'
+        assert type(record).__annotations__['age'] is int
+        assert type(record).__annotations__['agree'] is bool
+
+        Person = collections.namedtuple('Person', 'name color password confirm age agree')
+        assert form.values_as(Person) == Person(*record)
+
+    def test_cached(self):
+        record_type = self.submitted().record_type()
+        assert fingerprint_form().record_type() is record_type
+        assert fingerprint_form(extra=True).record_type() is not record_type
+
+        # adding an element makes a new type
+        form = fingerprint_form()
+        assert form.record_type() is record_type
+        form.add_text('extra')
+        assert form.record_type()._fields[-1] == 'extra'
+
+        # the definition isn't hashed to find the record type
+        form = fingerprint_form()
+        form.values_as()
+        assert form._fingerprint_parts
+
+    def test_names(self):
+        form = Form('my-form')
+        form.add_text('first-name')
+        form.add_text('class')
+        assert form.record_type()._fields == ('first_name', '_1')
+        assert type(form.values_as()).__name__ == 'MyFormRecord'
+
+    def test_pickle(self):
+        form = self.submitted()
+        form.values_as()
+        copy = cache.loads(cache.dumps(form))
+        assert copy.values_as() == form.values_as()
+
+
+class ProjectionTest(unittest.TestCase):
+
+    def submitted(self):
+        form = fingerprint_form()
+        # age is invalid
+        form.set_submitted({'fp-submit-flag': 'submitted', 'name': 'fred', 'age': '0',
+                            'color': '2'})
+        return form
+
+    def test_only(self):
+        form = self.submitted()
+        assert form.get_values(only=['name', 'color']) == {'name': 'fred', 'color': '2'}
+        # the other elements weren't processed
+        assert form.elements.age._valid is None
+        assert form.elements.password._valid is None
+        with self.assertRaises(ElementInvalid):
+            form.get_values(only=['age'])
+        with self.assertRaises(KeyError):
+            form.get_values(only=['nope'])
+        # the definition isn't hashed to find the elements
+        assert form._fingerprint_parts
+
+    def test_view(self):
+        form = self.submitted()
+        view = form.values_view()
+        assert 'name' in view
+        assert 'nope' not in view
+        assert len(view) == len(list(form.returning_els))
+        assert list(view)[:2] == ['fp-submit-flag', 'name']
+        assert form.elements.name._valid is None
+        assert view['name'] == 'fred'
+        assert form.elements.name._valid
+        assert form.elements.age._valid is None
+        with self.assertRaises(ElementInvalid):
+            view['age']
+        assert view.get('color') == '2'
+
+        # changes to the form are seen
+        form.add_text('extra')
+        assert view['extra'] is NotGiven
+
+
+class JsonSubmissionTest(unittest.TestCase):
+
+    def form(self):
+        form = Form('api')
+        form.add_text('name', 'Name', required=True)
+        form.add_text('age', 'Age', vtype='int')
+        form.add_text('price', 'Price', vtype='float')
+        form.add_checkbox('active', 'Active')
+        form.add_mselect('tags', [(1, 'a'), (2, 'b')], 'Tags', vtype='int')
+        return form
+
+    def test_typed(self):
+        form = self.form()
+        form.set_submitted({'name': ' fred ', 'age': 5, 'price': 2.0, 'active': True,
+                            'tags': [1, 2]}, source='json')
+        assert form.is_submitted()
+        assert form.is_valid()
+        assert form.get_values(only=['name', 'age', 'price', 'active', 'tags']) == \
+            {'name': 'fred', 'age': 5, 'price': 2, 'active': True, 'tags': [1, 2]}
+        assert type(form.elements.price.value) is int
+
+    def test_invalid(self):
+        form = self.form()
+        form.set_submitted(b'{"name": null, "age": "5", "price": true}', source='json')
+        assert not form.is_valid()
+        assert form.elements.name.errors == ['field is required']
+        # not converted like submitted strings
+        assert form.elements.age.errors == ['an integer expected']
+        assert form.elements.price.errors == ['a number expected']
+
+    def test_types_checked(self):
+        form = self.form()
+        form.add_text('amount', 'Amount', vtype='decimal')
+        form.add_text('note', 'Note')
+        form.set_submitted({'name': {'a': 1}, 'age': 5.7, 'active': 1, 'tags': [1, 'b'],
+                            'note': ['x']}, source='json')
+        assert not form.is_valid()
+        assert form.elements.name.errors == ['a single value expected']
+        assert form.elements.age.errors == ['an integer expected']
+        assert form.elements.active.errors == ['true or false expected']
+        assert form.elements.tags.errors == ['an integer expected']
+        assert form.elements.note.errors == ['a single value expected']
+
+        form.set_submitted({'name': 'x', 'age': True}, source='json')
+        assert form.elements.age.errors == ['an integer expected']
+
+    def test_decimals(self):
+        form = self.form()
+        form.add_text('amount', 'Amount', vtype='decimal')
+        form.set_submitted(b'{"name": "x", "amount": 0.1, "price": 0.25}', source='json')
+        assert form.is_valid()
+        assert form.elements.amount.value == decimal.Decimal('0.1')
+        assert form.elements.price.value == 0.25
+        # floats decoded by the caller
+        form.set_submitted({'name': 'x', 'amount': 0.1}, source='json')
+        assert form.elements.amount.value == decimal.Decimal('0.1')
+
+    def test_formset_rows(self):
+        form = self.form()
+        lines = form.add_formset('lines', 'Lines')
+        lines.add_text('quantity', 'Quantity', vtype='int')
+        form.set_submitted({'name': 'x', 'lines': [{'quantity': 1}, {'quantity': 1.5}]},
+                           source='json')
+        assert not form.is_valid()
+        assert lines.errors == ['row 2: Quantity: an integer expected']
+
+    def test_errors(self):
+        form = self.form()
+        with self.assertRaises(ValueError):
+            form.set_submitted('[1]', source='json')
+        with self.assertRaises(ValueError):
+            form.set_submitted({}, source='xml')
+
 
 # run the tests if module called directly
 if __name__ == "__main__":
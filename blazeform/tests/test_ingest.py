@@ -0,0 +1,102 @@
+from io import StringIO
+import json
+import os
+import tempfile
+
+from blazeutils.testing import raises
+
+from blazeform.exceptions import ValueInvalid
+from blazeform.form import Form
+from blazeform.ingest import ingest, read_csv, read_jsonl, RowError
+
+
+def contact_form():
+    form = Form('contact')
+    form.add_text('name', 'Name', required=True)
+    form.add_text('age', 'Age', vtype='int')
+    form.add_date('born', 'Born')
+    form.add_text('balance', 'Balance', vtype='decimal')
+
+    def not_bob(form):
+        if form.elements.name.value == 'bob':
+            raise ValueInvalid('not bob')
+    form.add_validator(not_bob)
+    return form
+
+
+CSV = '''Full Name,age,born,balance
+ann,30,02/03/2001,1.50
+,x,,
+bob,5,,
+,,,
+tim,,,
+'''
+
+
+def lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def run(source, **kwargs):
+    valid = StringIO()
+    errors = StringIO()
+    counts = ingest(contact_form, source, valid, errors, **kwargs)
+    return counts, lines(valid), lines(errors)
+
+
+def test_csv():
+    counts, valid, errors = run(StringIO(CSV), format='csv', columns={'Full Name': 'name'},
+                                chunk_size=2)
+    assert counts == {'rows': 5, 'valid': 2, 'invalid': 2, 'skipped': 1}
+    assert valid == [
+        {'name': 'ann', 'age': 30, 'born': '2001-02-03', 'balance': '1.50'},
+        {'name': 'tim', 'age': None, 'born': None, 'balance': None},
+    ]
+    assert errors == [
+        {'row': 2, 'element': 'name', 'messages': ['field is required']},
+        {'row': 2, 'element': 'age', 'messages': ['Please enter an integer value']},
+        {'row': 3, 'element': None, 'messages': ['not bob']},
+    ]
+
+
+def test_jsonl():
+    source = StringIO('{"name": "ann", "age": 30}\n\n[1]\n{"name": \n{"age": "x"}\n')
+    counts, valid, errors = run(source, format='jsonl')
+    assert counts == {'rows': 4, 'valid': 1, 'invalid': 3, 'skipped': 0}
+    assert valid == [{'name': 'ann', 'age': 30, 'born': None, 'balance': None}]
+    assert [(error['row'], error['element']) for error in errors] == \
+        [(2, None), (3, None), (4, 'name'), (4, 'age')]
+    assert errors[0]['messages'] == ['the line is not a JSON object']
+    assert errors[1]['messages'][0].startswith('invalid JSON: ')
+
+
+def test_readers():
+    rows = list(read_csv(StringIO('a,b\n1,2\n'), {'a': 'x'}))
+    assert rows == [{'x': '1', 'b': '2'}]
+    rows = list(read_jsonl(StringIO('{"a": 1}\n1\n')))
+    assert rows[0] == {'a': 1}
+    assert isinstance(rows[1], RowError)
+
+
+def test_paths_and_processes():
+    with tempfile.TemporaryDirectory() as dirname:
+        source = os.path.join(dirname, 'contacts.csv')
+        valid = os.path.join(dirname, 'valid.jsonl')
+        errors = os.path.join(dirname, 'errors.jsonl')
+        with open(source, 'w') as stream:
+            stream.write('name,age\n')
+            for number in range(50):
+                stream.write('person%d,%s\n' % (number, 'x' if number % 10 == 0 else number))
+
+        counts = ingest(contact_form, source, valid, errors, chunk_size=7, processes=2)
+        assert counts == {'rows': 50, 'valid': 45, 'invalid': 5, 'skipped': 0}
+        with open(valid) as stream:
+            records = [json.loads(line) for line in stream]
+        assert [record['name'] for record in records][:3] == ['person1', 'person2', 'person3']
+        with open(errors) as stream:
+            assert [json.loads(line)['row'] for line in stream] == [1, 11, 21, 31, 41]
+
+
+@raises(ValueError, 'unknown format, "csv" or "jsonl" expected')
+def test_unknown_format():
+    ingest(contact_form, StringIO(''), StringIO(), StringIO())
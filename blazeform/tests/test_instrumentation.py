@@ -0,0 +1,98 @@
+from blazeutils.testing import raises
+
+from blazeform.exceptions import ValueInvalid
+from blazeform.form import Form
+from blazeform.instrumentation import hooks, Instrumentation
+
+
+class Recorder(object):
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def names(self):
+        return [event.name for event in self.events]
+
+
+class LoginForm(Form):
+    def __init__(self):
+        Form.__init__(self, 'login')
+        self.add_text('username', 'User Name', maxlength=5)
+        self.add_text('age', 'Age', vtype='int')
+        self.add_validator(self.validator)
+
+    def validator(self, form):
+        if form.elements.username.value == 'bad':
+            raise ValueInvalid('bad username')
+
+
+def test_inactive_by_default():
+    assert not hooks.active
+    instrumentation = Instrumentation()
+    recorder = Recorder()
+    instrumentation.subscribe(recorder)
+    assert instrumentation.active
+    instrumentation.unsubscribe(recorder)
+    assert not instrumentation.active
+
+
+def test_events():
+    recorder = Recorder()
+    with hooks.subscribed(recorder):
+        form = LoginForm()
+        form.set_submitted({'login-submit-flag': 'submitted', 'username': 'bad', 'age': '10'})
+        assert not form.is_valid()
+        form.render()
+        form.handle_exception(Exception('foo'))
+    assert not hooks.active
+
+    names = recorder.names()
+    assert names[:2] == ['form_init', 'set_submitted']
+    assert names.count('processor') == 2
+    assert names.count('form_validator') == 1
+    assert names.count('render_row') == 3
+    assert names[-1] == 'handle_exception'
+    assert all(event.elapsed_ns >= 0 for event in recorder.events)
+    assert all(event.form is form for event in recorder.events)
+
+    maxlength, int_conversion = [e for e in recorder.events if e.name == 'processor']
+    assert maxlength.element_id == 'username'
+    assert maxlength.processor_class == 'MaxLength'
+    assert maxlength.value == 'bad'
+    assert int_conversion.element_id == 'age'
+    assert int_conversion.processor_class == 'Int'
+    assert int_conversion.result == 10
+
+    validator = [e for e in recorder.events if e.name == 'form_validator'][0]
+    assert validator.form_name == 'login'
+    assert validator.error is not None
+
+    rows = [e for e in recorder.events if e.name == 'render_row']
+    assert [e.element_id for e in rows] == ['login-submit-flag', 'username', 'age']
+    assert recorder.events[-1].result is False
+
+
+def test_processor_error():
+    recorder = Recorder()
+    form = Form('f')
+    el = form.add_text('field', 'Field', maxlength=1)
+    el.submittedval = '12'
+    with hooks.subscribed(recorder):
+        assert not el.is_valid()
+    assert recorder.events[0].error is not None
+    assert el.errors == ['Enter a value not greater than 1 characters long']
+
+
+def test_subscriber_exceptions_propagate():
+    def subscriber(event):
+        raise ValueError('from subscriber')
+
+    @raises(ValueError, 'from subscriber')
+    def check():
+        with hooks.subscribed(subscriber):
+            Form('f')
+    check()
+    assert not hooks.active
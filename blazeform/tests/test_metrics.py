@@ -0,0 +1,121 @@
+from blazeutils.testing import raises
+
+from blazeform.instrumentation import hooks
+from blazeform.metrics import Counter, FormMetrics, Histogram, Registry
+from blazeform.tests.test_instrumentation import LoginForm
+
+
+def test_counter():
+    counter = Counter('requests_total', 'Requests', ('path',))
+    counter.inc(path='/')
+    counter.inc(2, path='/')
+    counter.inc(path='/a')
+    assert counter.get(path='/') == 3
+    assert counter.get(path='/b') == 0
+    assert counter.snapshot() == [
+        {'labels': {'path': '/'}, 'value': 3},
+        {'labels': {'path': '/a'}, 'value': 1},
+    ]
+
+
+@raises(ValueError, 'requests_total needs the labels: path')
+def test_counter_labels():
+    Counter('requests_total', 'Requests', ('path',)).inc(method='GET')
+
+
+def test_histogram():
+    histogram = Histogram('size', 'Sizes', buckets=(10, 100))
+    for value in (5, 10, 50, 1000):
+        histogram.observe(value)
+    assert histogram.get() == ([2, 3, 4], 1065, 4)
+    assert histogram.snapshot() == [
+        {'labels': {}, 'buckets': {'10': 2, '100': 3, '+Inf': 4}, 'sum': 1065, 'count': 4}
+    ]
+
+
+def test_registry():
+    registry = Registry()
+    counter = registry.counter('hits_total', 'Hits', ('form',))
+    assert registry.counter('hits_total', 'Hits', ('form',)) is counter
+    counter.inc(form='say "hi"\n')
+    registry.histogram('took_seconds', 'Time\ntaken', buckets=(.5,)).observe(.25)
+    assert registry.exposition() == '\n'.join([
+        '# HELP hits_total Hits',
+        '# TYPE hits_total counter',
+        r'hits_total{form="say \"hi\"\n"} 1',
+        r'# HELP took_seconds Time\ntaken',
+        '# TYPE took_seconds histogram',
+        'took_seconds_bucket{le="0.5"} 1',
+        'took_seconds_bucket{le="+Inf"} 1',
+        'took_seconds_sum 0.25',
+        'took_seconds_count 1',
+    ]) + '\n'
+    assert registry.snapshot()['hits_total'] == {
+        'type': 'counter',
+        'help': 'Hits',
+        'samples': [{'labels': {'form': 'say "hi"\n'}, 'value': 1}],
+    }
+
+    registry.clear()
+    assert counter.get(form='say "hi"\n') == 0
+
+
+@raises(ValueError, 'metric "hits_total" is already registered differently')
+def test_registry_conflict():
+    registry = Registry()
+    registry.counter('hits_total', 'Hits', ('form',))
+    registry.histogram('hits_total', 'Hits', ('form',))
+
+
+def test_form_metrics():
+    registry = Registry()
+    with hooks.subscribed(FormMetrics(registry)):
+        form = LoginForm()
+        form.is_valid()
+        form.set_submitted({'username': 'toolong', 'age': 'x', 'login-submit-flag': 'submitted'})
+        form.is_valid()
+        html = form.render()
+
+        form = LoginForm()
+        form.set_submitted({'username': 'bad', 'age': '1', 'login-submit-flag': 'submitted'})
+        form.is_valid()
+
+    metrics = FormMetrics(registry)
+    assert metrics.constructed.get(form='login') == 2
+    assert metrics.validations.get(form='login', result='unsubmitted') == 1
+    assert metrics.validations.get(form='login', result='invalid') == 2
+    assert metrics.invalid_fields.get(form='login', element='username') == 1
+    assert metrics.invalid_fields.get(form='login', element='age') == 1
+    assert metrics.errors.get(form='login', element='age',
+                              message='Please enter an integer value') == 1
+    assert metrics.errors.get(form='login', element='', message='bad username') == 1
+    assert metrics.render_seconds.get(form='login')[2] == 1
+    assert metrics.render_bytes.get(form='login')[1] == len(html.encode('utf-8'))
+    assert 'blazeform_validations_total{form="login",result="invalid"} 2' \
+        in registry.exposition()
+
+
+def test_form_metrics_without_messages():
+    registry = Registry()
+    metrics = FormMetrics(registry, error_messages=False)
+    with hooks.subscribed(metrics):
+        form = LoginForm()
+        form.set_submitted({'username': 'bad', 'age': 'x', 'login-submit-flag': 'submitted'})
+        form.is_valid()
+    assert metrics.invalid_fields.get(form='login', element='age') == 1
+    assert not metrics.errors.values
+
+
+def test_form_metrics_message_limit():
+    registry = Registry()
+    metrics = FormMetrics(registry, max_messages=2)
+    with hooks.subscribed(metrics):
+        for age in ('x', 'y', 'z'):
+            form = LoginForm()
+            form.set_submitted({'username': 'ok', 'age': age, 'login-submit-flag': 'submitted'})
+            form.add_error('no %s' % age)
+            form.is_valid()
+    assert metrics.errors.get(form='login', element='age',
+                              message='Please enter an integer value') == 3
+    assert metrics.errors.get(form='login', element='', message='no x') == 1
+    assert metrics.errors.get(form='login', element='', message='other') == 2
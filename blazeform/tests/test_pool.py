@@ -0,0 +1,69 @@
+import threading
+
+from blazeform.form import Form
+from blazeform.pool import FormPool
+
+
+def login_form(name='login'):
+    form = Form(name)
+    form.add_text('username', 'Username', required=True)
+    form.add_password('password', 'Password', required=True)
+    return form
+
+
+def values(username='bob'):
+    return {'login-submit-flag': 'submitted', 'username': username, 'password': 'secret'}
+
+
+def test_reuse():
+    pool = FormPool(login_form, size=1)
+    with pool.form() as form:
+        html = form.render()
+        form.set_submitted(values())
+        assert form.is_valid()
+    with pool.form() as again:
+        assert again is form
+        assert not again.is_submitted()
+        assert again.render() == html
+
+
+def test_arguments():
+    pool = FormPool(login_form, 'other')
+    with pool.form() as form:
+        assert form._name == 'other'
+
+
+def test_acquired_forms_are_not_shared():
+    pool = FormPool(login_form, size=1)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+    pool.release(first)
+    # the pool is full
+    pool.release(second)
+    assert pool.acquire() is first
+    assert pool.acquire() is not second
+
+
+def test_released_on_error():
+    pool = FormPool(login_form)
+    try:
+        with pool.form() as form:
+            form.set_submitted(values())
+            raise ValueError()
+    except ValueError:
+        pass
+    assert pool.acquire() is form
+    assert not form.is_submitted()
+
+
+def test_per_thread():
+    pool = FormPool(login_form)
+    with pool.form() as form:
+        pass
+    forms = []
+    thread = threading.Thread(target=lambda: forms.append(pool.acquire()))
+    thread.start()
+    thread.join()
+    assert forms[0] is not form
+    assert pool.acquire() is form
@@ -1,13 +1,17 @@
 from blazeutils.testing import raises
 from decimal import Decimal
 from formencode import Invalid
-from formencode.validators import MaxLength
+from formencode.validators import Int, MaxLength as FEMaxLength
 
-from blazeform.processors import Decimal as DecimalProc
+from blazeform.exceptions import ValueInvalid
+from blazeform.form import Form
+from blazeform.processors import BaseValidator, Decimal as DecimalProc, MaxLength, \
+    MultiValues, Select, Wrapper, to_python_many
 
 
 def test_maxlength_bug_fix():
-    assert MaxLength._messages['__buggy_toolong'] == "Enter a value less than %(maxLength)i " \
+    # the fix is scoped to our subclass, FormEncode's validator is left alone
+    assert FEMaxLength._messages['tooLong'] == "Enter a value less than %(maxLength)i " \
         "characters long", 'looks like formencode may have fixed the MaxLength message bug'
     ml = MaxLength(5)
     ml.to_python('12345')
@@ -27,3 +31,100 @@ def test_decimal():
     check()
 
     assert proc.to_python('1.123') == Decimal('1.123')
+
+
+def results(values):
+    return [str(value) if isinstance(value, Invalid) else value for value in values]
+
+
+def test_to_python_many():
+    assert results(DecimalProc().to_python_many(['1.5', 'x', None])) == \
+        [Decimal('1.5'), 'Not a valid number', None]
+    # FormEncode's validators are called for each value
+    assert results(to_python_many(Int(), ['1', 'x'])) == [1, 'Please enter an integer value']
+
+
+def test_select_many():
+    select = Select([(1, 'a'), (2, 'b'), 3], invalid=[3], as_empty=[2])
+    values = ['1', '2', '3', '4', ['1', '2'], ['1', '4'], None, []]
+
+    def one(value):
+        try:
+            return select.to_python(value)
+        except Invalid as e:
+            return e
+    assert results(select.to_python_many(values)) == results([one(value) for value in values])
+    assert results(Select([1], if_invalid=0).to_python_many(['1', '2'])) == ['1', 0]
+
+
+def test_wrapper_many():
+    calls = []
+
+    def double(values):
+        calls.append(values)
+        return [ValueInvalid('odd') if value % 2 else value * 2 for value in values]
+    wrapper = Wrapper(to_python_many=double)
+    assert wrapper.batchable
+    assert results(wrapper.to_python_many([2, 3])) == [4, 'odd']
+    assert calls == [[2, 3]]
+    # used one value at a time too
+    assert wrapper.to_python(4) == 8
+
+    @raises(Invalid, 'odd')
+    def check():
+        wrapper.to_python(5)
+    check()
+
+    plain = Wrapper(to_python=lambda value: value + 1)
+    assert not plain.batchable
+    assert plain.to_python_many([1, 2]) == [2, 3]
+
+
+def test_multivalues_many():
+    form = Form('f')
+    el = form.add_text('name')
+    many = MultiValues(Int()).to_python_many(['1', '', ['1', '2'], 'x'], el)
+    assert results(many) == [1, None, 'this field does not accept more than one value',
+                             'Please enter an integer value']
+
+
+class Lookup(BaseValidator):
+    batchable = True
+
+    def __init__(self, *args, **kwargs):
+        BaseValidator.__init__(self, *args, **kwargs)
+        self.looked_up = []
+
+    def _to_python(self, value, state):
+        self.looked_up.append(value)
+        if value == 'x':
+            raise Invalid('not found', value, state)
+        return value.upper()
+
+
+def test_multiple_field_stops_at_invalid():
+    form = Form('f')
+    el = form.add_mselect('letters', [('a', 'a'), ('b', 'b'), ('x', 'x')])
+    lookup = Lookup()
+    el.add_processor(lookup)
+    el.submittedval = ['a', 'b']
+    assert el.value == ['A', 'B']
+
+    lookup.looked_up = []
+    el.submittedval = ['x', 'a', 'b']
+    assert not el.is_valid()
+    assert el.errors == ['not found']
+    assert lookup.looked_up == ['x']
+
+
+def test_select_many_options():
+    values = [' 1 ', '', '1', '2']
+    for select in (Select([1], not_empty=True), Select([1], strip=True),
+                   Select([1], if_empty='none')):
+        def one(value):
+            try:
+                return select.to_python(value)
+            except Invalid as e:
+                return e
+        assert results(select.to_python_many(values)) == \
+            results([one(value) for value in values])
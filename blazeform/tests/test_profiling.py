@@ -0,0 +1,34 @@
+import tracemalloc
+
+from blazeform.instrumentation import hooks
+from blazeform.profiling import profile, FORM_LEVEL
+from blazeform.tests.test_instrumentation import LoginForm
+
+
+def test_profile():
+    payloads = [
+        {'username': 'bob', 'age': '10', 'login-submit-flag': 'submitted'},
+        {'username': 'toolong', 'age': 'x', 'login-submit-flag': 'submitted'},
+    ]
+    result = profile(LoginForm, payloads, iterations=3)
+    assert result.runs == 6
+
+    rows = {(row.element_id, row.name, row.processor): row for row in result.rows}
+    assert rows[(FORM_LEVEL, 'form_init', 'LoginForm')].calls == 6
+    assert rows[(FORM_LEVEL, 'set_submitted', None)].calls == 6
+    assert rows[(FORM_LEVEL, 'form_validator', 'Wrapper')].calls == 6
+    assert rows[('username', 'processor', 'MaxLength')].calls == 6
+    assert rows[('age', 'processor', 'Int')].calls == 6
+    assert rows[('username', 'render_row', None)].calls == 6
+    assert result.rows[0].total_ns >= result.rows[-1].total_ns
+    assert all(total > 0 for total in result.phases.values())
+
+    report = result.report()
+    assert 'username' in report
+    assert 'MaxLength' in report
+    assert 'cumulative' in report
+
+    # profiling leaves the hooks and tracemalloc as it found them
+    assert not hooks.active
+    assert not hooks.track_memory
+    assert not tracemalloc.is_tracing()
@@ -56,3 +56,13 @@ def test_all():
             finally:
                 formfile.close()
             raise
+
+
+def test_render_twice():
+    from blazeform.form import Form
+    f = Form('f')
+    f.add_text('name', 'Name')
+    html = f.render()
+    assert 'Name:</label>' in html
+    assert f.render() == html
+    assert f.elements.name.label.value == 'Name'
@@ -0,0 +1,95 @@
+import logging
+
+from blazeutils.testing import raises
+
+from blazeform.instrumentation import hooks
+from blazeform.slowlog import Histogram, SlowLog
+from blazeform.tests.test_instrumentation import LoginForm
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def make_slowlog(**kwargs):
+    logger = logging.getLogger('blazeform.tests.slowlog')
+    logger.propagate = False
+    logger.handlers = [ListHandler()]
+    return SlowLog(logger=logger, **kwargs), logger.handlers[0].records
+
+
+def submit(slowlog, values):
+    form = LoginForm()
+    with hooks.subscribed(slowlog):
+        form.set_submitted(dict(values, **{'login-submit-flag': 'submitted'}))
+        form.is_valid()
+    return form
+
+
+def test_logs_slow_calls():
+    slowlog, records = make_slowlog(threshold_ms=0, max_value_length=20)
+    submit(slowlog, {'username': 'bob', 'age': '1' * 30})
+
+    by_element = {record.element_id: record for record in records}
+    assert set(by_element) == {'username', 'age', None}
+    record = by_element['age']
+    assert record.levelno == logging.WARNING
+    assert record.event_name == 'processor'
+    assert record.form_name == 'login'
+    assert record.value == "'" + '1' * 16 + '...'
+    # the vtype conversion's processor is a class
+    assert record.processor == "<class 'formencod..."
+
+    assert record.elapsed_ms >= 0
+    assert 'element=age' in record.getMessage()
+    assert by_element[None].event_name == 'form_validator'
+
+
+def test_thresholds():
+    slowlog, records = make_slowlog(threshold_ms=1000, thresholds={'form_validator': 0})
+    submit(slowlog, {'username': 'bob', 'age': '1'})
+    assert [record.event_name for record in records] == ['form_validator']
+
+    # not slow, but still counted
+    histogram = slowlog.histogram('login', 'age', 'Int')
+    assert histogram.count == 1
+    assert slowlog.histogram('login', 'nope', 'Int') is None
+
+
+@raises(ValueError, '"render_row" is not a watched event')
+def test_unknown_threshold():
+    SlowLog(thresholds={'render_row': 10})
+
+
+def test_bounded_histograms():
+    slowlog, records = make_slowlog(max_histograms=2)
+    submit(slowlog, {'username': 'bob', 'age': '1'})
+    submit(slowlog, {'username': 'bob', 'age': '1'})
+    assert len(slowlog.histograms) == 2
+    assert slowlog.dropped == 2
+    assert sum(h.count for h in slowlog.histograms.values()) == 4
+
+    slowlog.clear()
+    assert not slowlog.histograms
+    assert not slowlog.dropped
+
+
+def test_histogram():
+    histogram = Histogram((10, 100, 1000))
+    assert histogram.percentile(50) == 0
+    for elapsed in (5, 8, 50, 70, 90, 500, 5000):
+        histogram.add(elapsed)
+    assert histogram.counts == [2, 3, 1, 1]
+    assert histogram.count == 7
+    assert histogram.max_ns == 5000
+    assert histogram.percentile(25) == 10
+    assert histogram.percentile(50) == 100
+    assert histogram.percentile(80) == 1000
+    assert histogram.percentile(100) == 5000
+    assert histogram.as_dict()['buckets'][-1] == (None, 1)
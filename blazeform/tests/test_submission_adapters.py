@@ -0,0 +1,109 @@
+from blazeform.form import Form
+from blazeform.submission_adapters import adapt_submission, DictAdapter, MultiDictAdapter, \
+    UrlEncodedAdapter
+
+
+class MultiDict(object):
+    """ just enough of Werkzeug's MultiDict for the adapter """
+
+    def __init__(self, pairs):
+        self.pairs = pairs
+
+    def __contains__(self, key):
+        return key in [k for k, _ in self.pairs]
+
+    def __iter__(self):
+        return iter(dict(self.pairs))
+
+    def __len__(self):
+        return len(set(k for k, _ in self.pairs))
+
+    def getlist(self, key):
+        return [v for k, v in self.pairs if k == key]
+
+
+def get_form():
+    f = Form('f')
+    f.add_text('text', 'Text')
+    f.add_mselect('mselect', [(1, 'one'), (2, 'two')], 'Multi')
+    f.add_mcheckbox('mcb1', 'mcb1', 'red', group='colors')
+    f.add_mcheckbox('mcb2', 'mcb2', 'green', group='colors')
+    f.add_checkbox('checkbox', 'Checkbox')
+    return f
+
+
+def test_adapt_submission():
+    assert isinstance(adapt_submission({}, []), DictAdapter)
+    assert isinstance(adapt_submission(MultiDict([]), []), MultiDictAdapter)
+    assert isinstance(adapt_submission(b'', []), UrlEncodedAdapter)
+    adapter = DictAdapter({})
+    assert adapt_submission(adapter, []) is adapter
+
+
+def test_urlencoded_only_wanted_keys():
+    adapter = UrlEncodedAdapter(b'a=1&b=2&a=%C3%A9+x&&c', ['a', 'c'])
+    assert dict(adapter) == {'a': ['1', '\xe9 x'], 'c': ''}
+    assert len(adapter) == 2
+    # distinct keys, like the other adapters
+    assert adapter.key_count() == 3
+    assert 'b' not in adapter
+    assert adapter.get('a') == ['1', '\xe9 x']
+    assert adapter.get('c') == ''
+    assert adapter.get('c', multiple=True) == ['']
+    assert adapter['c'] == ''
+
+
+def test_form_multidict():
+    f = get_form()
+    f.set_submitted(MultiDict([
+        ('f-submit-flag', 'submitted'),
+        ('text', 'foo'),
+        ('mselect', '1'),
+        ('colors', 'red'),
+        ('colors', 'green'),
+        ('checkbox', 'on'),
+    ]))
+    assert f.is_valid()
+    values = f.get_values()
+    assert values['text'] == 'foo'
+    assert values['mselect'] == ['1']
+    assert values['colors'] == ['red', 'green']
+    assert values['checkbox'] is True
+
+
+def test_form_urlencoded():
+    f = get_form()
+    f.set_submitted(b'f-submit-flag=submitted&text=foo+bar&mselect=1&mselect=2&colors=green')
+    assert f.is_valid()
+    values = f.get_values()
+    assert values['text'] == 'foo bar'
+    assert values['mselect'] == ['1', '2']
+    assert values['colors'] == ['green']
+    assert values['checkbox'] is False
+
+
+def test_key_count():
+    # the same submission counts the same, whatever its type
+    pairs = [('f-submit-flag', 'submitted')] + [('mselect', str(n)) for n in range(30)]
+    body = '&'.join('%s=%s' % pair for pair in pairs).encode()
+    for values in (MultiDict(pairs), body, {'f-submit-flag': 'submitted', 'mselect': ['1']}):
+        f = Form('f', max_submitted_keys=2)
+        f.add_mselect('mselect', [(1, 'one')], 'Multi')
+        f.set_submitted(values)
+        assert f._errors == [], values
+
+
+def test_mapping():
+    class ItemsForm(Form):
+        def _set_submitted_values(self, values, source='form'):
+            self.submitted_items = sorted(values.items())
+            Form._set_submitted_values(self, values, source)
+
+    for values in (MultiDict([('f-submit-flag', 'submitted'), ('text', 'a')]),
+                   b'f-submit-flag=submitted&text=a&other=b',
+                   {'f-submit-flag': 'submitted', 'text': 'a'}):
+        f = ItemsForm('f')
+        f.add_text('text', 'Text')
+        f.set_submitted(values)
+        assert f.submitted_items == [('f-submit-flag', 'submitted'), ('text', 'a')]
+        assert f.get_values()['text'] == 'a'
@@ -1,8 +1,13 @@
+import os
 import unittest
 from decimal import Decimal
 
 from blazeform.util import (
+    ExceptionHandlerIndex,
     HtmlAttributeHolder,
+    KeywordMatcher,
+    LazyImport,
+    canonical_repr,
     NotGiven,
     NotGivenIter,
     is_empty,
@@ -132,3 +137,103 @@ class TestHtmlAttributeHolder(unittest.TestCase):
         ah.add_attr('class_', 'class2')
         assert ah.attributes['src'] == 'src'
         assert ah.attributes['class'] == 'class class2'
+
+
+class TestKeywordMatcher(unittest.TestCase):
+
+    def test_search(self):
+        km = KeywordMatcher(['uq_users_email', 'uq_users', 'fk_orders', 'users_em', 'nope'])
+        found = km.search('duplicate key violates unique constraint "uq_users_email"')
+        assert found == {'uq_users_email', 'uq_users', 'users_em'}
+        assert km.search('') == set()
+
+    def test_empty_keyword(self):
+        km = KeywordMatcher(['', 'foo'])
+        assert km.search('bar') == {''}
+        assert km.search('foo') == {'', 'foo'}
+
+    def test_no_keywords(self):
+        assert KeywordMatcher([]).search('foo') == set()
+
+    def test_regex_chars(self):
+        km = KeywordMatcher(['a.b', '(x)'])
+        assert km.search('axb') == set()
+        assert km.search('a.b (x)') == {'a.b', '(x)'}
+
+    def test_nested_keywords(self):
+        km = KeywordMatcher(['a', 'ab', 'abc', 'b', 'abd'])
+        assert km.search('xabcx') == {'a', 'ab', 'abc', 'b'}
+        assert km.search('abd ab') == {'a', 'ab', 'abd', 'b'}
+
+
+class TestExceptionHandlerIndex(unittest.TestCase):
+
+    def test_candidates(self):
+        index = ExceptionHandlerIndex()
+        handlers = [
+            ('uq_email', 'taken', ValueError, NotGiven),
+            (NotGiven, 'any', NotGiven, NotGiven),
+            ('uq_email', 'wrong type', KeyError, NotGiven),
+            ('uq_name', 'other text', NotGiven, NotGiven),
+            (NotGiven, 'by name', 'ValueError', NotGiven),
+            ('uq', 'prefix', 'ValueError', NotGiven),
+            (NotGiven, 'callback', KeyError, lambda exc: True),
+            (NotGiven, 'abc', (KeyError, ValueError), NotGiven),
+        ]
+        for handler in handlers:
+            index.add('owner', handler)
+        found = [handler[1] for owner, handler in index.candidates(ValueError('uq_email'))]
+        assert found == ['taken', 'any', 'by name', 'prefix', 'abc']
+        found = [handler[1] for owner, handler in index.candidates(KeyError('x'))]
+        assert found == ['any', 'callback', 'abc']
+
+
+class TestLazyImport(unittest.TestCase):
+
+    def test_attribute(self):
+        namespace = {}
+        namespace['join'] = LazyImport(namespace, 'join', 'os.path', 'join')
+        assert namespace['join']('a', 'b') == os.path.join('a', 'b')
+        # replaced itself after the first use
+        assert namespace['join'] is os.path.join
+
+    def test_module(self):
+        namespace = {}
+        namespace['path'] = LazyImport(namespace, 'path', 'os.path')
+        assert namespace['path'].sep
+        assert namespace['path'] is os.path
+
+
+class Thing(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def method(self):
+        pass
+
+
+class TestCanonicalRepr(unittest.TestCase):
+
+    def test_scalars(self):
+        assert canonical_repr(1) == '1'
+        assert canonical_repr('1') == "'1'"
+        assert canonical_repr(Decimal('1.5')) == "Decimal('1.5')"
+        assert canonical_repr(NotGiven) == 'NotGivenBase'
+        assert canonical_repr([(1, 'a'), (2, 'b')]) == "list[(1, 'a'), (2, 'b')]"
+
+    def test_unordered(self):
+        assert canonical_repr({'b': 1, 'a': 2}) == "dict{'a':2,'b':1}"
+        assert canonical_repr({'b', 'a'}) == "set{'a','b'}"
+
+    def test_objects(self):
+        thing = Thing(b=1, a=[Thing(c=None)], _private=object())
+        assert canonical_repr(thing) == 'blazeform.tests.test_utils.Thing(' \
+            'a=list[blazeform.tests.test_utils.Thing(c=None)],b=1)'
+        assert canonical_repr(thing.method) == 'method:blazeform.tests.test_utils.Thing.method'
+        assert canonical_repr(Thing) == 'blazeform.tests.test_utils.Thing'
+        assert canonical_repr(len) == 'builtins.len'
+
+    def test_cycle(self):
+        thing = Thing()
+        thing.me = thing
+        assert canonical_repr(thing) == 'blazeform.tests.test_utils.Thing(me=<cycle>)'
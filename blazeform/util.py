@@ -1,3 +1,12 @@
+import abc
+import datetime
+import decimal
+import heapq
+import importlib
+import inspect
+import re
+
+
 class StringIndentHelper(object):
 
     def __init__(self):
@@ -81,6 +90,10 @@ class NotGivenBase(object):
     def __hash__(self):
         return hash(self.__class__)
 
+    def __reduce__(self):
+        # pickling and copying keep the singleton
+        return 'NotGiven'
+
 
 NotGiven = NotGivenBase()
 
@@ -118,6 +131,9 @@ class NotGivenIterBase(NotGivenBase):
     def __len__(self):
         return 0
 
+    def __reduce__(self):
+        return 'NotGivenIter'
+
 
 NotGivenIter = NotGivenIterBase()
 
@@ -152,6 +168,78 @@ def is_given(object):
     return not isinstance(object, NotGivenBase)
 
 
+_scalar_types = frozenset((type(None), bool, int, float, complex, str, bytes, decimal.Decimal,
+                           datetime.date, datetime.datetime, datetime.time,
+                           datetime.timedelta))
+
+
+def _qualified_name(obj):
+    return '%s.%s' % (getattr(obj, '__module__', None), getattr(obj, '__qualname__', obj))
+
+
+def canonical_repr(obj):
+    """
+        A repr of obj that is the same across processes and hash seeds: no
+        memory addresses and no dict or set ordering.  Objects are represented
+        by their class and public attributes, functions and classes by their
+        qualified name and bound methods by their function's.  Forms and
+        elements are represented by their class and id only.
+    """
+    return _canonical_repr(obj, set())
+
+
+def _canonical_repr(obj, seen):
+    cls = obj.__class__
+    if cls in _scalar_types:
+        return repr(obj)
+    if cls is list or cls is tuple:
+        # the repr of a sequence of scalars (or of sequences of scalars, like
+        # select options) is already canonical
+        for item in obj:
+            item_cls = item.__class__
+            if item_cls in _scalar_types:
+                continue
+            if item_cls is not tuple and item_cls is not list:
+                break
+            if not _scalar_types.issuperset(map(type, item)):
+                break
+        else:
+            return cls.__name__ + repr(obj)
+    if isinstance(obj, NotGivenBase):
+        return cls.__name__
+    if inspect.isclass(obj) or inspect.isfunction(obj) or inspect.isbuiltin(obj):
+        return _qualified_name(obj)
+    if inspect.ismethod(obj):
+        return 'method:' + _qualified_name(obj.__func__)
+    if isinstance(obj, HtmlAttributeHolder):
+        return '<%s %s>' % (_qualified_name(cls), getattr(obj, 'id', None))
+    if id(obj) in seen:
+        return '<cycle>'
+    seen.add(id(obj))
+    try:
+        if isinstance(obj, (list, tuple)):
+            return '%s[%s]' % (cls.__name__, ','.join([_canonical_repr(item, seen)
+                                                       for item in obj]))
+        if isinstance(obj, dict):
+            return '%s{%s}' % (cls.__name__, ','.join(sorted([
+                '%s:%s' % (_canonical_repr(key, seen), _canonical_repr(value, seen))
+                for key, value in obj.items()
+            ])))
+        if isinstance(obj, (set, frozenset)):
+            return '%s{%s}' % (cls.__name__,
+                               ','.join(sorted([_canonical_repr(item, seen) for item in obj])))
+        attrs = getattr(obj, '__dict__', None)
+        if attrs is None:
+            return _qualified_name(cls)
+        # declarative_count is a global creation counter of FormEncode validators
+        return '%s(%s)' % (_qualified_name(cls), ','.join(sorted([
+            '%s=%s' % (name, _canonical_repr(value, seen)) for name, value in attrs.items()
+            if not name.startswith('_') and name != 'declarative_count'
+        ])))
+    finally:
+        seen.discard(id(obj))
+
+
 class ElementRegistrar(object):
     def __init__(self, formref, is_group=False):
         self._formref = formref
@@ -162,6 +250,9 @@ class ElementRegistrar(object):
             we want to enable add_* methods on the object
             that correspond to elements we have available
         """
+        if name == '_formref':
+            # not set yet, e.g. when unpickling or copying
+            raise AttributeError(name)
         if name.startswith('add_'):
             type = name.replace('add_', '')
             func = self._create_element
@@ -187,6 +278,9 @@ class ElementRegistrar(object):
         except KeyError:
             raise ValueError('"%s" is not a registered element type' % type)
 
+        self._formref._fingerprint_update('element', self.id if self._is_group else None,
+                                          type, eid, args, kwargs)
+
         el = eclass(self._formref, eid, *args, **kwargs)
         if self._is_group:
             el.renders_in_group = True
@@ -248,3 +342,163 @@ class HtmlAttributeHolder(object):
             remove the underscore before saving
         """
         return {key[:-1] if key.endswith('_') else key: val for key, val in dict.items()}
+
+
+class KeywordMatcher(object):
+    """
+        Finds which of a set of keywords occur in a string using a single,
+        combined regular expression scan of the string.  The expression
+        follows a trie of the keywords, so the work at each position depends
+        on the keywords' characters, not on how many there are.
+    """
+
+    def __init__(self, keywords):
+        keywords = set(keywords)
+        self.always = '' in keywords
+        keywords.discard('')
+        # the keyword found at a position is the longest one there, shorter
+        # keywords matching there are its prefixes
+        self.prefixes = {
+            kw: [kw[:end] for end in range(1, len(kw) + 1) if kw[:end] in keywords]
+            for kw in keywords
+        }
+        self.regex = None
+        if keywords:
+            trie = {}
+            for kw in keywords:
+                node = trie
+                for char in kw:
+                    node = node.setdefault(char, {})
+                # marks the end of a keyword
+                node[''] = {}
+            self.regex = re.compile('(?=(%s))' % self._pattern(trie))
+
+    @classmethod
+    def _pattern(cls, node):
+        """ the expression for a trie node, longer keywords tried first """
+        branches = [re.escape(char) + cls._pattern(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:%s)' % '|'.join(branches)
+        if '' in node:
+            return '(?:%s)?' % pattern
+        return pattern
+
+    def search(self, text):
+        """ return the set of keywords found in text """
+        found = set()
+        if self.always:
+            found.add('')
+        if self.regex is not None:
+            for match in self.regex.finditer(text):
+                found.update(self.prefixes[match.group(1)])
+        return found
+
+
+class ExceptionHandlerIndex(object):
+    """
+        Exception handlers (as added by add_handler()) compiled into lookups by
+        exception type and, for the handlers looking for a text in the
+        exception, by that text with a single matcher for all of them.
+        Handlers are returned in the order they were added.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.untyped = []
+        self.by_name = {}
+        self.by_type = {}
+        self.checked = []
+        # the handlers looking for a text (without callback), by the text
+        self.by_keyword = {}
+        self._matcher = None
+
+    def add(self, owner, handler, check_type=True):
+        """
+            `handler` is a (looking_for, error_msg, exc_type, callback) tuple.
+            If `check_type` is False, exc_type is ignored for handlers with a
+            callback.
+        """
+        looking_for, error_msg, exc_type, callback = handler
+        entry = (self.count, owner, handler)
+        self.count += 1
+        self._matcher = None
+
+        if is_notgiven(callback) and is_given(looking_for):
+            # the type is checked once the text is found
+            self.by_keyword.setdefault(looking_for, []).append(entry)
+        elif is_notgiven(exc_type) or (is_given(callback) and not check_type):
+            self.untyped.append(entry)
+        elif isinstance(exc_type, str):
+            self.by_name.setdefault(exc_type, []).append(entry)
+        elif isinstance(exc_type, tuple) or isinstance(exc_type, abc.ABCMeta):
+            # isinstance() on these can't be resolved with the MRO alone
+            self.checked.append(entry)
+        else:
+            self.by_type.setdefault(exc_type, []).append(entry)
+
+    @property
+    def matcher(self):
+        if self._matcher is None:
+            self._matcher = KeywordMatcher(self.by_keyword)
+        return self._matcher
+
+    def candidates(self, exc):
+        """
+            return an ordered list of (owner, handler) tuples whose type and
+            text requirements match the exception.  Handlers with callbacks are
+            always included, the callback decides.
+        """
+        cls = exc.__class__
+        # each list is in the order the handlers were added
+        lists = [self.untyped, self.by_name.get(cls.__name__, ())]
+        lists.extend(self.by_type[base] for base in cls.__mro__ if base in self.by_type)
+        if self.checked:
+            lists.append([entry for entry in self.checked if isinstance(exc, entry[2][2])])
+        if self.by_keyword:
+            for keyword in self.matcher.search(str(exc)):
+                lists.append([entry for entry in self.by_keyword[keyword]
+                              if _type_matches(exc, entry[2][2])])
+        return [(owner, handler) for _, owner, handler in heapq.merge(*lists)]
+
+
+def _type_matches(exc, exc_type):
+    """ does the exception match a handler's exc_type? """
+    if is_notgiven(exc_type):
+        return True
+    if isinstance(exc_type, str):
+        return exc.__class__.__name__ == exc_type
+    return isinstance(exc, exc_type)
+
+
+class LazyImport(object):
+    """
+        Stands in for `name` in `namespace` (a module's globals()) until it
+        is first used, then imports `module` (or its `attr`) and replaces
+        itself in the namespace, so only the first use is indirect:
+
+            HTML = LazyImport(globals(), 'HTML', 'webhelpers2.html', 'HTML')
+    """
+
+    def __init__(self, namespace, name, module, attr=None):
+        self._namespace = namespace
+        self._name = name
+        self._module = module
+        self._attr = attr
+
+    def _load(self):
+        obj = importlib.import_module(self._module)
+        if self._attr is not None:
+            obj = getattr(obj, self._attr)
+        self._namespace[self._name] = obj
+        return obj
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __repr__(self):
+        return '<LazyImport %s>' % '.'.join(filter(None, (self._module, self._attr)))
@@ -29,7 +29,7 @@ setup(
         'Topic :: Internet :: WWW/HTTP'
       ],
     license='BSD',
-    packages=find_packages(exclude=[]),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     include_package_data=True,
     install_requires=[
         "FormEncode>=1.3.1",
@@ -41,6 +41,9 @@ setup(
     # for example:
     # $ pip install -e .[dev,test]
     extras_require={
+        'batch': [
+            'numpy',
+        ],
         'test': [
             'codecov',
             'coverage',